@@ -0,0 +1,117 @@
+"""
+批量会议室分配基准
+
+在临时数据库中执行迁移并写入会议室、用户和已有预约，生成一批会议请求，测量 AllocationService.allocate 的耗时与分配率
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_allocation.py [--requests 2000] [--rooms 200] [--existing 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from database import RoutingSession  # noqa: E402
+from migrations import migrate  # noqa: E402
+from schemas import AllocationItem, AllocationWindow  # noqa: E402
+from services.allocation_service import AllocationService  # noqa: E402
+
+
+LOCATIONS = ["一号楼", "二号楼", "研发中心", "总部大厦", "创新园区"]
+CAPACITIES = [4, 6, 8, 10, 12, 20, 40]
+DURATIONS = [30, 30, 45, 60, 60, 90, 120]
+SQLITE_DATETIME = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def populate(conn, user_count: int, room_count: int, existing: int, day0: datetime) -> None:
+    """写入会议室、用户和已有预约（工作时间内随机分布）"""
+    conn.executemany(
+        "INSERT INTO users (id, username, email, hashed_password, is_active) VALUES (?, ?, ?, 'x', 1)",
+        ((i, f"user{i}", f"user{i}@example.com") for i in range(1, user_count + 1))
+    )
+    conn.executemany(
+        "INSERT INTO rooms (id, name, location, capacity, is_available) VALUES (?, ?, ?, ?, 1)",
+        ((i, f"会议室 {i}", random.choice(LOCATIONS), random.choice(CAPACITIES)) for i in range(1, room_count + 1))
+    )
+    rows = []
+    for i in range(1, existing + 1):
+        start = day0 + timedelta(days=random.randrange(10), hours=9 + random.randrange(8))
+        rows.append((i, random.randint(1, user_count), random.randint(1, room_count),
+                     start, start + timedelta(minutes=random.choice(DURATIONS))))
+    # 与 SQLAlchemy 写入的时间格式一致（SQLite 按字符串比较时间）
+    conn.executemany(
+        "INSERT INTO bookings (id, user_id, room_id, start_time, end_time, status) VALUES (?, ?, ?, ?, ?, 'confirmed')",
+        (
+            (i, user, room, start.strftime(SQLITE_DATETIME), end.strftime(SQLITE_DATETIME))
+            for i, user, room, start, end in rows
+        )
+    )
+    conn.commit()
+
+
+def make_requests(count: int, user_count: int, day0: datetime) -> list:
+    """生成会议请求：每个请求 1~3 个半天窗口，部分为每周重复"""
+    items = []
+    for i in range(count):
+        windows = []
+        for _ in range(random.randint(1, 3)):
+            start = day0 + timedelta(days=random.randrange(10), hours=random.choice([9, 13]))
+            windows.append(AllocationWindow(start=start, end=start + timedelta(hours=4)))
+        items.append(AllocationItem(
+            ref=f"r{i}",
+            user_id=random.randint(1, user_count),
+            duration_minutes=random.choice(DURATIONS),
+            attendees=random.choice([2, 3, 4, 5, 6, 8, 10, 15, 30]),
+            locations=[random.choice(LOCATIONS)] if random.random() < 0.6 else [],
+            windows=windows,
+            repeat_weeks=random.choice([1, 1, 1, 2, 4]),
+        ))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量会议室分配基准")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--existing", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    day0 = (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        migrate(path, log=lambda message: None)
+        engine = create_engine(f"sqlite:///{path}")
+        raw = engine.raw_connection()
+        try:
+            populate(raw, args.users, args.rooms, args.existing, day0)
+        finally:
+            raw.close()
+        items = make_requests(args.requests, args.users, day0)
+
+        # 服务层通过 db.shard() 取分片会话，未配置分片时返回会话本身
+        with RoutingSession(engine) as db:
+            for dry_run in (True, False):
+                start = perf_counter()
+                result = AllocationService.allocate(db, items, dry_run=dry_run)
+                elapsed = (perf_counter() - start) * 1000
+                bookings = sum(placement["occurrences"] for placement in result["placed"])
+                print(
+                    f"{'计算' if dry_run else '计算并写入'}: {elapsed:.0f}ms, "
+                    f"分配 {len(result['placed'])} / {len(items)} 个会议（{bookings} 条预约）, "
+                    f"未分配 {len(result['unplaced'])}"
+                )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
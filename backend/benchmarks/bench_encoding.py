@@ -0,0 +1,102 @@
+"""
+预约列表响应编码基准
+
+对比嵌套 JSON（BookingDetailResponse 列表）与列式 JSON 的响应大小和编码耗时，
+并分别给出 gzip 压缩后的大小；数据在内存中构造，无需数据库
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_encoding.py [--bookings 500] [--users 50] [--rooms 20] [--runs 20]
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schemas import BookingDetailResponse  # noqa: E402
+from utils.encoding import encode_bookings_columnar  # noqa: E402
+
+
+def build_bookings(count: int, user_count: int, room_count: int):
+    """构造测试数据（与 ORM 对象具有相同属性）"""
+    now = datetime(2025, 1, 6, 9, 0, tzinfo=timezone.utc)
+    users = [
+        SimpleNamespace(
+            id=i, username=f"user{i}", email=f"user{i}@example.com", phone="13800000000",
+            is_active=True, created_at=now
+        )
+        for i in range(1, user_count + 1)
+    ]
+    rooms = [
+        SimpleNamespace(
+            id=i, name=f"会议室 {i}", location=f"{i % 5 + 1} 楼", capacity=10,
+            description="配备投影仪和白板", is_available=True, created_at=now
+        )
+        for i in range(1, room_count + 1)
+    ]
+    bookings = []
+    for i in range(count):
+        user = users[i % user_count]
+        room = rooms[i % room_count]
+        start = now + timedelta(minutes=30 * i)
+        bookings.append(SimpleNamespace(
+            id=i + 1, user_id=user.id, room_id=room.id, user=user, room=room,
+            start_time=start, end_time=start + timedelta(minutes=30),
+            purpose="项目周会", status="confirmed", created_at=now
+        ))
+    return bookings
+
+
+def encode_nested(bookings) -> bytes:
+    """原有格式：每条预约内嵌用户和会议室"""
+    rows = [BookingDetailResponse.model_validate(b).model_dump(mode="json") for b in bookings]
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_columnar(bookings) -> bytes:
+    """列式格式"""
+    payload = encode_bookings_columnar(bookings)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(encoder, bookings, runs: int):
+    """返回 (编码结果, 编码耗时中位数, gzip 耗时中位数)"""
+    encode_times = []
+    gzip_times = []
+    for _ in range(runs):
+        start = perf_counter()
+        body = encoder(bookings)
+        encode_times.append(perf_counter() - start)
+        start = perf_counter()
+        compressed = gzip.compress(body, compresslevel=6)
+        gzip_times.append(perf_counter() - start)
+    return body, compressed, statistics.median(encode_times), statistics.median(gzip_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预约列表响应编码基准")
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    bookings = build_bookings(args.bookings, args.users, args.rooms)
+    print(f"{args.bookings} 条预约, {args.users} 个用户, {args.rooms} 个会议室, 每项 {args.runs} 次取中位数\n")
+    print(f"{'格式':<10}{'原始字节':>12}{'gzip 字节':>12}{'编码 ms':>10}{'gzip ms':>10}")
+    for name, encoder in (("nested", encode_nested), ("columnar", encode_columnar)):
+        body, compressed, encode_seconds, gzip_seconds = measure(encoder, bookings, args.runs)
+        print(
+            f"{name:<10}{len(body):>12}{len(compressed):>12}"
+            f"{encode_seconds * 1000:>10.2f}{gzip_seconds * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
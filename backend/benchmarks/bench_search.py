@@ -0,0 +1,93 @@
+"""
+全文搜索基准
+
+在临时数据库中执行迁移并写入大量用户、会议室和预约，测量 SearchService.search 的耗时
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_search.py [--bookings 100000] [--runs 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from database import RoutingSession  # noqa: E402
+from migrations import migrate  # noqa: E402
+from services.search_service import SearchService  # noqa: E402
+
+
+PURPOSES = ["项目周会", "需求评审", "技术分享", "客户拜访", "季度复盘", "面试", "培训", "产品发布演练", "架构讨论", "团建筹备"]
+LOCATIONS = ["一号楼", "二号楼", "研发中心", "总部大厦", "创新园区"]
+QUERIES = ["需求评审", "user1234", "研发中心", "产品发布", "面试", "会议室 42", "example.com"]
+
+
+def populate(conn, user_count: int, room_count: int, booking_count: int) -> None:
+    """写入测试数据（触发器会同步建立搜索索引）"""
+    conn.executemany(
+        "INSERT INTO users (id, username, email, hashed_password, is_active) VALUES (?, ?, ?, 'x', 1)",
+        ((i, f"user{i}", f"user{i}@example.com") for i in range(1, user_count + 1))
+    )
+    conn.executemany(
+        "INSERT INTO rooms (id, name, location, capacity, description, is_available) VALUES (?, ?, ?, 10, ?, 1)",
+        (
+            (i, f"会议室 {i}", random.choice(LOCATIONS), f"{random.choice(LOCATIONS)} {i % 20 + 1} 层")
+            for i in range(1, room_count + 1)
+        )
+    )
+    conn.executemany(
+        "INSERT INTO bookings (id, user_id, room_id, start_time, end_time, purpose, status) "
+        "VALUES (?, ?, ?, '2025-01-01 09:00:00', '2025-01-01 10:00:00', ?, 'confirmed')",
+        (
+            (i, random.randint(1, user_count), random.randint(1, room_count),
+             f"{random.choice(PURPOSES)} #{i}")
+            for i in range(1, booking_count + 1)
+        )
+    )
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全文搜索基准")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        migrate(path, log=lambda message: None)
+        engine = create_engine(f"sqlite:///{path}")
+
+        start = perf_counter()
+        raw = engine.raw_connection()
+        try:
+            populate(raw, args.users, args.rooms, args.bookings)
+        finally:
+            raw.close()
+        print(f"写入 {args.users} 用户 / {args.rooms} 会议室 / {args.bookings} 预约: {perf_counter() - start:.1f}s\n")
+
+        # 服务层通过 db.shard() 取分片会话，未配置分片时返回会话本身
+        with RoutingSession(engine) as db:
+            print(f"{'查询':<16}{'结果数':>8}{'中位数 ms':>12}{'p95 ms':>10}")
+            for query in QUERIES:
+                timings = []
+                for _ in range(args.runs):
+                    start = perf_counter()
+                    items, _ = SearchService.search(db, query, limit=20)
+                    timings.append((perf_counter() - start) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{query:<16}{len(items):>8}{statistics.median(timings):>12.2f}{p95:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+worker 冷启动耗时基准
+
+在全新的子进程中导入 main（与 gunicorn worker 启动过程一致），统计耗时中位数，
+并列出导入耗时最多的模块
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_startup.py [--runs 10] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE_SNIPPET = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_once() -> float:
+    """在新进程中测量一次导入耗时（秒）"""
+    output = subprocess.check_output([sys.executable, "-c", MEASURE_SNIPPET], cwd=BACKEND_DIR)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def slowest_imports(top: int):
+    """使用 -X importtime 统计累计耗时最多的模块"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line.split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue
+        rows.append((cumulative, parts[2].strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="worker 冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    print(f"import main: 中位数 {statistics.median(samples) * 1000:.1f}ms, "
+          f"最小 {min(samples) * 1000:.1f}ms, 最大 {max(samples) * 1000:.1f}ms ({args.runs} 次)")
+    print("\n累计导入耗时最多的模块:")
+    for cumulative, module in slowest_imports(args.top):
+        print(f"  {cumulative / 1000:8.1f}ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+请求轨迹重放（容量规划）
+
+读取 BOOKING_TRACE_RECORD_PATH 录制的轨迹或 gunicorn / uvicorn 访问日志，按 N 倍速重放到进程内应用或本地实例，
+同一用户的请求按录制顺序依次发送（前一个完成后才发送下一个），不同用户之间并发，总并发数不超过 --concurrency；
+按接口输出吞吐、错误率和延迟分位数。
+
+重放会写入数据库，进程内重放应在数据库副本上进行（--workdir 指向放有 booking_system.db 副本的目录，
+例如由 python manage.py backup 生成的备份解压得到）。所有请求来自同一 IP，被重放的实例应关闭限流
+（进程内重放默认关闭）；轨迹中不含令牌，用户以 X-User-Id 请求头标识，不能用于 BOOKING_AUTH_REQUIRED=true 的实例。
+
+用法（在 backend 目录下）:
+    python benchmarks/replay_trace.py trace.ndjson --in-process --workdir /tmp/replay [--speed 2] [--concurrency 64]
+    python benchmarks/replay_trace.py trace.ndjson --target http://127.0.0.1:8000 [--speed 0]
+    python benchmarks/replay_trace.py --access-log access.log --target http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+from collections import Counter, defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.trace import TraceRequest, load_trace, parse_access_log  # noqa: E402
+
+
+def request_headers(request: TraceRequest) -> Dict[str, str]:
+    """重放时发送的请求头（录制时的用户以 X-User-Id 标识）"""
+    headers = dict(request.headers)
+    if request.user is not None and "x-user-id" not in headers:
+        headers["x-user-id"] = request.user
+    if request.body is not None:
+        headers["content-length"] = str(len(request.body))
+    return headers
+
+
+class AsgiTransport:
+    """在当前进程内直接调用 ASGI 应用（不经过网络，测量的是应用本身的处理能力）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, request: TraceRequest) -> int:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": request.method,
+            "scheme": "http",
+            "path": request.path,
+            "raw_path": request.path.encode("utf-8"),
+            "query_string": request.query.encode("latin-1"),
+            "root_path": "",
+            "headers": [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in request_headers(request).items()
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("replay", 80),
+        }
+        body_sent = False
+        finished = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": request.body or b"", "more_body": False}
+            # 请求体已发送完毕，响应结束后才报告连接断开
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished.set()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception as exc:
+            # 未处理的异常：ServerErrorMiddleware 已返回 500 后重新抛出
+            if status is None:
+                raise RuntimeError("应用未返回响应") from exc
+        finally:
+            finished.set()
+        if status is None:
+            raise RuntimeError("应用未返回响应")
+        return status
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpTransport:
+    """最小的 HTTP/1.1 客户端（keep-alive 连接池），用于重放到本地实例"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError("--target 只支持 http://host:port")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.idle = []
+
+    async def _read_body(self, reader, headers: Dict[str, str], method: str, status: int) -> bool:
+        """读取并丢弃响应体，返回连接是否可以复用"""
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return True
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # 跳过 trailer
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return True
+                await reader.readexactly(size + 2)
+        if "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+            return True
+        await reader.read()
+        return False
+
+    async def request(self, request: TraceRequest) -> int:
+        target = self.prefix + request.path + (f"?{request.query}" if request.query else "")
+        head = [f"{request.method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        headers = request_headers(request)
+        if request.body is None and request.method in ("POST", "PUT", "PATCH"):
+            headers["content-length"] = "0"
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        data = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (request.body or b"")
+
+        if self.idle:
+            reader, writer = self.idle.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(data)
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError("连接被关闭")
+            status = int(status_line.split()[1])
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+            reusable = await self._read_body(reader, response_headers, request.method, status)
+        except BaseException:
+            writer.close()
+            raise
+        if reusable and response_headers.get("connection", "").lower() != "close":
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return status
+
+    async def close(self) -> None:
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+def percentile(values: List[float], q: float) -> float:
+    """已排序数据的分位数（最近秩）"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(len(values) * q) - 1))]
+
+
+class ReplayStats:
+    """按接口汇总重放结果"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.failures = Counter()
+        self.mismatches = Counter()
+        self.lags = []
+
+    def add(self, request: TraceRequest, status: Optional[int], latency: float, lag: float) -> None:
+        endpoint = request.endpoint
+        self.latencies[endpoint].append(latency)
+        self.lags.append(lag)
+        if status is None:
+            self.failures[endpoint] += 1
+            return
+        self.statuses[endpoint][status] += 1
+        if request.status is not None and request.status != status:
+            self.mismatches[endpoint] += 1
+
+    def _summary(self, latencies: List[float], statuses: Counter, failures: int, mismatches: int,
+                 elapsed: float) -> dict:
+        latencies = sorted(latencies)
+        count = len(latencies)
+        errors = failures + sum(n for status, n in statuses.items() if status >= 500)
+        return {
+            "count": count,
+            "throughput": count / elapsed if elapsed > 0 else 0.0,
+            "error_rate": errors / count if count else 0.0,
+            "errors": errors,
+            "client_errors": sum(n for status, n in statuses.items() if 400 <= status < 500),
+            "status_mismatches": mismatches,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p90_ms": percentile(latencies, 0.9) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        }
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {
+            endpoint: self._summary(
+                latencies, self.statuses[endpoint], self.failures[endpoint], self.mismatches[endpoint], elapsed
+            )
+            for endpoint, latencies in sorted(self.latencies.items(), key=lambda item: -len(item[1]))
+        }
+        total_statuses = Counter()
+        for statuses in self.statuses.values():
+            total_statuses.update(statuses)
+        total = self._summary(
+            [latency for latencies in self.latencies.values() for latency in latencies],
+            total_statuses, sum(self.failures.values()), sum(self.mismatches.values()), elapsed
+        )
+        lags = sorted(self.lags)
+        return {
+            "elapsed_seconds": elapsed,
+            "total": total,
+            "schedule_lag_ms": {"p50": percentile(lags, 0.5) * 1000, "p99": percentile(lags, 0.99) * 1000},
+            "endpoints": endpoints,
+        }
+
+
+async def replay(requests: List[TraceRequest], transport, speed: float, concurrency: int,
+                 timeout: float) -> dict:
+    """
+    按录制时的间隔（除以 speed）发送请求，speed 为 0 时不等待、尽快发送
+
+    同一用户的请求在一条协程中依次发送，保持录制顺序；没有用户的请求各自独立发送
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = ReplayStats()
+    chains = defaultdict(list)
+    for index, request in enumerate(requests):
+        chains[request.user if request.user is not None else f"#{index}"].append(request)
+
+    async def run_chain(chain: List[TraceRequest]):
+        for request in chain:
+            due = started + request.offset / speed if speed > 0 else started
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with semaphore:
+                # 调度延迟：实际发送时间晚于计划的时长（并发已满或同一用户的上一个请求未完成）
+                lag = max(loop.time() - due, 0.0)
+                start = perf_counter()
+                try:
+                    status = await asyncio.wait_for(transport.request(request), timeout)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, RuntimeError):
+                    status = None
+                stats.add(request, status, perf_counter() - start, lag)
+
+    started = loop.time()
+    await asyncio.gather(*(run_chain(chain) for chain in chains.values()))
+    return stats.report(loop.time() - started)
+
+
+async def replay_in_process(requests: List[TraceRequest], args) -> dict:
+    """在当前进程内启动应用（包括后台任务线程）并重放"""
+    if args.workdir:
+        os.chdir(args.workdir)
+    # 所有请求来自同一客户端，重放时关闭限流；不再录制重放产生的请求
+    os.environ.setdefault("BOOKING_RATE_LIMIT_ENABLED", "false")
+    os.environ.pop("BOOKING_TRACE_RECORD_PATH", None)
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = AsgiTransport(app)
+        return await replay(requests, transport, args.speed, args.concurrency, args.timeout)
+
+
+async def replay_http(requests: List[TraceRequest], args) -> dict:
+    transport = HttpTransport(args.target)
+    try:
+        return await replay(requests, transport, args.speed, args.concurrency, args.timeout)
+    finally:
+        await transport.close()
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"{'接口':<44}{'请求数':>8}{'req/s':>9}{'错误率':>8}{'4xx':>6}{'不一致':>7}"
+        f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+    rows = list(report["endpoints"].items()) + [("合计", report["total"])]
+    for endpoint, row in rows:
+        print(
+            f"{endpoint[:43]:<44}{row['count']:>8}{row['throughput']:>9.1f}{row['error_rate']:>8.2%}"
+            f"{row['client_errors']:>6}{row['status_mismatches']:>7}{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}"
+        )
+    lag = report["schedule_lag_ms"]
+    print(
+        f"\n耗时 {report['elapsed_seconds']:.1f}s，调度延迟 p50 {lag['p50']:.1f}ms / p99 {lag['p99']:.1f}ms"
+        "（持续增长说明已跟不上目标速度）"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求轨迹重放")
+    parser.add_argument("trace", nargs="?", help="录制的轨迹文件（NDJSON）")
+    parser.add_argument("--access-log", help="改为从访问日志读取（只重放读请求，没有用户信息）")
+    parser.add_argument("--log-rate", type=float, default=50, help="访问日志没有时间时假定的每秒请求数")
+    parser.add_argument("--include-writes", action="store_true", help="访问日志中的写请求也以空请求体重放")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--in-process", action="store_true", help="在当前进程内启动应用并重放")
+    target.add_argument("--target", help="本地实例地址，如 http://127.0.0.1:8000")
+    parser.add_argument("--workdir", help="进程内重放时的工作目录（包含数据库副本）")
+    parser.add_argument("--speed", type=float, default=1.0, help="重放倍速，0 表示不等待、尽快发送")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30, help="单个请求超时秒数")
+    parser.add_argument("--limit", type=int, help="最多重放的请求数")
+    parser.add_argument("--json", dest="json_path", help="同时将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if bool(args.trace) == bool(args.access_log):
+        parser.error("需要指定轨迹文件或 --access-log 之一")
+    if args.speed < 0 or args.concurrency < 1:
+        parser.error("--speed 不能为负数，--concurrency 至少为 1")
+
+    if args.access_log:
+        with open(args.access_log, "r", encoding="utf-8", errors="replace") as f:
+            requests, skipped = parse_access_log(f, args.log_rate, args.include_writes, args.limit)
+    else:
+        requests, skipped = load_trace(args.trace, args.limit)
+    if skipped:
+        print("跳过: " + ", ".join(f"{reason} {count}" for reason, count in sorted(skipped.items())), file=sys.stderr)
+    if not requests:
+        print("没有可重放的请求", file=sys.stderr)
+        sys.exit(1)
+    users = len({request.user for request in requests if request.user is not None})
+    print(f"重放 {len(requests)} 个请求（{users} 个用户，录制时长 {requests[-1].offset:.1f}s）", file=sys.stderr)
+
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    if args.in_process:
+        report = asyncio.run(replay_in_process(requests, args))
+    else:
+        report = asyncio.run(replay_http(requests, args))
+    print_report(report)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
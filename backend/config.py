@@ -0,0 +1,150 @@
+"""
+应用配置模块
+所有运行参数均可通过环境变量（前缀 BOOKING_）覆盖
+"""
+
+from typing import Dict, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """应用配置"""
+
+    model_config = SettingsConfigDict(env_prefix="BOOKING_")
+
+    # 监控指标
+    metrics_enabled: bool = True
+
+    # 性能剖析（默认关闭）
+    profiling_enabled: bool = False
+    slow_request_ms: float = 500
+    slow_query_ms: float = 100
+    profile_max_seconds: float = 30
+
+    # 请求录制（设置 trace_record_path 后开启，供 benchmarks/replay_trace.py 重放；sample_rate 按用户采样）
+    trace_record_path: Optional[str] = None
+    trace_max_body_bytes: int = 65536
+    trace_sample_rate: float = 1.0
+
+    # 按地点分片（{分片名: [会议室地点, ...]}，每个分片一个 SQLite 文件，保存该地点会议室的预约；
+    # 未列出的地点留在主库。为空时不分片。修改后运行 python manage.py migrate 创建分片并迁移已有预约）
+    shard_locations: Dict[str, List[str]] = {}
+    shard_dir: str = "./shards"
+    shard_fanout_workers: int = 8
+
+    # 历史预约归档
+    archive_after_days: int = 90
+    archive_batch_size: int = 500
+    archive_batch_pause_ms: float = 50
+
+    # 软删除墓碑清理
+    purge_after_days: int = 7
+    purge_batch_size: int = 500
+    purge_batch_pause_ms: float = 50
+    purge_interval_seconds: int = 3600
+
+    # 批量导入（每批校验并在一个事务中写入 import_batch_size 行；明文密码由 import_hash_workers 个线程计算 bcrypt）
+    import_batch_size: int = 1000
+    import_max_errors: int = 200
+    import_hash_workers: int = 4
+
+    # 在线备份（SQLite backup API 分步复制，每步之间释放读锁；rate_limit 为 0 表示不限速，keep 为 0 表示不清理旧备份）
+    backup_dir: str = "./backups"
+    backup_pages_per_step: int = 256
+    backup_rate_limit_mb_per_second: float = 20
+    backup_max_restarts: int = 20
+    backup_keep: int = 7
+
+    # 后台任务（每个 worker 启动 job_workers 个线程；为 0 时只入队，由 python manage.py run-jobs 执行）
+    job_workers: int = 2
+    job_poll_interval_ms: float = 1000
+    job_lease_seconds: float = 60
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 5
+    pending_expire_interval_seconds: float = 60
+
+    # 预约规则（单次预约时长上限使用户重叠检查和日程查询可以按开始时间做有界扫描）
+    max_booking_hours: float = 24
+    prevent_user_overlap: bool = True
+    agenda_default_days: int = 14
+
+    # 批量分配会议室（单次请求的会议数上限）
+    allocation_max_requests: int = 5000
+
+    # 时段位图热力图单次查询的最多天数
+    slot_heatmap_max_days: int = 62
+
+    # 日历订阅（时间窗口不应超过 archive_after_days，已归档的预约不在订阅中）
+    calendar_past_days: int = 30
+    calendar_future_days: int = 180
+    calendar_max_age_seconds: int = 60
+    calendar_cache_size: int = 2000
+
+    # 预约事件日志（快照之后的事件达到 min_events 时，周期任务生成新快照并删除更早的事件）
+    event_snapshot_min_events: int = 1000
+    event_compact_interval_seconds: int = 3600
+    event_replay_batch_size: int = 5000
+
+    # 预约临时保留（pending 预约在 hold_expires_at 之前占用时间段）
+    hold_ttl_seconds: int = 300
+    hold_max_ttl_seconds: int = 900
+    max_active_holds_per_user: int = 5
+
+    # 邮件通知（开发环境可用本地 SMTP 替身，如 python -m aiosmtpd -n -l localhost:1025）
+    notifications_enabled: bool = False
+    smtp_host: str = "localhost"
+    smtp_port: int = 1025
+    smtp_timeout_seconds: float = 10
+    mail_from: str = "noreply@booking.local"
+
+    # 认证（JWT）。jwt_secret 为空时使用 jwt_secret_path 文件中的密钥（不存在时自动生成，各 worker 共用）
+    auth_required: bool = False
+    jwt_secret: str = ""
+    jwt_secret_path: str = "./jwt.secret"
+    jwt_algorithm: str = "HS256"
+    access_token_minutes: int = 15
+    refresh_token_days: int = 7
+    token_cache_size: int = 10000
+
+    # 幂等键
+    idempotency_ttl_hours: int = 24
+    idempotency_cache_size: int = 10000
+    idempotency_wait_seconds: float = 5
+
+    # 进程内读缓存（跨 worker 通过 cache_generations 表失效）
+    cache_enabled: bool = True
+
+    # 分页与结果集大小（不分页的查询超过 max_result_rows 行时返回 413）
+    default_page_size: int = 100
+    max_page_size: int = 500
+    max_result_rows: int = 5000
+    export_batch_size: int = 1000
+
+    # 全文搜索（命中行很多时只对前 N 个候选计算相关度）
+    search_candidate_limit: int = 1000
+
+    # 响应压缩（小于 gzip_min_size 字节的响应不压缩）
+    gzip_enabled: bool = True
+    gzip_min_size: int = 1024
+    gzip_level: int = 6
+
+    # 限流（令牌桶，每秒补充速率 / 桶容量；写请求按 rate_limit_write_cost 个令牌计）
+    rate_limit_enabled: bool = True
+    rate_limit_ip_rate: float = 20
+    rate_limit_ip_burst: float = 40
+    rate_limit_user_rate: float = 10
+    rate_limit_user_burst: float = 20
+    rate_limit_write_cost: float = 5
+    rate_limit_state_path: str = "./rate_limit.state"
+
+    # 过载保护（每个 worker 的并发上限与排队）
+    max_concurrent_requests: int = 32
+    admission_queue_size: int = 64
+    admission_queue_timeout_ms: float = 2000
+
+    # 管理接口令牌（未设置时管理接口不可用）
+    admin_token: Optional[str] = None
+
+
+settings = Settings()
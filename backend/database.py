@@ -1,15 +1,105 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import settings
+from utils.metrics import TimedQueuePool, instrument_engine
+from utils.profiling import instrument_engine_profiling
 
 # 使用SQLite数据库
 SQLALCHEMY_DATABASE_URL = "sqlite:///./booking_system.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# 主库的分片名（未分配到分片的地点的预约，以及用户、会议室等全局数据都在主库）
+HOME_SHARD = "main"
+
+# 分片库连接中以临时视图映射到主库的全局表（只读，分片会话写入这些表会报错）
+GLOBAL_TABLES = ("users", "rooms", "room_equipment")
+
+engine_options = {"connect_args": {"check_same_thread": False}}
+if settings.metrics_enabled:
+    engine_options["poolclass"] = TimedQueuePool
+
+
+def _create_engine(url: str):
+    """创建引擎并注册 SQL 计时钩子"""
+    db_engine = create_engine(url, **engine_options)
+    if settings.metrics_enabled:
+        instrument_engine(db_engine)
+    if settings.profiling_enabled:
+        instrument_engine_profiling(db_engine)
+    return db_engine
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+
+
+def shard_path(name: str) -> str:
+    """分片数据库文件路径"""
+    if name == HOME_SHARD:
+        return engine.url.database
+    return os.path.join(settings.shard_dir, f"{name}.db")
+
+
+def _attach_home(dbapi_connection, connection_record):
+    # 分片连接附加主库，全局表的临时视图优先于分片库中的同名空表，ORM 查询无需区分所在库
+    dbapi_connection.execute("ATTACH DATABASE ? AS home", (engine.url.database,))
+    for table in GLOBAL_TABLES:
+        dbapi_connection.execute(f"CREATE TEMP VIEW IF NOT EXISTS {table} AS SELECT * FROM home.{table}")
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class RoutingSession(Session):
+    """
+    可按分片名取得其他分片会话的数据库会话
+
+    分片会话在首次使用时创建，由最初的会话统一持有并随其一起关闭（从分片会话再取其他分片时复用同一组会话），
+    从分片会话加载的对象在请求结束前都可以继续延迟加载关联数据
+    """
+
+    @property
+    def shard_name(self) -> str:
+        """本会话所在的分片"""
+        return self.info.get("shard", HOME_SHARD)
+
+    def shard(self, name: str) -> Session:
+        """
+        取得指定分片的会话（本会话所在的分片返回本会话）
+
+        Args:
+            name: 分片名
+
+        Returns:
+            数据库会话
+        """
+        if name == self.shard_name:
+            return self
+        root = self.info.get("root", self)
+        if name == root.shard_name:
+            return root
+        sessions = root.info.setdefault("shard_sessions", {})
+        if name not in sessions:
+            sessions[name] = shard_sessionmakers[name](info={"root": root})
+        return sessions[name]
+
+    def close(self) -> None:
+        for session in self.info.pop("shard_sessions", {}).values():
+            session.close()
+        super().close()
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
+
+# 分片引擎与会话（未配置分片时只有主库）
+shard_engines = {HOME_SHARD: engine}
+shard_sessionmakers = {HOME_SHARD: SessionLocal}
+for _name in settings.shard_locations:
+    shard_engines[_name] = _create_engine(f"sqlite:///{shard_path(_name)}")
+    event.listen(shard_engines[_name], "connect", _attach_home)
+    shard_sessionmakers[_name] = sessionmaker(
+        autocommit=False, autoflush=False, bind=shard_engines[_name], class_=RoutingSession,
+        info={"shard": _name}
+    )
 
 Base = declarative_base()
 
@@ -20,4 +110,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
@@ -3,22 +3,34 @@
 运行此脚本将创建测试用户、会议室和预约数据
 """
 from datetime import datetime, timedelta
-from database import SessionLocal, engine, Base
-from models import User, Room, Booking
+from database import SessionLocal, engine, shard_sessionmakers
+from migrations import migrate
+from models import User, Room, Booking, BookingEvent, BookingSnapshot, RoomSlotBitmap
+from services.event_service import EventService, CREATED
+from services.slot_service import SlotService
+from services.usage_service import UsageService
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def init_database():
     """初始化数据库"""
-    print("创建数据库表...")
-    Base.metadata.create_all(bind=engine)
-    print("✅ 数据库表创建成功")
+    print("执行数据库迁移...")
+    migrate(engine.url.database)
+    if len(shard_sessionmakers) > 1:
+        from services.shard_service import ShardService
+        ShardService.create_shards()
+    print("✅ 数据库结构已是最新")
 
 def clear_data(db):
     """清除现有数据"""
     print("清除现有数据...")
-    db.query(Booking).delete()
+    for name in shard_sessionmakers:
+        db.shard(name).query(Booking).delete()
+        db.shard(name).query(RoomSlotBitmap).delete()
+        db.shard(name).query(BookingEvent).delete()
+        db.shard(name).query(BookingSnapshot).delete()
+        db.shard(name).commit()
     db.query(User).delete()
     db.query(Room).delete()
     db.commit()
@@ -203,6 +215,9 @@ def create_bookings(db, users, rooms):
     for booking in bookings:
         db.add(booking)
     
+    # 与接口创建的预约一样记录事件日志
+    db.flush()
+    EventService.record_from_bookings(db, [booking.id for booking in bookings], CREATED)
     db.commit()
     print(f"✅ 成功创建 {len(bookings)} 条预约记录")
     return bookings
@@ -227,6 +242,11 @@ def main():
         users = create_users(db)
         rooms = create_rooms(db)
         bookings = create_bookings(db, users, rooms)
+        UsageService.rebuild(db)
+        SlotService.rebuild(db)
+        # 示例预约先写入主库，再移动到会议室地点所属的分片
+        from services.shard_service import ShardService
+        ShardService.rebalance(db)
         
         print("\n" + "=" * 50)
         print("🎉 示例数据初始化完成！")
@@ -1,16 +1,63 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-from routers import users, rooms, bookings
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from config import settings
+from database import engine, shard_sessionmakers
+from middleware.metrics import MetricsMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.rate_limit import RateLimitMiddleware
+from middleware.recorder import TraceRecorderMiddleware
+from migrations import latest_version
+from routers import auth, users, rooms, bookings, reports, search, admin
+from services.job_service import create_job_runner
+from services.shard_service import ShardService
+from utils.auth import bearer_or_header_user_id
+from utils.metrics import REGISTRY
+from utils.rate_limit import AdmissionController, create_token_buckets
+
+# 校验数据库（含各分片库）结构版本（迁移由 python manage.py migrate 单独执行）
+ShardService.check_schema(latest_version())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """在 worker 内启动后台任务线程（每个分片库各一组），退出时等待正在执行的任务完成"""
+    runners = []
+    if settings.job_workers > 0:
+        runners = [create_job_runner(settings.job_workers, factory) for factory in shard_sessionmakers.values()]
+        for runner in runners:
+            runner.start()
+    yield
+    for runner in runners:
+        runner.stop()
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="会议室预约系统",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# 限流与过载保护（位于 CORS 之内，被拒绝的响应同样带 CORS 头，前端可读取）
+if settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        buckets=create_token_buckets(settings.rate_limit_state_path),
+        ip_rate=settings.rate_limit_ip_rate,
+        ip_burst=settings.rate_limit_ip_burst,
+        user_rate=settings.rate_limit_user_rate,
+        user_burst=settings.rate_limit_user_burst,
+        write_cost=settings.rate_limit_write_cost,
+        identify_user=bearer_or_header_user_id,
+        admission=AdmissionController(
+            settings.max_concurrent_requests,
+            settings.admission_queue_size,
+            settings.admission_queue_timeout_ms / 1000
+        )
+    )
+
 # 配置CORS - 更宽松的配置
 app.add_middleware(
     CORSMiddleware,
@@ -21,12 +68,54 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# 请求剖析（按需开启）
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        engine=engine,
+        slow_request_ms=settings.slow_request_ms,
+        slow_query_ms=settings.slow_query_ms
+    )
+
+# 响应压缩（客户端声明 Accept-Encoding: gzip 且响应足够大时启用）
+if settings.gzip_enabled:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.gzip_min_size,
+        compresslevel=settings.gzip_level
+    )
+
+# 请求录制（按需开启，位于指标之内，被限流拒绝的请求同样记录）
+if settings.trace_record_path:
+    app.add_middleware(
+        TraceRecorderMiddleware,
+        path=settings.trace_record_path,
+        identify_user=bearer_or_header_user_id,
+        max_body_bytes=settings.trace_max_body_bytes,
+        sample_rate=settings.trace_sample_rate
+    )
+
+# 请求指标（最外层，包含其他中间件的耗时）
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # 注册路由（添加尾部斜杠）
+app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(users.router, prefix="/api/users", tags=["用户管理"])
 app.include_router(rooms.router, prefix="/api/rooms", tags=["会议室管理"])
 app.include_router(bookings.router, prefix="/api/bookings", tags=["预约管理"])
+app.include_router(reports.router, prefix="/api/reports", tags=["统计报表"])
+app.include_router(search.router, prefix="/api/search", tags=["搜索"])
+app.include_router(admin.router, prefix="/api/admin", tags=["系统管理"])
 
 @app.get("/")
 def read_root():
     return {"message": "欢迎使用会议室预约系统 API"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
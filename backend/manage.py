@@ -0,0 +1,339 @@
+"""
+运维命令行工具
+
+用法:
+    python manage.py migrate          # 执行数据库结构迁移（含分片库的创建与数据迁移）
+    python manage.py rebalance-shards # 将预约数据移动到会议室地点所属的分片
+    python manage.py rebuild-usage    # 重新计算会议室每日使用汇总
+    python manage.py rebuild-slots    # 重建会议室时段位图
+    python manage.py archive          # 归档历史预约
+    python manage.py purge            # 物理删除过期的软删除记录
+    python manage.py run-jobs         # 在独立进程中执行后台任务
+    python manage.py allocate FILE    # 按 JSON 文件批量分配会议室
+    python manage.py verify-events    # 校验事件日志重放结果与预约表一致
+    python manage.py compact-events   # 生成预约状态快照并删除旧事件
+    python manage.py import KIND FILE # 流式导入会议室、用户或预约
+    python manage.py backup           # 在线备份数据库
+    python manage.py verify-backup FILE  # 还原备份到临时文件并校验
+
+按分片保存的数据（预约、事件日志、派生数据、后台任务）由各命令逐个分片处理
+"""
+import argparse
+import sys
+from time import perf_counter, sleep
+
+from database import SessionLocal, engine, shard_path, shard_sessionmakers
+
+
+def _label(name):
+    """分片部署时输出的分片前缀"""
+    return f"[{name}] " if len(shard_sessionmakers) > 1 else ""
+
+
+def cmd_migrate(args):
+    """执行数据库结构迁移"""
+    from migrations import migrate
+
+    version = migrate(engine.url.database)
+    print(f"✅ 数据库结构版本: {version}")
+    if len(shard_sessionmakers) > 1:
+        from services.shard_service import ShardService
+
+        for name, shard_version in ShardService.create_shards().items():
+            print(f"✅ 分片 {name} 结构版本: {shard_version}")
+        return cmd_rebalance_shards(args)
+
+
+def cmd_rebalance_shards(args):
+    """将预约数据移动到会议室地点所属的分片"""
+    from services.shard_service import ShardService
+
+    db = SessionLocal()
+    try:
+        start = perf_counter()
+        count = ShardService.rebalance(db)
+        print(f"✅ 已移动 {count} 个会议室的数据 ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+
+
+def cmd_rebuild_usage(args):
+    """重新计算会议室每日使用汇总"""
+    from services.usage_service import UsageService
+
+    db = SessionLocal()
+    try:
+        for name in shard_sessionmakers:
+            start = perf_counter()
+            count = UsageService.rebuild(db.shard(name))
+            print(f"✅ {_label(name)}已重建 {count} 条每日汇总 ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+
+
+def cmd_rebuild_slots(args):
+    """重建会议室时段位图"""
+    from services.slot_service import SlotService
+
+    db = SessionLocal()
+    try:
+        for name in shard_sessionmakers:
+            start = perf_counter()
+            count = SlotService.rebuild(db.shard(name))
+            print(f"✅ {_label(name)}已重建 {count} 条时段位图 ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+
+
+def cmd_archive(args):
+    """归档历史预约"""
+    from services.archive_service import ArchiveService
+
+    db = SessionLocal()
+    try:
+        for name in shard_sessionmakers:
+            start = perf_counter()
+            count = ArchiveService.archive_bookings(db.shard(name), args.days, args.batch_size)
+            print(f"✅ {_label(name)}已归档 {count} 条预约 ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+
+
+def cmd_purge(args):
+    """物理删除过期的软删除记录"""
+    from services.purge_service import PurgeService
+
+    db = SessionLocal()
+    try:
+        start = perf_counter()
+        counts = PurgeService.purge_tombstones(db, args.days, args.batch_size)
+        summary = ", ".join(f"{name} {count}" for name, count in counts.items())
+        print(f"✅ 已清理: {summary} ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+
+
+def cmd_run_jobs(args):
+    """在独立进程中执行后台任务"""
+    from services.job_service import create_job_runner
+
+    if args.once:
+        for name, session_factory in shard_sessionmakers.items():
+            start = perf_counter()
+            count = create_job_runner(0, session_factory).run_pending()
+            print(f"✅ {_label(name)}已执行 {count} 个后台任务 ({perf_counter() - start:.2f}s)")
+        return
+
+    # 每个分片的任务队列由各自的执行器处理
+    runners = [create_job_runner(args.workers, session_factory) for session_factory in shard_sessionmakers.values()]
+    for runner in runners:
+        runner.start()
+    print(f"✅ 后台任务执行中（{len(runners)} 个分片，每个分片 {args.workers} 个线程），Ctrl+C 退出")
+    try:
+        while True:
+            sleep(3600)
+    except KeyboardInterrupt:
+        for runner in runners:
+            runner.stop()
+
+
+def cmd_allocate(args):
+    """按 JSON 文件批量分配会议室"""
+    import json
+
+    from schemas import AllocationRequest
+    from services.allocation_service import AllocationService
+
+    with open(args.file, encoding="utf-8") as f:
+        request = AllocationRequest.model_validate(json.load(f))
+    db = SessionLocal()
+    try:
+        result = AllocationService.allocate(
+            db, request.requests, args.slot_minutes or request.slot_minutes, args.dry_run or request.dry_run
+        )
+    finally:
+        db.close()
+    for failure in result["unplaced"]:
+        print(f"  未分配 {failure['ref']}: {failure['reason']}")
+    action = "已写入" if result["committed"] else "未写入"
+    print(
+        f"✅ 已分配 {len(result['placed'])} / {len(request.requests)} 个会议，"
+        f"{action} ({result['elapsed_ms']:.0f}ms)"
+    )
+
+
+def cmd_verify_events(args):
+    """校验事件日志重放结果与预约表一致"""
+    from services.event_service import EventService
+
+    failed = False
+    db = SessionLocal()
+    try:
+        for name in shard_sessionmakers:
+            start = perf_counter()
+            mismatched = EventService.verify(db.shard(name))
+            if mismatched:
+                print(f"❌ {_label(name)}{len(mismatched)} 条预约与事件日志不一致: {mismatched[:20]}")
+                failed = True
+            else:
+                print(f"✅ {_label(name)}事件日志与预约表一致 ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+    return 1 if failed else None
+
+
+def cmd_compact_events(args):
+    """生成预约状态快照并删除旧事件"""
+    from services.event_service import EventService
+
+    db = SessionLocal()
+    try:
+        for name in shard_sessionmakers:
+            start = perf_counter()
+            shard_db = db.shard(name)
+            seq = EventService.compact(shard_db, args.min_events)
+            shard_db.commit()
+            if seq is None:
+                print(f"✅ {_label(name)}新事件数量未达到阈值，未生成快照")
+            else:
+                print(f"✅ {_label(name)}已生成 seq {seq} 的快照 ({perf_counter() - start:.2f}s)")
+    finally:
+        db.close()
+
+
+def cmd_import(args):
+    """流式导入 CSV / NDJSON 文件"""
+    from services.import_service import ImportService, detect_format
+
+    def progress(report):
+        print(
+            f"  已处理 {report['processed']} 行，导入 {report['imported']}，失败 {report['failed']}",
+            file=sys.stderr
+        )
+
+    fmt = detect_format(args.file, args.format)
+    db = SessionLocal()
+    try:
+        with open(args.file, "rb") as f:
+            result = ImportService.import_file(db, args.kind, f, fmt, args.dry_run, progress)
+    finally:
+        db.close()
+    for error in result["errors"]:
+        print(f"  第 {error['line']} 行: {error['message']}")
+    if result["failed"] > len(result["errors"]):
+        print(f"  ……另有 {result['failed'] - len(result['errors'])} 行错误未列出")
+    action = "校验通过" if result["dry_run"] else "已导入"
+    count = result["valid"] if result["dry_run"] else result["imported"]
+    print(
+        f"✅ {action} {count} / {result['processed']} 行，失败 {result['failed']} 行 "
+        f"({result['elapsed_ms'] / 1000:.2f}s)"
+    )
+    return 1 if result["failed"] else None
+
+
+def cmd_backup(args):
+    """在线备份数据库"""
+    from services.backup_service import BackupService
+
+    # 每个分片库单独备份（各自的一致快照）
+    for name in shard_sessionmakers:
+        result = BackupService.create_backup(
+            BackupService.shard_backup_dir(name, args.output_dir), not args.no_compress, not args.no_verify,
+            args.rate_limit_mb, shard_path(name)
+        )
+        for removed in result["removed"]:
+            print(f"  {_label(name)}已删除旧备份 {removed}")
+        print(
+            f"✅ {_label(name)}已备份到 {result['path']}（{result['size_bytes'] / 1024 / 1024:.1f} MB，"
+            f"重新开始 {result['restarts']} 次，{result['elapsed_ms'] / 1000:.2f}s）"
+        )
+        print(f"  sha256 {result['sha256']}")
+
+
+def cmd_verify_backup(args):
+    """还原备份到临时文件并校验"""
+    from services.backup_service import BackupService
+
+    start = perf_counter()
+    result = BackupService.verify_backup(args.file)
+    if not result["ok"]:
+        print(f"❌ 备份校验失败: {'; '.join(result['integrity'])}")
+        return 1
+    tables = ", ".join(f"{name} {count}" for name, count in result["tables"].items())
+    print(f"✅ 备份完整，结构版本 {result['user_version']}: {tables} ({perf_counter() - start:.2f}s)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="会议室预约系统运维工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="执行数据库结构迁移（配置了分片时同时创建、迁移分片库并移动预约数据）")
+    migrate.set_defaults(func=cmd_migrate)
+
+    rebalance_shards = subparsers.add_parser(
+        "rebalance-shards", help="修改分片配置后，将会议室的预约及派生数据移动到地点所属的分片"
+    )
+    rebalance_shards.set_defaults(func=cmd_rebalance_shards)
+
+    rebuild_usage = subparsers.add_parser("rebuild-usage", help="重新计算会议室每日使用汇总")
+    rebuild_usage.set_defaults(func=cmd_rebuild_usage)
+
+    rebuild_slots = subparsers.add_parser("rebuild-slots", help="根据预约重建会议室时段位图")
+    rebuild_slots.set_defaults(func=cmd_rebuild_slots)
+
+    archive = subparsers.add_parser("archive", help="将已结束的历史预约分批迁移到归档表")
+    archive.add_argument("--days", type=int, default=None, help="归档多少天之前结束的预约（默认取配置）")
+    archive.add_argument("--batch-size", type=int, default=None, help="每批条数（默认取配置）")
+    archive.set_defaults(func=cmd_archive)
+
+    purge = subparsers.add_parser("purge", help="分批物理删除软删除超过保留期的预约、会议室和用户")
+    purge.add_argument("--days", type=int, default=None, help="删除多少天之前软删除的记录（默认取配置）")
+    purge.add_argument("--batch-size", type=int, default=None, help="每批条数（默认取配置）")
+    purge.set_defaults(func=cmd_purge)
+
+    run_jobs = subparsers.add_parser("run-jobs", help="执行后台任务（适用于 BOOKING_JOB_WORKERS=0 的部署）")
+    run_jobs.add_argument("--workers", type=int, default=2, help="线程数")
+    run_jobs.add_argument("--once", action="store_true", help="执行完当前到期的任务后退出")
+    run_jobs.set_defaults(func=cmd_run_jobs)
+
+    allocate = subparsers.add_parser("allocate", help="按 JSON 文件（与 POST /api/admin/allocations 请求体相同）批量分配会议室")
+    allocate.add_argument("file", help="请求文件")
+    allocate.add_argument("--dry-run", action="store_true", help="只计算方案，不创建预约")
+    allocate.add_argument("--slot-minutes", type=int, default=None, help="开始时间对齐粒度（默认取文件中的设置）")
+    allocate.set_defaults(func=cmd_allocate)
+
+    verify_events = subparsers.add_parser("verify-events", help="由快照和事件日志重建预约状态并与预约表比较")
+    verify_events.set_defaults(func=cmd_verify_events)
+
+    compact_events = subparsers.add_parser("compact-events", help="生成预约状态快照并删除上一个快照之前的事件")
+    compact_events.add_argument("--min-events", type=int, default=None, help="新事件少于该数量时跳过（默认取配置）")
+    compact_events.set_defaults(func=cmd_compact_events)
+
+    import_ = subparsers.add_parser("import", help="流式导入会议室、用户或预约（CSV 或 NDJSON）")
+    import_.add_argument("kind", choices=["rooms", "users", "bookings"], help="导入类型")
+    import_.add_argument("file", help="数据文件")
+    import_.add_argument("--format", choices=["csv", "ndjson"], default=None, help="文件格式（默认按扩展名判断）")
+    import_.add_argument("--dry-run", action="store_true", help="只校验，不写入")
+    import_.set_defaults(func=cmd_import)
+
+    backup = subparsers.add_parser("backup", help="在线备份数据库（无需停止 worker）")
+    backup.add_argument("--output-dir", default=None, help="备份目录（默认取配置；分片库备份到其下的 shards/<分片名>）")
+    backup.add_argument("--no-compress", action="store_true", help="不压缩")
+    backup.add_argument("--no-verify", action="store_true", help="跳过还原校验")
+    backup.add_argument("--rate-limit-mb", type=float, default=None, help="每秒最多复制的 MB 数，0 表示不限速（默认取配置）")
+    backup.set_defaults(func=cmd_backup)
+
+    verify_backup = subparsers.add_parser("verify-backup", help="将备份还原到临时文件并执行完整性检查")
+    verify_backup.add_argument("file", help="备份文件（.db 或 .db.gz）")
+    verify_backup.set_defaults(func=cmd_verify_backup)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+请求指标中间件
+按路由模板和状态码记录请求耗时，以及每个请求的 SQL 语句数和耗时
+"""
+
+from time import perf_counter
+
+from utils.metrics import (
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUEST_DB_STATEMENTS,
+    HTTP_REQUEST_DB_SECONDS,
+    begin_request_stats,
+    end_request_stats,
+)
+
+
+# 未匹配任何路由的请求统一归入此标签，避免标签数量无限增长
+UNMATCHED_ROUTE = "unmatched"
+
+
+def resolve_route_path(scope) -> str:
+    """
+    获取请求匹配到的路由模板（如 /api/bookings/{booking_id}）
+
+    Args:
+        scope: ASGI scope（路由匹配后会写入 endpoint）
+
+    Returns:
+        路由模板
+    """
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    route_paths = getattr(app.state, "route_paths", None)
+    if route_paths is None:
+        route_paths = {
+            route.endpoint: route.path
+            for route in app.routes
+            if getattr(route, "endpoint", None) is not None
+        }
+        app.state.route_paths = route_paths
+    return route_paths.get(endpoint, UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """请求指标中间件（纯 ASGI 实现，不缓冲响应体）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats, token = begin_request_stats()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            end_request_stats(token)
+            route = resolve_route_path(scope)
+            HTTP_REQUEST_SECONDS.observe(
+                elapsed, method=scope["method"], route=route, status=str(status_code)
+            )
+            HTTP_REQUEST_DB_STATEMENTS.observe(stats.statements, route=route)
+            HTTP_REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route)
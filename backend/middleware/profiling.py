@@ -0,0 +1,49 @@
+"""
+请求剖析中间件
+记录每个请求的分段耗时，通过 Server-Timing 响应头返回，超过阈值时输出慢请求日志
+"""
+
+from time import perf_counter
+
+from starlette.concurrency import run_in_threadpool
+
+from utils.profiling import begin_profile, end_profile, log_slow_request
+
+
+class ProfilingMiddleware:
+    """请求剖析中间件（纯 ASGI 实现）"""
+
+    def __init__(self, app, engine, slow_request_ms: float = 500, slow_query_ms: float = 100):
+        self.app = app
+        self.engine = engine
+        self.slow_request_seconds = slow_request_ms / 1000
+        self.slow_query_seconds = slow_query_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile, token = begin_profile(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timing = (
+                    f"db;dur={profile.total('db') * 1000:.2f}, "
+                    f"endpoint;dur={profile.endpoint_seconds * 1000:.2f}, "
+                    f"serialize;dur={profile.serialize_seconds * 1000:.2f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_profile(token)
+            total = perf_counter() - profile.started
+            if total >= self.slow_request_seconds:
+                await run_in_threadpool(
+                    log_slow_request, self.engine, profile, total, self.slow_query_seconds
+                )
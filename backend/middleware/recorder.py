@@ -0,0 +1,88 @@
+"""
+请求录制中间件
+将请求（方法、路径、用户、部分请求头、请求体）和响应状态写入轨迹文件，供 benchmarks/replay_trace.py 重放；
+请求体中的密码字段写入前被替换（见 utils/trace.py）
+"""
+
+import random
+import zlib
+from time import perf_counter, time
+
+from starlette.concurrency import run_in_threadpool
+
+from middleware.metrics import UNMATCHED_ROUTE, resolve_route_path
+from utils.trace import TRACE_HEADERS, TraceWriter, encode_body, is_recorded_path
+
+
+class TraceRecorderMiddleware:
+    """请求录制中间件（纯 ASGI 实现，不缓冲响应体）"""
+
+    def __init__(self, app, path: str, identify_user, max_body_bytes: int = 65536, sample_rate: float = 1.0):
+        self.app = app
+        self.writer = TraceWriter(path)
+        self.identify_user = identify_user
+        self.max_body_bytes = max_body_bytes
+        self.sample_rate = sample_rate
+
+    def _sampled(self, user) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        # 按用户采样，保留被采样用户的完整请求序列
+        if user is not None:
+            return zlib.crc32(user.encode("utf-8")) % 10000 < self.sample_rate * 10000
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_recorded_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        user = self.identify_user(scope)
+        if not self._sampled(user):
+            await self.app(scope, receive, send)
+            return
+
+        chunks, size = [], 0
+        status_code = 500
+
+        async def receive_wrapper():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                # 超过上限后不再保存，只记录为截断
+                if size <= self.max_body_bytes:
+                    chunks.append(body)
+                size += len(body)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration_ms = (perf_counter() - start) * 1000
+            route = resolve_route_path(scope)
+            headers = {}
+            for name, value in scope.get("headers", ()):
+                name = name.decode("latin-1")
+                if name in TRACE_HEADERS:
+                    headers[name] = value.decode("latin-1")
+            record = {
+                "ts": started_at,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "route": None if route == UNMATCHED_ROUTE else route,
+                "user": user,
+                "headers": headers,
+            }
+            record.update(encode_body(b"".join(chunks), self.max_body_bytes))
+            record.update(status=status_code, duration_ms=round(duration_ms, 3))
+            await run_in_threadpool(self.writer.write, record)
@@ -0,0 +1,117 @@
+"""
+数据库结构迁移
+
+- 每个迁移是本目录下的 vNNNN_<说明>.py 模块，提供 upgrade(conn) 函数（conn 为 sqlite3.Connection）
+- 当前结构版本记录在 PRAGMA user_version 中
+- 迁移只由 `python manage.py migrate` 执行；worker 启动时仅校验版本号
+"""
+
+import importlib
+import pkgutil
+import re
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+_MODULE_PATTERN = re.compile(r"^v(\d{4})_\w+$")
+
+
+class SchemaVersionError(RuntimeError):
+    """数据库结构版本与代码不一致"""
+
+
+def discover() -> List[Tuple[int, str, Callable]]:
+    """
+    查找全部迁移
+
+    Returns:
+        按版本号排序的 [(版本号, 模块名, upgrade 函数), ...]
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_PATTERN.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append((int(match.group(1)), module_info.name, module.upgrade))
+    migrations.sort()
+    return migrations
+
+
+def latest_version() -> int:
+    """代码所需的结构版本（只读取模块名，不导入迁移模块）"""
+    versions = [
+        int(match.group(1))
+        for match in (_MODULE_PATTERN.match(info.name) for info in pkgutil.iter_modules(__path__))
+        if match
+    ]
+    return max(versions, default=0)
+
+
+def current_version(database_path: str) -> int:
+    """
+    读取数据库当前结构版本
+
+    Args:
+        database_path: SQLite 文件路径
+
+    Returns:
+        PRAGMA user_version 的值
+    """
+    conn = sqlite3.connect(database_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def migrate(database_path: str, log: Callable[[str], None] = print) -> int:
+    """
+    执行所有未应用的迁移
+
+    在 BEGIN IMMEDIATE 事务中执行，多个进程同时运行时只有一个会真正迁移
+
+    Args:
+        database_path: SQLite 文件路径
+        log: 日志输出函数
+
+    Returns:
+        迁移后的结构版本
+    """
+    conn = sqlite3.connect(database_path, isolation_level=None, timeout=30)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, name, upgrade in discover():
+                if target <= version:
+                    continue
+                log(f"⚙️  应用迁移 {name}")
+                upgrade(conn)
+                conn.execute(f"PRAGMA user_version = {target:d}")
+                version = target
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+    finally:
+        conn.close()
+
+
+def check_schema_version(database_path: str, expected: int) -> None:
+    """
+    校验数据库结构版本（worker 启动时调用，只执行一次 PRAGMA 查询）
+
+    Args:
+        database_path: SQLite 文件路径
+        expected: 代码所需的结构版本
+
+    Raises:
+        SchemaVersionError: 版本不一致时抛出
+    """
+    version = current_version(database_path)
+    if version != expected:
+        raise SchemaVersionError(
+            f"数据库结构版本为 {version}，代码需要 {expected}，请先运行 `python manage.py migrate`"
+        )
@@ -0,0 +1,109 @@
+"""
+初始数据库结构
+
+兼容此前由 Base.metadata.create_all 创建的数据库：所有语句均使用 IF NOT EXISTS
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        username VARCHAR NOT NULL,
+        email VARCHAR NOT NULL,
+        phone VARCHAR,
+        hashed_password VARCHAR NOT NULL,
+        is_active BOOLEAN,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    """
+    CREATE TABLE IF NOT EXISTS rooms (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        location VARCHAR NOT NULL,
+        capacity INTEGER NOT NULL,
+        description VARCHAR,
+        is_available BOOLEAN,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_rooms_id ON rooms (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_rooms_name ON rooms (name)",
+    """
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        room_id INTEGER NOT NULL,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME NOT NULL,
+        purpose VARCHAR,
+        status VARCHAR,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(room_id) REFERENCES rooms (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_bookings_id ON bookings (id)",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_end_time ON bookings (end_time)",
+    """
+    CREATE TABLE IF NOT EXISTS bookings_archive (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        room_id INTEGER NOT NULL,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME NOT NULL,
+        purpose VARCHAR,
+        status VARCHAR NOT NULL,
+        created_at DATETIME,
+        archived_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(room_id) REFERENCES rooms (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_bookings_archive_room_start ON bookings_archive (room_id, start_time)",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_archive_user_start ON bookings_archive (user_id, start_time)",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_archive_end_time ON bookings_archive (end_time)",
+    """
+    CREATE TABLE IF NOT EXISTS room_usage_daily (
+        room_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        booked_minutes INTEGER NOT NULL,
+        booking_count INTEGER NOT NULL,
+        PRIMARY KEY (room_id, day),
+        FOREIGN KEY(room_id) REFERENCES rooms (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_room_usage_daily_day ON room_usage_daily (day)",
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        "key" VARCHAR NOT NULL,
+        request_hash VARCHAR NOT NULL,
+        status_code INTEGER,
+        response_body TEXT,
+        created_at DATETIME,
+        expires_at DATETIME NOT NULL,
+        PRIMARY KEY ("key")
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)",
+    """
+    CREATE TABLE IF NOT EXISTS cache_generations (
+        namespace VARCHAR NOT NULL,
+        generation INTEGER NOT NULL,
+        PRIMARY KEY (namespace)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cache_generations_generation ON cache_generations (generation)",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
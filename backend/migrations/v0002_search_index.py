@@ -0,0 +1,64 @@
+"""
+全文搜索索引
+
+search_index 为 FTS5 虚拟表（trigram 分词，支持中文子串与前缀匹配），
+由触发器与 users / rooms / bookings 保持同步
+
+rowid = 源记录 id * 4 + 类型编号（1 用户、2 会议室、3 预约），
+增删改时按 rowid 定位索引行，无需扫描
+"""
+
+USER_KIND = 1
+ROOM_KIND = 2
+BOOKING_KIND = 3
+
+# (源表, 类型编号, 标题表达式, 正文表达式, 触发更新的列, 是否建立索引的条件)
+SOURCES = [
+    ("users", USER_KIND, "{row}.username", "{row}.email", "username, email", "1"),
+    (
+        "rooms", ROOM_KIND, "{row}.name",
+        "TRIM({row}.location || ' ' || COALESCE({row}.description, ''))",
+        "name, location, description", "1"
+    ),
+    ("bookings", BOOKING_KIND, "{row}.purpose", "''", "purpose", "COALESCE({row}.purpose, '') != ''"),
+]
+
+
+def _statements():
+    yield (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+        "USING fts5(title, body, tokenize = 'trigram')"
+    )
+    for table, kind, title, body, columns, condition in SOURCES:
+        rowid = "{row}.id * 4 + %d" % kind
+        insert = (
+            f"INSERT INTO search_index (rowid, title, body) "
+            f"VALUES ({rowid.format(row='NEW')}, {title.format(row='NEW')}, {body.format(row='NEW')})"
+        )
+        delete = f"DELETE FROM search_index WHERE rowid = {rowid.format(row='OLD')}"
+        yield (
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} "
+            f"WHEN {condition.format(row='NEW')} BEGIN {insert}; END"
+        )
+        yield (
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} "
+            f"BEGIN {delete}; END"
+        )
+        yield (
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {columns} ON {table} "
+            f"BEGIN {delete}; "
+            f"INSERT INTO search_index (rowid, title, body) "
+            f"SELECT {rowid.format(row='NEW')}, {title.format(row='NEW')}, {body.format(row='NEW')} "
+            f"WHERE {condition.format(row='NEW')}; END"
+        )
+        # 为已有数据建立索引
+        yield (
+            f"INSERT INTO search_index (rowid, title, body) "
+            f"SELECT {rowid.format(row=table)}, {title.format(row=table)}, {body.format(row=table)} "
+            f"FROM {table} WHERE {condition.format(row=table)}"
+        )
+
+
+def upgrade(conn):
+    for statement in _statements():
+        conn.execute(statement)
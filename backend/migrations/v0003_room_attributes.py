@@ -0,0 +1,26 @@
+"""
+会议室结构化属性
+
+- rooms 增加 building（楼栋）、floor（楼层）
+- room_equipment 保存设备标签（每个会议室每个标签一行）
+"""
+
+STATEMENTS = [
+    "ALTER TABLE rooms ADD COLUMN building VARCHAR",
+    "ALTER TABLE rooms ADD COLUMN floor INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_rooms_building_floor ON rooms (building, floor)",
+    """
+    CREATE TABLE IF NOT EXISTS room_equipment (
+        room_id INTEGER NOT NULL,
+        tag VARCHAR NOT NULL,
+        PRIMARY KEY (room_id, tag),
+        FOREIGN KEY(room_id) REFERENCES rooms (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_room_equipment_tag ON room_equipment (tag, room_id)",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
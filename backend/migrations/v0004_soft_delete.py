@@ -0,0 +1,42 @@
+"""
+软删除
+
+- users / rooms / bookings 增加 deleted_at（墓碑时间戳），删除操作只写入该字段
+- 常用查询使用仅包含未删除行的部分索引；墓碑行另有部分索引，供清理任务分批删除
+- 用户名、邮箱、会议室名称的唯一约束只作用于未删除的行（删除后名称可重新使用）
+- 软删除时同步移除全文搜索索引中的对应条目
+"""
+
+STATEMENTS = [
+    "ALTER TABLE users ADD COLUMN deleted_at DATETIME",
+    "ALTER TABLE rooms ADD COLUMN deleted_at DATETIME",
+    "ALTER TABLE bookings ADD COLUMN deleted_at DATETIME",
+
+    "DROP INDEX IF EXISTS ix_users_username",
+    "DROP INDEX IF EXISTS ix_users_email",
+    "DROP INDEX IF EXISTS ix_rooms_name",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username) WHERE deleted_at IS NULL",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email) WHERE deleted_at IS NULL",
+    "CREATE UNIQUE INDEX ix_rooms_name ON rooms (name) WHERE deleted_at IS NULL",
+
+    "CREATE INDEX ix_bookings_room_start_live ON bookings (room_id, start_time) WHERE deleted_at IS NULL",
+    "CREATE INDEX ix_bookings_user_start_live ON bookings (user_id, start_time) WHERE deleted_at IS NULL",
+
+    "CREATE INDEX ix_users_tombstone ON users (deleted_at) WHERE deleted_at IS NOT NULL",
+    "CREATE INDEX ix_rooms_tombstone ON rooms (deleted_at) WHERE deleted_at IS NOT NULL",
+    "CREATE INDEX ix_bookings_tombstone ON bookings (deleted_at) WHERE deleted_at IS NOT NULL",
+]
+
+# 软删除时从全文搜索索引中移除（rowid 规则见 v0002_search_index）
+SEARCH_KINDS = (("users", 1), ("rooms", 2), ("bookings", 3))
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
+    for table, kind in SEARCH_KINDS:
+        conn.execute(
+            f"CREATE TRIGGER {table}_search_tombstone AFTER UPDATE OF deleted_at ON {table} "
+            f"WHEN NEW.deleted_at IS NOT NULL "
+            f"BEGIN DELETE FROM search_index WHERE rowid = OLD.id * 4 + {kind}; END"
+        )
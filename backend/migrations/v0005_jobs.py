@@ -0,0 +1,33 @@
+"""
+后台任务表
+
+- jobs 保存待执行的后台任务（由 services/job_service.py 入队、领取和完成）
+- status 为 queued / running / failed；成功的任务直接删除
+- dedupe_key 在排队中的任务里唯一，重复入队会被合并
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER NOT NULL PRIMARY KEY,
+        kind VARCHAR NOT NULL,
+        payload TEXT NOT NULL,
+        status VARCHAR NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_at DATETIME NOT NULL,
+        locked_until DATETIME,
+        last_error TEXT,
+        dedupe_key VARCHAR,
+        created_at DATETIME
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_jobs_queued_run_at ON jobs (run_at) WHERE status = 'queued'",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_running_locked ON jobs (locked_until) WHERE status = 'running'",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_jobs_dedupe_key ON jobs (dedupe_key) WHERE status = 'queued'",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
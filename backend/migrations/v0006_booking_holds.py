@@ -0,0 +1,17 @@
+"""
+预约临时保留
+
+- bookings 增加 hold_expires_at：status 为 pending 且该值非空的行是临时保留，过期后不再占用时间段
+- ix_bookings_pending 只包含未删除的 pending 预约，按过期时间排序，清理任务无需扫描全表
+"""
+
+STATEMENTS = [
+    "ALTER TABLE bookings ADD COLUMN hold_expires_at DATETIME",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_pending ON bookings (hold_expires_at) "
+    "WHERE status = 'pending' AND deleted_at IS NULL",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,22 @@
+"""
+令牌吊销列表
+
+token_revocations 的 key 为 "jti:<令牌ID>"（吊销单个令牌）或 "user:<用户ID>"（吊销该用户在 revoked_at 之前签发的全部令牌），
+expires_at 之后对应令牌已自然过期，记录可以删除。各 worker 在内存中保存该表，通过 cache_generations 同步变更
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS token_revocations (
+        key VARCHAR NOT NULL PRIMARY KEY,
+        revoked_at DATETIME NOT NULL,
+        expires_at DATETIME NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_token_revocations_expires_at ON token_revocations (expires_at)",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,16 @@
+"""
+用户日程索引
+
+ix_bookings_user_status_start 只包含未删除的预约，用户重叠检查和日程查询按
+(user_id, status IN (...), start_time 区间) 做有界的范围扫描，不随用户历史预约数增长
+"""
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_bookings_user_status_start ON bookings (user_id, status, start_time) "
+    "WHERE deleted_at IS NULL",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
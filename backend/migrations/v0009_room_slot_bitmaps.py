@@ -0,0 +1,54 @@
+"""
+会议室时段位图
+
+room_slot_bitmaps 以 (day, room_id) 为主键，bits 为 12 字节位图（96 个 15 分钟时段，小端序，第 i 位对应当天第 i 个时段），
+按日期读取全部会议室的位图为一次主键范围扫描。迁移时根据现有预约和归档预约回填
+"""
+
+from datetime import datetime, time, timedelta
+
+SLOT_SECONDS = 15 * 60
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS room_slot_bitmaps (
+        day DATE NOT NULL,
+        room_id INTEGER NOT NULL REFERENCES rooms (id),
+        bits BLOB NOT NULL,
+        PRIMARY KEY (day, room_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+BACKFILL_QUERIES = [
+    "SELECT room_id, start_time, end_time FROM bookings "
+    "WHERE deleted_at IS NULL AND status IN ('pending', 'confirmed') "
+    "AND (hold_expires_at IS NULL OR hold_expires_at > :now)",
+    "SELECT room_id, start_time, end_time FROM bookings_archive WHERE status != 'cancelled'",
+]
+
+
+def _masks(start, end):
+    while start < end:
+        day_start = datetime.combine(start.date(), time.min)
+        piece_end = min(end, day_start + timedelta(days=1))
+        first = int((start - day_start).total_seconds()) // SLOT_SECONDS
+        last = -(-int((piece_end - day_start).total_seconds()) // SLOT_SECONDS)
+        yield start.date(), ((1 << last) - 1) ^ ((1 << first) - 1)
+        start = piece_end
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
+
+    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+    bitmaps = {}
+    for query in BACKFILL_QUERIES:
+        for room_id, start_time, end_time in conn.execute(query, {"now": now}):
+            for day, mask in _masks(datetime.fromisoformat(start_time), datetime.fromisoformat(end_time)):
+                bitmaps[day, room_id] = bitmaps.get((day, room_id), 0) | mask
+    conn.executemany(
+        "INSERT INTO room_slot_bitmaps (day, room_id, bits) VALUES (?, ?, ?)",
+        ((day.isoformat(), room_id, bits.to_bytes(12, "little")) for (day, room_id), bits in bitmaps.items())
+    )
@@ -0,0 +1,22 @@
+"""
+日历订阅版本号
+
+calendar_versions 以 (scope, owner_id) 为主键：scope 为 room / user，相关预约变更时 version 递增。
+没有记录的会议室或用户版本号视为 0
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS calendar_versions (
+        scope VARCHAR NOT NULL,
+        owner_id INTEGER NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, owner_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,66 @@
+"""
+预约事件日志与快照
+
+- booking_events 只追加：每次创建、临时保留、确认、取消、过期、删除、归档预约时在同一事务中写入一行，
+  seq 使用 AUTOINCREMENT，单调递增且不会复用（删除旧事件后也不会）
+- booking_snapshots 保存某个 seq 时 bookings 表中未删除预约的完整状态（gzip 压缩的 JSON），
+  重建状态 = 最新快照 + 之后的事件
+- 迁移时写入 seq 为 0 的初始快照
+"""
+
+import gzip
+import json
+from datetime import datetime
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS booking_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        booking_id INTEGER NOT NULL,
+        kind VARCHAR NOT NULL,
+        user_id INTEGER NOT NULL,
+        room_id INTEGER NOT NULL,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME NOT NULL,
+        status VARCHAR NOT NULL,
+        hold_expires_at DATETIME,
+        occurred_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS booking_snapshots (
+        seq INTEGER NOT NULL PRIMARY KEY,
+        created_at DATETIME NOT NULL,
+        booking_count INTEGER NOT NULL,
+        state BLOB NOT NULL
+    )
+    """,
+]
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    return datetime.fromisoformat(value).isoformat(" ", "microseconds")
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
+
+    state = {
+        str(booking_id): [user_id, room_id, _normalize(start_time), _normalize(end_time), status,
+                          _normalize(hold_expires_at)]
+        for booking_id, user_id, room_id, start_time, end_time, status, hold_expires_at in conn.execute(
+            "SELECT id, user_id, room_id, start_time, end_time, status, hold_expires_at "
+            "FROM bookings WHERE deleted_at IS NULL"
+        )
+    }
+    conn.execute(
+        "INSERT INTO booking_snapshots (seq, created_at, booking_count, state) VALUES (0, ?, ?, ?)",
+        (
+            datetime.utcnow().isoformat(" ", "microseconds"),
+            len(state),
+            gzip.compress(json.dumps(state, separators=(",", ":")).encode("utf-8")),
+        )
+    )
@@ -0,0 +1,61 @@
+"""
+按地点分片
+
+- bookings 表重建为 AUTOINCREMENT：预约ID不再复用（归档、清理删除 id 最大的行之后也不会），
+  各分片库的 sqlite_sequence 从不同的起点开始，预约ID全局唯一，可由ID直接定位所在分片
+- shards 表登记已创建的分片及其编号（只使用主库中的记录，主库编号为 0）
+"""
+
+from datetime import datetime
+
+BOOKING_COLUMNS = (
+    "id", "user_id", "room_id", "start_time", "end_time", "purpose", "status", "created_at",
+    "deleted_at", "hold_expires_at",
+)
+
+STATEMENTS = [
+    """
+    CREATE TABLE bookings_new (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        room_id INTEGER NOT NULL,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME NOT NULL,
+        purpose VARCHAR,
+        status VARCHAR,
+        created_at DATETIME,
+        deleted_at DATETIME,
+        hold_expires_at DATETIME,
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(room_id) REFERENCES rooms (id)
+    )
+    """,
+    "INSERT INTO bookings_new ({columns}) SELECT {columns} FROM bookings".format(columns=", ".join(BOOKING_COLUMNS)),
+    "DROP TABLE bookings",
+    "ALTER TABLE bookings_new RENAME TO bookings",
+    """
+    CREATE TABLE IF NOT EXISTS shards (
+        name VARCHAR NOT NULL PRIMARY KEY,
+        shard_index INTEGER NOT NULL UNIQUE,
+        created_at DATETIME NOT NULL
+    )
+    """,
+]
+
+
+def upgrade(conn):
+    # 删除旧表时其索引和触发器（全文搜索同步）一并删除，重建新表后按原定义恢复
+    saved = [
+        sql for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = 'bookings' AND type IN ('index', 'trigger') "
+            "AND sql IS NOT NULL ORDER BY type, name"
+        )
+    ]
+    for statement in STATEMENTS:
+        conn.execute(statement)
+    for sql in saved:
+        conn.execute(sql)
+    conn.execute(
+        "INSERT OR IGNORE INTO shards (name, shard_index, created_at) VALUES ('main', 0, ?)",
+        (datetime.utcnow().isoformat(" ", "microseconds"),)
+    )
@@ -0,0 +1,16 @@
+"""
+未确认预约的开始时间索引
+
+ix_bookings_pending_start 与 ix_bookings_pending 的范围相同（未删除的 pending 预约），按开始时间排序；
+清理任务分别按过期时间和开始时间做范围扫描，不再逐行检查全部 pending 预约
+"""
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_bookings_pending_start ON bookings (start_time) "
+    "WHERE status = 'pending' AND deleted_at IS NULL",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,18 @@
+"""
+预约的幂等键
+
+- bookings 增加 idempotency_key：带 Idempotency-Key 创建的预约记录该键，与预约在同一事务中写入
+- ix_bookings_idempotency_key 保证同一幂等键最多创建一条预约；进程在提交预约后、保存响应前退出时，
+  接管该幂等键的请求按此键找回已创建的预约，不再重复创建
+"""
+
+STATEMENTS = [
+    "ALTER TABLE bookings ADD COLUMN idempotency_key VARCHAR",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_bookings_idempotency_key ON bookings (idempotency_key) "
+    "WHERE idempotency_key IS NOT NULL",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Boolean, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -7,27 +7,62 @@ class User(Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
+    username = Column(String, nullable=False)
+    email = Column(String, nullable=False)
     phone = Column(String, nullable=True)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.now)
+    deleted_at = Column(DateTime, nullable=True)  # 软删除时间（墓碑）
     
     bookings = relationship("Booking", back_populates="user")
+    
+    __table_args__ = (
+        Index("ix_users_username", "username", unique=True, sqlite_where=text("deleted_at IS NULL")),
+        Index("ix_users_email", "email", unique=True, sqlite_where=text("deleted_at IS NULL")),
+        Index("ix_users_tombstone", "deleted_at", sqlite_where=text("deleted_at IS NOT NULL")),
+    )
 
 class Room(Base):
     __tablename__ = "rooms"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
     location = Column(String, nullable=False)
     capacity = Column(Integer, nullable=False)
     description = Column(String, nullable=True)
+    building = Column(String, nullable=True)
+    floor = Column(Integer, nullable=True)
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.now)
+    deleted_at = Column(DateTime, nullable=True)  # 软删除时间（墓碑）
     
     bookings = relationship("Booking", back_populates="room")
+    equipment_items = relationship(
+        "RoomEquipment", cascade="all, delete-orphan", lazy="selectin", order_by="RoomEquipment.tag"
+    )
+    
+    __table_args__ = (
+        Index("ix_rooms_name", "name", unique=True, sqlite_where=text("deleted_at IS NULL")),
+        Index("ix_rooms_building_floor", "building", "floor"),
+        Index("ix_rooms_tombstone", "deleted_at", sqlite_where=text("deleted_at IS NOT NULL")),
+    )
+    
+    @property
+    def equipment(self):
+        """设备标签列表"""
+        return [item.tag for item in self.equipment_items]
+
+class RoomEquipment(Base):
+    """会议室设备标签"""
+    __tablename__ = "room_equipment"
+    
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    
+    __table_args__ = (
+        Index("ix_room_equipment_tag", "tag", "room_id"),
+    )
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -36,11 +71,172 @@ class Booking(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
     start_time = Column(DateTime, nullable=False)
-    end_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False, index=True)
     purpose = Column(String, nullable=True)
     status = Column(String, default="pending")  # pending, confirmed, cancelled
     created_at = Column(DateTime, default=datetime.now)
+    deleted_at = Column(DateTime, nullable=True)  # 软删除时间（墓碑）
+    hold_expires_at = Column(DateTime, nullable=True)  # 临时保留的过期时间（仅 pending）
+    idempotency_key = Column(String, nullable=True)  # 创建请求的 Idempotency-Key
     
     user = relationship("User", back_populates="bookings")
     room = relationship("Room", back_populates="bookings")
+    
+    __table_args__ = (
+        # 部分索引只包含未删除的预约
+        Index("ix_bookings_room_start_live", "room_id", "start_time", sqlite_where=text("deleted_at IS NULL")),
+        Index("ix_bookings_user_start_live", "user_id", "start_time", sqlite_where=text("deleted_at IS NULL")),
+        Index(
+            "ix_bookings_user_status_start", "user_id", "status", "start_time",
+            sqlite_where=text("deleted_at IS NULL")
+        ),
+        Index("ix_bookings_tombstone", "deleted_at", sqlite_where=text("deleted_at IS NOT NULL")),
+        Index(
+            "ix_bookings_pending", "hold_expires_at",
+            sqlite_where=text("status = 'pending' AND deleted_at IS NULL")
+        ),
+        Index(
+            "ix_bookings_pending_start", "start_time",
+            sqlite_where=text("status = 'pending' AND deleted_at IS NULL")
+        ),
+        Index(
+            "ix_bookings_idempotency_key", "idempotency_key", unique=True,
+            sqlite_where=text("idempotency_key IS NOT NULL")
+        ),
+        # id 不复用；各分片从不同起点分配，预约ID全局唯一（见 services/shard_service.py）
+        {"sqlite_autoincrement": True},
+    )
+
+class BookingArchive(Base):
+    """已归档的历史预约（结构与 bookings 相同，由归档任务批量迁移）"""
+    __tablename__ = "bookings_archive"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    purpose = Column(String, nullable=True)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.now)
+    
+    user = relationship("User", viewonly=True)
+    room = relationship("Room", viewonly=True)
+    
+    __table_args__ = (
+        Index("ix_bookings_archive_room_start", "room_id", "start_time"),
+        Index("ix_bookings_archive_user_start", "user_id", "start_time"),
+        Index("ix_bookings_archive_end_time", "end_time"),
+    )
+
+class RoomUsageDaily(Base):
+    """会议室每日占用汇总（按 UTC 日期，预约变更后由后台任务重新计算）"""
+    __tablename__ = "room_usage_daily"
+    
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    booked_minutes = Column(Integer, nullable=False, default=0)
+    booking_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_room_usage_daily_day", "day"),
+    )
+
+class RoomSlotBitmap(Base):
+    """会议室每日时段位图（按 UTC 日期，每位对应 15 分钟，预约变更时在同一事务中重新计算）"""
+    __tablename__ = "room_slot_bitmaps"
+    
+    day = Column(Date, primary_key=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    bits = Column(LargeBinary, nullable=False)
 
+class CalendarVersion(Base):
+    """日历订阅版本号（相关预约变更时递增，用于 ETag 和服务端缓存）"""
+    __tablename__ = "calendar_versions"
+    
+    scope = Column(String, primary_key=True)  # room, user
+    owner_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class BookingEvent(Base):
+    """预约事件日志（只追加，seq 单调递增，旧事件在生成快照后删除）"""
+    __tablename__ = "booking_events"
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    booking_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # created, held, confirmed, cancelled, expired, deleted, archived, moved_out, moved_in
+    user_id = Column(Integer, nullable=False)
+    room_id = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False)
+    hold_expires_at = Column(DateTime, nullable=True)
+    occurred_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class BookingSnapshot(Base):
+    """预约状态快照（某个 seq 时未删除预约的完整状态，gzip 压缩的 JSON）"""
+    __tablename__ = "booking_snapshots"
+    
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, nullable=False)
+    booking_count = Column(Integer, nullable=False)
+    state = Column(LargeBinary, nullable=False)
+
+class IdempotencyKey(Base):
+    """幂等键记录（response_body 为空表示请求仍在处理中）"""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class CacheGeneration(Base):
+    """缓存命名空间版本号（跨 worker 缓存失效，见 utils/cache_bus.py）"""
+    __tablename__ = "cache_generations"
+    
+    namespace = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False, index=True)
+
+class Job(Base):
+    """后台任务（见 services/job_service.py，成功后删除，失败的保留以便排查）"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, nullable=False)  # queued, running, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    dedupe_key = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        Index("ix_jobs_queued_run_at", "run_at", sqlite_where=text("status = 'queued'")),
+        Index("ix_jobs_running_locked", "locked_until", sqlite_where=text("status = 'running'")),
+        Index("ix_jobs_dedupe_key", "dedupe_key", unique=True, sqlite_where=text("status = 'queued'")),
+    )
+
+class TokenRevocation(Base):
+    """令牌吊销记录（见 utils/auth.py，key 为 jti:<令牌ID> 或 user:<用户ID>）"""
+    __tablename__ = "token_revocations"
+    
+    key = Column(String, primary_key=True)
+    revoked_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class Shard(Base):
+    """已创建的分片（只使用主库中的记录，shard_index 决定分片内预约ID的起点）"""
+    __tablename__ = "shards"
+    
+    name = Column(String, primary_key=True)
+    shard_index = Column(Integer, nullable=False, unique=True)
+    created_at = Column(DateTime, nullable=False)
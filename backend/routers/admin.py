@@ -0,0 +1,97 @@
+import hmac
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import HOME_SHARD, get_db, shard_path
+from schemas import (
+    AllocationRequest, AllocationResult, BackupInfo, BackupResult, BookingEventPage, BookingSnapshotOut,
+    ImportResult
+)
+from services.allocation_service import AllocationService
+from services.backup_service import BackupService
+from services.import_service import ImportService, detect_format
+from services.event_service import EventService
+from services.shard_service import ShardService
+from utils.profiling import sample_stacks
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """校验管理接口令牌（请求头 X-Admin-Token）"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="管理接口未启用")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000)
+):
+    """对当前 worker 的所有线程进行限时栈采样，返回折叠栈（flamegraph 格式）"""
+    seconds = min(seconds, settings.profile_max_seconds)
+    return await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+
+@router.post("/allocations", response_model=AllocationResult)
+def allocate_rooms(request: AllocationRequest, db: Session = Depends(get_db)):
+    """批量分配会议室：为一批会议请求选择会议室和时间，并在一个事务内创建预约（dry_run 时只返回方案）"""
+    return AllocationService.allocate(db, request.requests, request.slot_minutes, request.dry_run)
+
+@router.post("/imports/{kind}", response_model=ImportResult)
+def import_data(
+    kind: str,
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db)
+):
+    """批量导入会议室、用户或预约（kind 为 rooms / users / bookings；格式默认按文件扩展名判断）"""
+    return ImportService.import_file(db, kind, file.file, detect_format(file.filename, fmt), dry_run)
+
+@router.post("/backups", response_model=BackupResult)
+def create_backup(
+    compress: bool = Query(True),
+    verify: bool = Query(True),
+    rate_limit_mb: Optional[float] = Query(None, ge=0),
+    shard: str = Query(HOME_SHARD)
+):
+    """在线备份数据库（分步复制并限速，不阻塞写入；备份写入 BOOKING_BACKUP_DIR，分片库写入其下的 shards/<分片名>）"""
+    ShardService.require(shard)
+    return BackupService.create_backup(
+        output_dir=BackupService.shard_backup_dir(shard), compress=compress, verify=verify,
+        rate_limit_mb=rate_limit_mb, database_path=shard_path(shard)
+    )
+
+@router.get("/backups", response_model=List[BackupInfo])
+def list_backups(shard: str = Query(HOME_SHARD)):
+    """列出已有的备份（按时间从新到旧）"""
+    ShardService.require(shard)
+    return BackupService.list_backups(BackupService.shard_backup_dir(shard))
+
+@router.get("/events", response_model=BookingEventPage)
+def read_events(
+    after: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    shard: str = Query(HOME_SHARD),
+    db: Session = Depends(get_db)
+):
+    """读取检查点之后的预约事件（每个分片有各自的事件日志；检查点之后的事件已被压缩时返回 410，需先读取快照）"""
+    db = db.shard(ShardService.require(shard))
+    events = EventService.read_tail(db, after, limit)
+    return {
+        "events": events,
+        "next_after": events[-1]["seq"] if events else after,
+        "last_seq": EventService.last_seq(db),
+    }
+
+@router.get("/events/snapshot", response_model=BookingSnapshotOut)
+def read_event_snapshot(shard: str = Query(HOME_SHARD), db: Session = Depends(get_db)):
+    """读取最新的预约状态快照（之后从 seq 开始读取事件即可追上当前状态）"""
+    db = db.shard(ShardService.require(shard))
+    seq, state = EventService.latest_snapshot(db)
+    return {"seq": seq, "state": state}
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import LoginRequest, RefreshRequest, TokenResponse, UserResponse
+from services.auth_service import AuthService
+from services.user_service import UserService
+from utils.auth import current_claims, optional_claims
+from utils.profiling import ProfilingRoute
+from utils.timezone import add_timezone_to_object
+
+router = APIRouter(route_class=ProfilingRoute)
+
+@router.post("/login", response_model=TokenResponse)
+def login(credentials: LoginRequest, db: Session = Depends(get_db)):
+    """登录（同步路由在线程池中执行，bcrypt 校验不阻塞事件循环）"""
+    return AuthService.login(db, credentials.username, credentials.password)
+
+@router.post("/refresh", response_model=TokenResponse)
+def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+    return AuthService.refresh(db, request.refresh_token)
+
+@router.post("/logout")
+def logout(
+    request: RefreshRequest,
+    claims: Optional[dict] = Depends(optional_claims),
+    db: Session = Depends(get_db)
+):
+    return AuthService.logout(db, request.refresh_token, claims)
+
+@router.get("/me", response_model=UserResponse)
+def get_me(claims: dict = Depends(current_claims), db: Session = Depends(get_db)):
+    return add_timezone_to_object(UserService.get_user_by_id(db, int(claims["sub"])), "created_at")
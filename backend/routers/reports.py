@@ -0,0 +1,22 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import UtilizationReport
+from services.usage_service import UsageService
+from utils.profiling import ProfilingRoute
+
+router = APIRouter(route_class=ProfilingRoute)
+
+@router.get("/utilization", response_model=UtilizationReport)
+def get_utilization(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    group_by: str = Query("room", pattern="^(room|location|day)$"),
+    db: Session = Depends(get_db)
+):
+    """会议室使用率报表（按 UTC 日期，起止日期均包含）"""
+    rows = UsageService.get_utilization(db, date_from, date_to, group_by)
+    return {"date_from": date_from, "date_to": date_to, "group_by": group_by, "rows": rows}
@@ -1,73 +1,130 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, Header, Query
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import timezone
+from typing import List, Optional
 from database import get_db
-from models import Room
-from schemas import RoomCreate, RoomResponse
+from schemas import RoomCreate, RoomResponse, RoomFacets, SlotHeatmap
+from services.room_service import RoomService
+from services.room_facet_service import RoomFacetService
+from services.slot_service import SlotService
+from services.calendar_service import CalendarService, ROOM_FEED
+from config import settings
+from utils.ics import conditional_response
+from utils.profiling import ProfilingRoute
+from utils.pagination import skip_query, limit_query
+from utils.timezone import add_timezone_to_list, make_aware
+from utils.cache_bus import GenerationCache, ROOMS
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
+
+# 会议室读缓存（其他 worker 写入后自动失效）
+rooms_cache = GenerationCache(ROOMS)
 
 def add_timezone_to_rooms(rooms):
     """为会议室数据添加 UTC 时区信息"""
-    for room in rooms:
-        if room.created_at and room.created_at.tzinfo is None:
-            room.created_at = room.created_at.replace(tzinfo=timezone.utc)
-    return rooms
+    return add_timezone_to_list(rooms, "created_at")
 
 @router.post("/", response_model=RoomResponse)
 def create_room(room: RoomCreate, db: Session = Depends(get_db)):
-    # 检查会议室名称是否已存在
-    db_room = db.query(Room).filter(Room.name == room.name).first()
-    if db_room:
-        raise HTTPException(status_code=400, detail="会议室名称已存在")
-    
-    # 创建新会议室
-    db_room = Room(
-        name=room.name,
-        location=room.location,
-        capacity=room.capacity,
-        description=room.description
+    return RoomService.create_room(db, room)
+
+def serialize_rooms(rooms):
+    """序列化会议室数据，用于缓存"""
+    return [RoomResponse.model_validate(room) for room in add_timezone_to_rooms(rooms)]
+
+def room_filters(
+    building: Optional[str] = None,
+    floor: Optional[int] = None,
+    equipment: List[str] = Query([]),
+    min_capacity: Optional[int] = Query(None, ge=1),
+    max_capacity: Optional[int] = Query(None, ge=1),
+    available: Optional[bool] = None
+) -> dict:
+    """会议室筛选条件（equipment 可重复，表示需同时具备）"""
+    return {
+        "building": building,
+        "floor": floor,
+        "equipment": equipment,
+        "min_capacity": min_capacity,
+        "max_capacity": max_capacity,
+        "available": available,
+    }
+
+def filters_key(filters: dict) -> tuple:
+    """筛选条件的缓存键"""
+    return tuple(
+        (name, tuple(sorted(value)) if isinstance(value, list) else value)
+        for name, value in sorted(filters.items())
     )
-    db.add(db_room)
-    db.commit()
-    db.refresh(db_room)
-    return db_room
 
 @router.get("/", response_model=List[RoomResponse])
-def get_rooms(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    rooms = db.query(Room).offset(skip).limit(limit).all()
-    return add_timezone_to_rooms(rooms)
+def get_rooms(
+    skip: int = skip_query(),
+    limit: int = limit_query(),
+    filters: dict = Depends(room_filters),
+    db: Session = Depends(get_db)
+):
+    if all(value is None or value == [] for value in filters.values()):
+        return rooms_cache.get_or_load(
+            ("list", skip, limit),
+            lambda: serialize_rooms(RoomService.get_rooms(db, skip, limit))
+        )
+    return rooms_cache.get_or_load(
+        ("filter", filters_key(filters), skip, limit),
+        lambda: serialize_rooms(RoomFacetService.filter_rooms(db, filters, skip, limit))
+    )
+
+@router.get("/facets", response_model=RoomFacets)
+def get_room_facets(filters: dict = Depends(room_filters), db: Session = Depends(get_db)):
+    """按当前筛选条件返回各分面的会议室数量"""
+    return RoomFacetService.get_facets(db, filters)
+
+@router.get("/free", response_model=List[RoomResponse])
+def get_free_rooms(
+    start: datetime,
+    end: datetime,
+    skip: int = skip_query(),
+    limit: int = limit_query(),
+    filters: dict = Depends(room_filters),
+    db: Session = Depends(get_db)
+):
+    """时间段内空闲且满足筛选条件的会议室（基于 15 分钟时段位图，按时段取整）"""
+    return serialize_rooms(SlotService.find_free_rooms(
+        db, make_aware(start), make_aware(end), filters, skip, limit
+    ))
+
+@router.get("/heatmap", response_model=SlotHeatmap)
+def get_slot_heatmap(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    room_id: Optional[int] = None,
+    filters: dict = Depends(room_filters),
+    db: Session = Depends(get_db)
+):
+    """月视图热力图：每天被占用的 15 分钟时段占比（按 UTC 日期，起止日期均包含）"""
+    return SlotService.get_heatmap(db, date_from, date_to, filters, room_id)
 
 @router.get("/{room_id}", response_model=RoomResponse)
 def get_room(room_id: int, db: Session = Depends(get_db)):
-    room = db.query(Room).filter(Room.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="会议室不存在")
-    return add_timezone_to_rooms([room])[0]
+    return rooms_cache.get_or_load(
+        ("room", room_id),
+        lambda: serialize_rooms([RoomService.get_room_by_id(db, room_id)])[0]
+    )
+
+@router.get("/{room_id}/calendar.ics")
+def get_room_calendar(
+    room_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """会议室日历订阅（iCalendar，支持 If-None-Match 条件请求）"""
+    etag, body = CalendarService.get_feed(db, ROOM_FEED, room_id, if_none_match)
+    return conditional_response(etag, body, settings.calendar_max_age_seconds)
 
 @router.put("/{room_id}", response_model=RoomResponse)
 def update_room(room_id: int, room: RoomCreate, db: Session = Depends(get_db)):
-    db_room = db.query(Room).filter(Room.id == room_id).first()
-    if not db_room:
-        raise HTTPException(status_code=404, detail="会议室不存在")
-    
-    db_room.name = room.name
-    db_room.location = room.location
-    db_room.capacity = room.capacity
-    db_room.description = room.description
-    
-    db.commit()
-    db.refresh(db_room)
-    return db_room
+    return RoomService.update_room(db, room_id, room)
 
 @router.delete("/{room_id}")
 def delete_room(room_id: int, db: Session = Depends(get_db)):
-    room = db.query(Room).filter(Room.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="会议室不存在")
-    
-    db.delete(room)
-    db.commit()
-    return {"message": "会议室已删除"}
-
+    return RoomService.delete_room(db, room_id)
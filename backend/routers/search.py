@@ -0,0 +1,24 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import SearchResponse
+from services.search_service import SearchService
+from utils.pagination import skip_query
+from utils.profiling import ProfilingRoute
+
+router = APIRouter(route_class=ProfilingRoute)
+
+@router.get("/", response_model=SearchResponse)
+def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    type: Optional[str] = Query(None, pattern="^(user|room|booking)$"),
+    skip: int = skip_query(),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """搜索用户、会议室和预约用途（空白分隔的多个词为"且"关系）"""
+    items, has_more = SearchService.search(db, q, type, skip, limit)
+    return {"items": items, "has_more": has_more}
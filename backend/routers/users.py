@@ -1,69 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, Query
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import timezone
+from typing import List, Optional
+from datetime import datetime
 from database import get_db
-from models import User
-from schemas import UserCreate, UserResponse
-from passlib.context import CryptContext
+from schemas import BookingDetailResponse, UserCreate, UserResponse
+from services.user_service import UserService
+from services.booking_service import BookingService
+from services.calendar_service import CalendarService, USER_FEED
+from config import settings
+from utils.ics import conditional_response
+from utils.profiling import ProfilingRoute
+from utils.pagination import skip_query, limit_query
+from utils.timezone import add_timezone_to_list, BOOKING_DATETIME_FIELDS
+from utils.cache_bus import GenerationCache, USERS
 
-router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+router = APIRouter(route_class=ProfilingRoute)
+
+# 用户读缓存（其他 worker 写入后自动失效）
+users_cache = GenerationCache(USERS)
 
 def add_timezone_to_users(users):
     """为用户数据添加 UTC 时区信息"""
-    for user in users:
-        if user.created_at and user.created_at.tzinfo is None:
-            user.created_at = user.created_at.replace(tzinfo=timezone.utc)
-    return users
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return add_timezone_to_list(users, "created_at")
 
 @router.post("/", response_model=UserResponse)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    # 检查用户名是否已存在
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="用户名已存在")
-    
-    # 检查邮箱是否已存在
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="邮箱已被注册")
-    
-    # 创建新用户
-    hashed_password = hash_password(user.password)
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        phone=user.phone,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return UserService.create_user(db, user)
+
+def serialize_users(users):
+    """序列化用户数据，用于缓存"""
+    return [UserResponse.model_validate(user) for user in add_timezone_to_users(users)]
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return add_timezone_to_users(users)
+def get_users(skip: int = skip_query(), limit: int = limit_query(), db: Session = Depends(get_db)):
+    return users_cache.get_or_load(
+        ("list", skip, limit),
+        lambda: serialize_users(UserService.get_users(db, skip, limit))
+    )
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="用户不存在")
-    return add_timezone_to_users([user])[0]
+    return users_cache.get_or_load(
+        ("user", user_id),
+        lambda: serialize_users([UserService.get_user_by_id(db, user_id)])[0]
+    )
+
+@router.get("/{user_id}/agenda", response_model=List[BookingDetailResponse])
+def get_user_agenda(
+    user_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """用户日程：时间窗口内（默认从现在起）仍有效的预约，按开始时间排序"""
+    bookings = BookingService.get_user_agenda(db, user_id, start, end)
+    return add_timezone_to_list(bookings, *BOOKING_DATETIME_FIELDS)
+
+@router.get("/{user_id}/calendar.ics")
+def get_user_calendar(
+    user_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """用户日历订阅（iCalendar，支持 If-None-Match 条件请求）"""
+    etag, body = CalendarService.get_feed(db, USER_FEED, user_id, if_none_match)
+    return conditional_response(etag, body, settings.calendar_max_age_seconds)
 
 @router.delete("/{user_id}")
 def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="用户不存在")
-    
-    db.delete(user)
-    db.commit()
-    return {"message": "用户已删除"}
-
+    return UserService.delete_user(db, user_id)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 # User schemas
 class UserBase(BaseModel):
@@ -19,12 +19,29 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+# Auth schemas
+class LoginRequest(BaseModel):
+    username: str
+    password: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
 # Room schemas
 class RoomBase(BaseModel):
     name: str
     location: str
     capacity: int
     description: Optional[str] = None
+    building: Optional[str] = None
+    floor: Optional[int] = None
+    equipment: List[str] = []
 
 class RoomCreate(RoomBase):
     pass
@@ -47,11 +64,16 @@ class BookingBase(BaseModel):
 class BookingCreate(BookingBase):
     user_id: int
 
+class BookingHoldCreate(BookingCreate):
+    # 保留时长（秒），为空时使用默认值，超过上限时按上限处理
+    ttl_seconds: Optional[int] = Field(None, ge=1)
+
 class BookingResponse(BookingBase):
     id: int
     user_id: int
     status: str
     created_at: datetime
+    hold_expires_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -63,3 +85,175 @@ class BookingDetailResponse(BookingResponse):
     class Config:
         from_attributes = True
 
+# Allocation schemas
+class AllocationWindow(BaseModel):
+    start: datetime
+    end: datetime
+
+class AllocationItem(BaseModel):
+    ref: str
+    user_id: int
+    duration_minutes: int = Field(..., gt=0)
+    attendees: int = Field(1, ge=1)
+    # 优先的位置（匹配会议室的 location 或 building），都排不下时再使用其他会议室
+    locations: List[str] = []
+    # 首次会议可选的时间窗口（会议须完整落在某个窗口内）
+    windows: List[AllocationWindow] = Field(..., min_length=1)
+    # 每周重复次数，所有重复使用同一会议室和同一时间
+    repeat_weeks: int = Field(1, ge=1, le=52)
+    purpose: Optional[str] = None
+
+class AllocationRequest(BaseModel):
+    requests: List[AllocationItem]
+    dry_run: bool = False
+    slot_minutes: int = Field(15, ge=1, le=60)
+
+class AllocationPlacement(BaseModel):
+    ref: str
+    room_id: int
+    start_time: datetime
+    end_time: datetime
+    occurrences: int
+    booking_ids: List[int] = []
+
+class AllocationFailure(BaseModel):
+    ref: str
+    reason: str
+
+class AllocationResult(BaseModel):
+    placed: List[AllocationPlacement]
+    unplaced: List[AllocationFailure]
+    committed: bool
+    elapsed_ms: float
+
+# Event log schemas
+class BookingEventOut(BaseModel):
+    seq: int
+    booking_id: int
+    kind: str
+    user_id: int
+    room_id: int
+    start_time: datetime
+    end_time: datetime
+    status: str
+    hold_expires_at: Optional[datetime] = None
+    occurred_at: datetime
+
+class BookingEventPage(BaseModel):
+    events: List[BookingEventOut]
+    # 本页最后一个事件的 seq（没有新事件时为请求的 after），作为下次请求的检查点
+    next_after: int
+    last_seq: int
+
+class BookingSnapshotOut(BaseModel):
+    seq: int
+    # {预约ID: [user_id, room_id, start_time, end_time, status, hold_expires_at]}
+    state: Dict[str, list]
+
+# Backup schemas
+class BackupVerification(BaseModel):
+    ok: bool
+    integrity: List[str]
+    user_version: Optional[int] = None
+    tables: Dict[str, int]
+
+class BackupResult(BaseModel):
+    file: str
+    path: str
+    size_bytes: int
+    database_bytes: int
+    pages: int
+    restarts: int
+    compressed: bool
+    sha256: str
+    verification: Optional[BackupVerification] = None
+    removed: List[str]
+    elapsed_ms: float
+
+class BackupInfo(BaseModel):
+    file: str
+    size_bytes: int
+    created_at: datetime
+
+# Import schemas
+class UserImportRow(UserBase):
+    # 明文密码或已有系统导出的 bcrypt 哈希（二选一，提供哈希时无需逐行计算 bcrypt）
+    password: Optional[str] = None
+    hashed_password: Optional[str] = None
+
+class BookingImportRow(BaseModel):
+    # 会议室、用户可以按 ID 或名称引用（名称便于引用同一批导入的会议室和用户）
+    room_id: Optional[int] = None
+    room: Optional[str] = None
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    start_time: datetime
+    end_time: datetime
+    purpose: Optional[str] = None
+    status: str = Field("confirmed", pattern="^(confirmed|cancelled)$")
+
+class ImportRowError(BaseModel):
+    line: int
+    message: str
+
+class ImportResult(BaseModel):
+    kind: str
+    format: str
+    dry_run: bool
+    processed: int
+    valid: int
+    imported: int
+    failed: int
+    # 只返回前 import_max_errors 条错误
+    errors: List[ImportRowError]
+    elapsed_ms: float
+
+# Report schemas
+class UtilizationRow(BaseModel):
+    key: str
+    room_id: Optional[int] = None
+    booked_minutes: int
+    booking_count: int
+    available_minutes: int
+    utilization: float
+
+class UtilizationReport(BaseModel):
+    date_from: date
+    date_to: date
+    group_by: str
+    rows: List[UtilizationRow]
+
+# Search schemas
+class SearchResult(BaseModel):
+    type: str
+    id: int
+    title: str
+    subtitle: Optional[str] = None
+    score: Optional[float] = None
+
+class SearchResponse(BaseModel):
+    items: List[SearchResult]
+    has_more: bool
+
+# Room facet schemas
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class RoomFacets(BaseModel):
+    total: int
+    buildings: List[FacetCount]
+    floors: List[FacetCount]
+    equipment: List[FacetCount]
+    capacity: List[FacetCount]
+
+class SlotHeatmapDay(BaseModel):
+    day: date
+    booked_slots: int
+    total_slots: int
+    occupancy: float
+
+class SlotHeatmap(BaseModel):
+    slot_minutes: int
+    room_count: int
+    days: List[SlotHeatmapDay]
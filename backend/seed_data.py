@@ -2,15 +2,23 @@
 数据初始化脚本 - 创建测试数据
 """
 from datetime import datetime, timedelta
-from database import SessionLocal
-from models import User, Room, Booking
+from database import SessionLocal, shard_sessionmakers
+from models import User, Room, Booking, BookingEvent, BookingSnapshot, RoomSlotBitmap
+from services.event_service import EventService, CREATED
+from services.slot_service import SlotService
+from services.usage_service import UsageService
 
 def clear_all_data():
     """清空所有数据"""
     db = SessionLocal()
     try:
         print("🗑️  清空现有数据...")
-        db.query(Booking).delete()
+        for name in shard_sessionmakers:
+            db.shard(name).query(Booking).delete()
+            db.shard(name).query(RoomSlotBitmap).delete()
+            db.shard(name).query(BookingEvent).delete()
+            db.shard(name).query(BookingSnapshot).delete()
+            db.shard(name).commit()
         db.query(Room).delete()
         db.query(User).delete()
         db.commit()
@@ -197,6 +205,9 @@ def seed_bookings(user_ids, room_ids):
         for booking in bookings:
             db.add(booking)
         
+        # 与接口创建的预约一样记录事件日志
+        db.flush()
+        EventService.record_from_bookings(db, [booking.id for booking in bookings], CREATED)
         db.commit()
         print(f"✅ 成功创建 {len(bookings)} 个预约")
     except Exception as e:
@@ -227,6 +238,17 @@ def main():
     
     seed_bookings(user_ids, room_ids)
     
+    # 重建会议室每日使用汇总
+    db = SessionLocal()
+    try:
+        UsageService.rebuild(db)
+        SlotService.rebuild(db)
+        # 测试预约先写入主库，再移动到会议室地点所属的分片
+        from services.shard_service import ShardService
+        ShardService.rebalance(db)
+    finally:
+        db.close()
+    
     print("\n" + "=" * 60)
     print("✅ 数据初始化完成！")
     print("=" * 60)
@@ -0,0 +1,432 @@
+"""
+批量会议室分配服务层
+
+一次性为大量会议请求（时长、人数、优先位置、候选时间窗口、每周重复次数）分配会议室和时间：
+- 请求按"最难安排优先"排序（人数多、总时长长、时间窗口窄的先排）
+- 每个请求按"最合适优先"选择会议室（优先位置 > 容量浪费最小），在会议室内优先紧贴已有预约的位置，减少日程碎片
+- 已有预约（含未过期的临时保留）和用户自身的日程作为占用区间参与计算
+- 占用区间以分钟为单位保存在按开始时间排序的数组中，可用性检查为一次二分查找
+
+计算在内存中完成，结果在一个事务内写入；写入后再次检查冲突，期间有其他预约写入时整体回滚。
+分片部署时每个分片一个事务：全部写入并检查后才依次提交，提交阶段不是跨库原子的
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Booking, Room, User
+from schemas import AllocationItem
+from services.occupancy import ACTIVE_STATUSES, hold_not_expired
+from services.slot_service import SlotService
+from services.calendar_service import CalendarService, ROOM_FEED, USER_FEED
+from services.event_service import EventService, CREATED
+from services.shard_service import ShardService
+from services.usage_service import UsageService, split_minutes_by_day
+from utils.cache_bus import bump_generation, BOOKINGS
+from utils.timezone import make_aware, make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+EPOCH = datetime(1970, 1, 1)
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+def to_minutes(value: datetime, round_up: bool = False) -> int:
+    """将 naive UTC 时间转换为分钟数（不足一分钟按 round_up 取整）"""
+    seconds = (value - EPOCH).total_seconds()
+    minutes = int(seconds // 60)
+    if round_up and seconds > minutes * 60:
+        minutes += 1
+    return minutes
+
+
+def from_minutes(minutes: int) -> datetime:
+    """分钟数转换为 naive UTC 时间"""
+    return EPOCH + timedelta(minutes=minutes)
+
+
+class IntervalSet:
+    """互不重叠的占用区间 [start, end)，按开始时间排序"""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        # 合并重叠区间，保证 ends 也单调递增
+        for start, end in sorted(intervals):
+            if self.ends and start < self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def is_free(self, start: int, end: int) -> bool:
+        """[start, end) 是否空闲"""
+        i = bisect_left(self.starts, end)
+        return i == 0 or self.ends[i - 1] <= start
+
+    def add(self, start: int, end: int) -> None:
+        """加入一个空闲的区间"""
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+    def neighbors(self, start: int, end: int) -> Tuple[Optional[int], Optional[int]]:
+        """空闲区间 [start, end) 前一个占用的结束时间与后一个占用的开始时间"""
+        i = bisect_left(self.starts, end)
+        return (self.ends[i - 1] if i else None), (self.starts[i] if i < len(self.starts) else None)
+
+    def anchors(self, window_start: int, window_end: int, duration: int) -> Iterator[int]:
+        """窗口内紧贴已有占用的开始时间（紧接某个占用之后，或恰好在某个占用之前结束）"""
+        lo = bisect_left(self.ends, window_start)
+        hi = bisect_right(self.ends, window_end - duration)
+        yield from self.ends[lo:hi]
+        lo = bisect_left(self.starts, window_start + duration)
+        hi = bisect_right(self.starts, window_end)
+        for start in self.starts[lo:hi]:
+            yield start - duration
+
+
+@dataclass
+class _Request:
+    """换算为分钟后的会议请求"""
+    item: AllocationItem
+    duration: int
+    windows: List[Tuple[int, int]]
+    locations: frozenset
+    offsets: Tuple[int, ...] = field(default=(0,))
+
+    @property
+    def difficulty(self) -> tuple:
+        span = sum(end - start for start, end in self.windows)
+        return (-self.item.attendees, -self.duration * len(self.offsets), span)
+
+
+@dataclass
+class _Room:
+    id: int
+    capacity: int
+    labels: frozenset
+    busy: IntervalSet
+
+
+def plan(
+    requests: Sequence[_Request],
+    rooms: Sequence[_Room],
+    user_busy: Dict[int, IntervalSet],
+    slot: int
+) -> Tuple[List[Tuple[_Request, _Room, int]], List[Tuple[_Request, str]]]:
+    """
+    计算分配方案（纯内存计算，会修改 rooms / user_busy 中的占用区间）
+
+    Args:
+        requests: 会议请求
+        rooms: 会议室（按容量升序）
+        user_busy: 用户占用区间（不检查用户重叠时为空）
+        slot: 开始时间的对齐粒度（分钟）
+
+    Returns:
+        ([(请求, 会议室, 开始分钟)], [(请求, 未分配原因)])
+    """
+    capacities = [room.capacity for room in rooms]
+    placed, failed = [], []
+
+    for request in sorted(requests, key=lambda r: r.difficulty):
+        fitting = rooms[bisect_left(capacities, request.item.attendees):]
+        if not fitting:
+            failed.append((request, "没有容量足够的会议室"))
+            continue
+        # 优先位置的会议室在前，同一组内按容量升序（浪费最少）
+        preferred = [room for room in fitting if room.labels & request.locations]
+        ordered = preferred + [room for room in fitting if not room.labels & request.locations]
+        user = user_busy.get(request.item.user_id)
+
+        for room in ordered:
+            start = _best_start(request, room.busy, user, slot)
+            if start is not None:
+                for offset in request.offsets:
+                    room.busy.add(start + offset, start + offset + request.duration)
+                    if user is not None:
+                        user.add(start + offset, start + offset + request.duration)
+                placed.append((request, room, start))
+                break
+        else:
+            failed.append((request, "时间窗口内没有可用的会议室"))
+
+    return placed, failed
+
+
+def _best_start(request: _Request, busy: IntervalSet, user: Optional[IntervalSet], slot: int) -> Optional[int]:
+    """在会议室内选择开始时间：可用位置中与前后占用间隙最小者（紧凑排列），相同时取最早"""
+    duration = request.duration
+    best = None
+    for window_start, window_end in request.windows:
+        candidates = {window_start}
+        candidates.update(busy.anchors(window_start, window_end, duration))
+        if user is not None:
+            candidates.update(user.anchors(window_start, window_end, duration))
+        for start in candidates:
+            # 紧接占用之后的位置向后对齐，恰好在占用之前结束的位置向前对齐
+            aligned = -(-start // slot) * slot
+            if aligned + duration > window_end:
+                aligned = start // slot * slot
+            if aligned < window_start or aligned + duration > window_end:
+                continue
+            if not all(
+                busy.is_free(aligned + offset, aligned + offset + duration)
+                and (user is None or user.is_free(aligned + offset, aligned + offset + duration))
+                for offset in request.offsets
+            ):
+                continue
+            before, after = busy.neighbors(aligned, aligned + duration)
+            gap_before = aligned - max(before, window_start) if before is not None else aligned - window_start
+            gap_after = min(after, window_end) - aligned - duration if after is not None else window_end - aligned - duration
+            score = (min(gap_before, gap_after), aligned)
+            if best is None or score < best:
+                best = score
+    return None if best is None else best[1]
+
+
+def _has_overlap(occupied: Sequence[tuple], new_ids: set, owner: int) -> bool:
+    """
+    按所属对象（会议室或用户）分组扫描，是否有新写入的预约与其他预约重叠
+
+    Args:
+        occupied: (id, room_id, user_id, start_time, end_time) 行
+        new_ids: 新写入的预约ID
+        owner: 分组字段在行中的位置（1 会议室，2 用户）
+    """
+    last_owner, last_end, last_id = None, None, None
+    for row in sorted(occupied, key=lambda r: (r[owner], r[3])):
+        booking_id, start_time, end_time = row[0], row[3], row[4]
+        if row[owner] == last_owner and start_time < last_end and (booking_id in new_ids or last_id in new_ids):
+            return True
+        if row[owner] != last_owner or end_time > last_end:
+            last_owner, last_end, last_id = row[owner], end_time, booking_id
+    return False
+
+
+def _prepare(items: Sequence[AllocationItem], now: int) -> Tuple[List[_Request], List[Tuple[AllocationItem, str]]]:
+    """校验请求并换算为分钟"""
+    max_minutes = int(settings.max_booking_hours * 60)
+    requests, invalid = [], []
+    for item in items:
+        if item.duration_minutes > max_minutes:
+            invalid.append((item, f"单次会议不能超过 {settings.max_booking_hours:g} 小时"))
+            continue
+        windows = []
+        for window in item.windows:
+            start = max(to_minutes(make_naive(make_aware(window.start)), round_up=True), now)
+            end = to_minutes(make_naive(make_aware(window.end)))
+            if end - start >= item.duration_minutes:
+                windows.append((start, end))
+        if not windows:
+            invalid.append((item, "没有足够长且未过去的时间窗口"))
+            continue
+        requests.append(_Request(
+            item=item,
+            duration=item.duration_minutes,
+            windows=windows,
+            locations=frozenset(location.strip().lower() for location in item.locations),
+            offsets=tuple(week * MINUTES_PER_WEEK for week in range(item.repeat_weeks)),
+        ))
+    return requests, invalid
+
+
+@profile_service
+class AllocationService:
+    """批量会议室分配服务类"""
+
+    @staticmethod
+    def allocate(
+        db: Session,
+        items: Sequence[AllocationItem],
+        slot_minutes: int = 15,
+        dry_run: bool = False
+    ) -> dict:
+        """
+        为一批会议请求分配会议室和时间，并在一个事务内创建预约
+
+        Args:
+            db: 数据库会话
+            items: 会议请求
+            slot_minutes: 开始时间对齐粒度（分钟）
+            dry_run: 只计算方案，不写入
+
+        Returns:
+            {"placed": [...], "unplaced": [...], "committed": 是否已写入, "elapsed_ms": 耗时}
+
+        Raises:
+            HTTPException: 请求过多、ref 重复，或写入期间出现冲突时抛出
+        """
+        started = perf_counter()
+        if len(items) > settings.allocation_max_requests:
+            raise HTTPException(
+                status_code=413, detail=f"单次最多分配 {settings.allocation_max_requests} 个会议"
+            )
+        if len({item.ref for item in items}) != len(items):
+            raise HTTPException(status_code=400, detail="会议请求的 ref 不能重复")
+
+        now = to_minutes(make_naive(get_current_time()), round_up=True)
+        requests, invalid = _prepare(items, now)
+        active_users = {
+            user_id for (user_id,) in db.query(User.id).filter(
+                User.id.in_({request.item.user_id for request in requests}),
+                User.deleted_at.is_(None),
+                User.is_active.is_(True)
+            )
+        }
+        invalid += [(request.item, "用户不存在或已停用") for request in requests if request.item.user_id not in active_users]
+        requests = [request for request in requests if request.item.user_id in active_users]
+        rooms, user_busy = AllocationService._load_state(db, requests)
+        placed, failed = plan(requests, rooms, user_busy, slot_minutes)
+
+        booking_ids = {}
+        committed = False
+        if placed and not dry_run:
+            booking_ids = AllocationService._commit(db, placed)
+            committed = True
+
+        return {
+            "placed": [
+                {
+                    "ref": request.item.ref,
+                    "room_id": room.id,
+                    "start_time": make_aware(from_minutes(start)),
+                    "end_time": make_aware(from_minutes(start + request.duration)),
+                    "occurrences": len(request.offsets),
+                    "booking_ids": booking_ids.get(request.item.ref, []),
+                }
+                for request, room, start in placed
+            ],
+            "unplaced": [
+                {"ref": item.ref, "reason": reason}
+                for item, reason in invalid + [(request.item, reason) for request, reason in failed]
+            ],
+            "committed": committed,
+            "elapsed_ms": round((perf_counter() - started) * 1000, 1),
+        }
+
+    @staticmethod
+    def _load_state(db: Session, requests: Sequence[_Request]) -> Tuple[List[_Room], Dict[int, IntervalSet]]:
+        """读取会议室及计划时间范围内的已有占用"""
+        if not requests:
+            return [], {}
+        horizon_start = min(start for request in requests for start, _ in request.windows)
+        horizon_end = max(end + request.offsets[-1] for request in requests for _, end in request.windows)
+
+        room_intervals = defaultdict(list)
+        user_intervals = defaultdict(list)
+        user_ids = {request.item.user_id for request in requests} if settings.prevent_user_overlap else set()
+        parts = ShardService.fan_out(db, lambda shard_db: shard_db.query(
+            Booking.room_id, Booking.user_id, Booking.start_time, Booking.end_time
+        ).filter(
+            Booking.deleted_at.is_(None),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time < from_minutes(horizon_end),
+            Booking.end_time > from_minutes(horizon_start),
+            hold_not_expired()
+        ).all())
+        for room_id, user_id, start_time, end_time in (row for rows in parts for row in rows):
+            interval = (to_minutes(start_time), to_minutes(end_time, round_up=True))
+            room_intervals[room_id].append(interval)
+            if user_id in user_ids:
+                user_intervals[user_id].append(interval)
+
+        rooms = [
+            _Room(
+                id=room_id,
+                capacity=capacity,
+                labels=frozenset(label.strip().lower() for label in (location, building) if label),
+                busy=IntervalSet(room_intervals.get(room_id, ())),
+            )
+            for room_id, capacity, location, building in db.query(
+                Room.id, Room.capacity, Room.location, Room.building
+            ).filter(Room.deleted_at.is_(None), Room.is_available.is_(True)).order_by(Room.capacity, Room.id)
+        ]
+        user_busy = {user_id: IntervalSet(user_intervals.get(user_id, ())) for user_id in user_ids}
+        return rooms, user_busy
+
+    @staticmethod
+    def _commit(db: Session, placed: Sequence[Tuple[_Request, _Room, int]]) -> Dict[str, List[int]]:
+        """在一个事务内（分片部署时每个分片一个事务）写入方案，写入后检查冲突"""
+        rows, refs = [], []
+        for request, room, start in placed:
+            for offset in request.offsets:
+                rows.append({
+                    "user_id": request.item.user_id,
+                    "room_id": room.id,
+                    "start_time": from_minutes(start + offset),
+                    "end_time": from_minutes(start + offset + request.duration),
+                    "purpose": request.item.purpose,
+                    "status": "confirmed",
+                })
+                refs.append(request.item.ref)
+
+        # 按会议室所在分片分组，按分片名顺序写入（多个分配并发时加锁顺序一致）
+        room_shards = ShardService.shards_of_rooms(db, {row["room_id"] for row in rows})
+        positions = defaultdict(list)
+        for position, row in enumerate(rows):
+            positions[room_shards[row["room_id"]]].append(position)
+        sessions = {name: db.shard(name) for name in sorted(positions)}
+        ids = [None] * len(rows)
+        for name, shard_db in sessions.items():
+            shard_ids = shard_db.scalars(
+                insert(Booking).returning(Booking.id, sort_by_parameter_order=True),
+                [rows[position] for position in positions[name]]
+            ).all()
+            for position, booking_id in zip(positions[name], shard_ids):
+                ids[position] = booking_id
+
+        # 写入后事务持有写锁，读取到的已是最终状态：与其他预约冲突说明计算期间有新的写入。
+        # 逐条自连接检查在数千条预约时很慢，这里一次读出时间范围内的占用，按会议室/用户排序扫描
+        occupied = [
+            row for part in ShardService.fan_out(db, lambda shard_db: shard_db.query(
+                Booking.id, Booking.room_id, Booking.user_id, Booking.start_time, Booking.end_time
+            ).filter(
+                Booking.deleted_at.is_(None),
+                Booking.status.in_(ACTIVE_STATUSES),
+                Booking.start_time < max(row["end_time"] for row in rows),
+                Booking.end_time > min(row["start_time"] for row in rows),
+                hold_not_expired()
+            ).all()) for row in part
+        ]
+        new_ids = set(ids)
+        owners = [1, 2] if settings.prevent_user_overlap else [1]
+        if any(_has_overlap(occupied, new_ids, owner) for owner in owners):
+            for shard_db in sessions.values():
+                shard_db.rollback()
+            raise HTTPException(status_code=409, detail="分配期间有其他预约写入，请重试")
+
+        for name, shard_db in sessions.items():
+            shard_rows = [rows[position] for position in positions[name]]
+            days_by_room = defaultdict(set)
+            for row in shard_rows:
+                days_by_room[row["room_id"]].update(
+                    day for day, _ in split_minutes_by_day(row["start_time"], row["end_time"])
+                )
+            UsageService.schedule_refresh_rooms(shard_db, days_by_room)
+            SlotService.refresh_rooms(shard_db, days_by_room)
+            CalendarService.touch_many(shard_db, ROOM_FEED, days_by_room)
+            CalendarService.touch_many(shard_db, USER_FEED, {row["user_id"] for row in shard_rows})
+            EventService.record_rows(shard_db, [
+                {**rows[position], "booking_id": ids[position]} for position in positions[name]
+            ], CREATED)
+            bump_generation(shard_db, BOOKINGS)
+        for shard_db in sessions.values():
+            shard_db.commit()
+
+        booking_ids = defaultdict(list)
+        for ref, booking_id in zip(refs, ids):
+            booking_ids[ref].append(booking_id)
+        return booking_ids
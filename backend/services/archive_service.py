@@ -0,0 +1,201 @@
+"""
+预约归档服务层
+将已结束的历史预约分批迁移到 bookings_archive 表，保持 bookings 表精简
+"""
+
+from datetime import datetime, timedelta
+from time import sleep
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Booking, BookingArchive
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+from utils.cache_bus import bump_generation, BOOKINGS
+from services.event_service import EventService, ARCHIVED
+from services.shard_service import ShardService
+
+
+# 可归档的状态（已完成或已取消）
+ARCHIVABLE_STATUSES = ("confirmed", "cancelled")
+
+ARCHIVE_COLUMNS = ("id", "user_id", "room_id", "start_time", "end_time", "purpose", "status", "created_at")
+
+
+@profile_service
+class ArchiveService:
+    """预约归档服务类"""
+
+    @staticmethod
+    def archive_bookings(
+        db: Session,
+        older_than_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None
+    ) -> int:
+        """
+        分批归档结束时间早于指定天数的预约（只处理会话所在的分片）
+
+        每批在独立的短事务中完成 INSERT ... SELECT 与 DELETE，
+        批次之间主动让出写锁，避免长时间阻塞在线写入
+
+        Args:
+            db: 数据库会话
+            older_than_days: 归档多少天之前结束的预约
+            batch_size: 每批条数
+            pause_seconds: 批次间隔
+
+        Returns:
+            归档的预约数量
+        """
+        if older_than_days is None:
+            older_than_days = settings.archive_after_days
+        if batch_size is None:
+            batch_size = settings.archive_batch_size
+        if pause_seconds is None:
+            pause_seconds = settings.archive_batch_pause_ms / 1000
+
+        cutoff = make_naive(get_current_time()) - timedelta(days=older_than_days)
+        archive_table = BookingArchive.__table__
+        booking_table = Booking.__table__
+        total = 0
+
+        # bookings 表使用 AUTOINCREMENT（v0012），归档后新预约的 id 不会与归档数据重复
+        while True:
+            ids = [
+                row[0] for row in db.query(Booking.id).filter(
+                    Booking.end_time < cutoff,
+                    Booking.deleted_at.is_(None),
+                    Booking.status.in_(ARCHIVABLE_STATUSES)
+                ).order_by(Booking.id).limit(batch_size)
+            ]
+            if not ids:
+                break
+
+            EventService.record_from_bookings(db, ids, ARCHIVED)
+            columns = [booking_table.c[name] for name in ARCHIVE_COLUMNS]
+            db.execute(
+                archive_table.insert().from_select(
+                    list(ARCHIVE_COLUMNS),
+                    select(*columns).where(booking_table.c.id.in_(ids))
+                )
+            )
+            db.execute(booking_table.delete().where(booking_table.c.id.in_(ids)))
+            bump_generation(db, BOOKINGS)
+            db.commit()
+
+            total += len(ids)
+            if len(ids) < batch_size:
+                break
+            if pause_seconds:
+                sleep(pause_seconds)
+
+        return total
+
+    @staticmethod
+    def get_archive_horizon(db: Session) -> Optional[datetime]:
+        """
+        获取归档数据覆盖的最晚结束时间（无归档数据时为 None）
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            归档表中最大的 end_time
+        """
+        return db.query(BookingArchive.end_time).order_by(BookingArchive.end_time.desc()).limit(1).scalar()
+
+    @staticmethod
+    def window_reaches_archive(db: Session, start: Optional[datetime]) -> bool:
+        """
+        判断查询时间窗口是否需要包含归档数据
+
+        Args:
+            db: 数据库会话
+            start: 窗口开始时间（None 表示不限）
+
+        Returns:
+            是否需要查询归档表
+        """
+        horizon = ArchiveService.get_archive_horizon(db)
+        if horizon is None:
+            return False
+        return start is None or make_naive(start) < horizon
+
+    @staticmethod
+    def get_archived_bookings(
+        db: Session,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[BookingArchive]:
+        """
+        查询归档预约
+
+        Args:
+            db: 数据库会话
+            start: 窗口开始时间
+            end: 窗口结束时间
+            user_id: 用户ID
+            room_id: 会议室ID
+            limit: 最多返回条数（None 表示不限）
+
+        Returns:
+            归档预约列表
+        """
+        query = ArchiveService.archived_window_query(db, start, end, user_id, room_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def archived_window_query(
+        db: Session,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        room_id: Optional[int] = None
+    ):
+        """
+        构造归档预约的时间窗口查询（按开始时间排序）
+
+        Args:
+            db: 数据库会话
+            start: 窗口开始时间
+            end: 窗口结束时间
+            user_id: 用户ID
+            room_id: 会议室ID
+
+        Returns:
+            SQLAlchemy 查询对象
+        """
+        query = db.query(BookingArchive)
+        if user_id is not None:
+            query = query.filter(BookingArchive.user_id == user_id)
+        if room_id is not None:
+            query = query.filter(BookingArchive.room_id == room_id)
+        if start is not None:
+            query = query.filter(BookingArchive.end_time > make_naive(start))
+        if end is not None:
+            query = query.filter(BookingArchive.start_time < make_naive(end))
+        return query.order_by(BookingArchive.start_time)
+
+    @staticmethod
+    def get_archived_booking(db: Session, booking_id: int) -> Optional[BookingArchive]:
+        """
+        根据ID获取归档预约（在预约所在的分片中查找）
+
+        Args:
+            db: 数据库会话
+            booking_id: 预约ID
+
+        Returns:
+            归档预约对象，不存在时为 None
+        """
+        db = ShardService.booking_session(db, booking_id, BookingArchive)
+        return db.query(BookingArchive).filter(BookingArchive.id == booking_id).first()
@@ -0,0 +1,108 @@
+"""
+认证服务层
+登录签发令牌、刷新令牌（轮换）与注销
+"""
+
+from datetime import timedelta
+from functools import lru_cache
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import User
+from services.user_service import UserService
+from utils.auth import ACCESS, REFRESH, decode_token, issue_token, revoke_claims
+from utils.profiling import profile_service
+
+
+@lru_cache(maxsize=None)
+def _dummy_hash() -> str:
+    """用户不存在时用于校验的哈希，使登录耗时与用户是否存在无关"""
+    return UserService.hash_password("dummy-password")
+
+
+def _issue_pair(user_id: int, username: str) -> dict:
+    """签发访问令牌与刷新令牌"""
+    access_lifetime = timedelta(minutes=settings.access_token_minutes)
+    access = issue_token(user_id, username, ACCESS, access_lifetime)
+    refresh = issue_token(user_id, username, REFRESH, timedelta(days=settings.refresh_token_days))
+    return {
+        "access_token": access["token"],
+        "refresh_token": refresh["token"],
+        "token_type": "bearer",
+        "expires_in": int(access_lifetime.total_seconds()),
+    }
+
+
+@profile_service
+class AuthService:
+    """认证服务类"""
+
+    @staticmethod
+    def login(db: Session, username: str, password: str) -> dict:
+        """
+        校验用户名和密码并签发令牌（bcrypt 校验较慢，需在线程池中调用）
+
+        Args:
+            db: 数据库会话
+            username: 用户名
+            password: 密码
+
+        Returns:
+            令牌信息
+
+        Raises:
+            HTTPException: 用户名或密码错误、账号已停用时抛出
+        """
+        user = db.query(User).filter(User.username == username, User.deleted_at.is_(None)).first()
+        hashed_password = user.hashed_password if user else _dummy_hash()
+        if not UserService.verify_password(password, hashed_password) or user is None:
+            raise HTTPException(status_code=401, detail="用户名或密码错误")
+        if not user.is_active:
+            raise HTTPException(status_code=403, detail="账号已停用")
+        return _issue_pair(user.id, user.username)
+
+    @staticmethod
+    def refresh(db: Session, refresh_token: str) -> dict:
+        """
+        用刷新令牌换取新的令牌对，旧的刷新令牌随即吊销（不能重复使用）
+
+        Args:
+            db: 数据库会话
+            refresh_token: 刷新令牌
+
+        Returns:
+            令牌信息
+
+        Raises:
+            HTTPException: 刷新令牌无效、过期或已使用时抛出
+        """
+        claims = decode_token(refresh_token, REFRESH)
+        # 并发使用同一刷新令牌时只有一个请求能吊销成功
+        if claims is None or not revoke_claims(db, claims):
+            db.rollback()
+            raise HTTPException(status_code=401, detail="刷新令牌无效或已过期")
+        db.commit()
+        return _issue_pair(int(claims["sub"]), claims["name"])
+
+    @staticmethod
+    def logout(db: Session, refresh_token: str, access_claims: dict = None) -> dict:
+        """
+        注销：吊销刷新令牌（以及当前访问令牌）
+
+        Args:
+            db: 数据库会话
+            refresh_token: 刷新令牌
+            access_claims: 当前访问令牌的声明
+
+        Returns:
+            操作结果消息
+        """
+        claims = decode_token(refresh_token, REFRESH)
+        if claims is not None:
+            revoke_claims(db, claims)
+        if access_claims is not None:
+            revoke_claims(db, access_claims)
+        db.commit()
+        return {"message": "已注销"}
@@ -0,0 +1,308 @@
+"""
+在线备份服务层
+
+使用 SQLite backup API 分步复制数据库：每步只在复制 backup_pages_per_step 页期间持有源库的读锁，
+步与步之间 worker 可以正常提交写入，并按 backup_rate_limit_mb_per_second 限速，避免挤占线上 I/O。
+复制期间源库被其他连接修改时，SQLite 会从头重新复制，得到的始终是某一时刻的一致快照；
+写入过于频繁导致重新开始超过 backup_max_restarts 次时放弃本次备份。
+
+备份先写入 .partial 临时文件，压缩、校验通过后再改名，备份目录中只会出现完整的备份；
+校验时将备份还原到临时文件并执行 PRAGMA integrity_check。
+分片部署时每个分片库单独备份到各自的目录，各文件的快照时刻不同
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from time import monotonic, perf_counter, sleep
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from config import settings
+from database import HOME_SHARD, engine
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+BACKUP_PREFIX = "booking_system-"
+BACKUP_SUFFIXES = (".db", ".db.gz")
+PARTIAL_SUFFIX = ".partial"
+
+# 校验时统计行数的表
+VERIFY_TABLES = ("users", "rooms", "bookings", "booking_events")
+
+CHUNK_SIZE = 1024 * 1024
+
+# 同一进程内同时只允许一个备份
+_backup_lock = threading.Lock()
+
+
+class _BackupRestartLimit(Exception):
+    """复制期间源库被修改导致重新开始的次数超过上限"""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_database(
+    source_path: str,
+    target_path: str,
+    pages_per_step: int,
+    rate_limit_mb: float,
+    max_restarts: int
+) -> dict:
+    """
+    分步复制数据库（步与步之间按限速休眠）
+
+    Returns:
+        {"pages": 总页数, "restarts": 重新开始次数}
+
+    Raises:
+        _BackupRestartLimit: 重新开始次数超过上限时抛出
+    """
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    try:
+        page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        bytes_per_second = rate_limit_mb * 1024 * 1024
+        state = {"steps": 0, "remaining": None, "pages": 0, "restarts": 0}
+        started = monotonic()
+
+        def progress(status, remaining, total):
+            # 成功的一步之后剩余页数没有减少，说明源库被修改，SQLite 已从头重新复制
+            if status == sqlite3.SQLITE_OK and state["remaining"] is not None and remaining >= state["remaining"]:
+                state["restarts"] += 1
+                if state["restarts"] > max_restarts:
+                    raise _BackupRestartLimit()
+            state["remaining"] = remaining
+            state["pages"] = total
+            state["steps"] += 1
+            if bytes_per_second > 0 and remaining:
+                ahead = state["steps"] * pages_per_step * page_size / bytes_per_second - (monotonic() - started)
+                if ahead > 0:
+                    sleep(ahead)
+
+        source.backup(target, pages=pages_per_step, progress=progress)
+        return {"pages": state["pages"], "restarts": state["restarts"]}
+    finally:
+        target.close()
+        source.close()
+
+
+def _compress(source_path: str, target_path: str) -> None:
+    with open(source_path, "rb") as src, gzip.open(target_path, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+@profile_service
+class BackupService:
+    """在线备份服务类"""
+
+    @staticmethod
+    def create_backup(
+        output_dir: Optional[str] = None,
+        compress: bool = True,
+        verify: bool = True,
+        rate_limit_mb: Optional[float] = None,
+        database_path: Optional[str] = None
+    ) -> dict:
+        """
+        在不停止服务的情况下备份数据库
+
+        Args:
+            output_dir: 备份目录（默认取配置）
+            compress: 是否 gzip 压缩
+            verify: 是否还原到临时文件并校验
+            rate_limit_mb: 每秒最多复制的 MB 数，0 表示不限速（默认取配置）
+            database_path: 源数据库文件（默认为当前数据库）
+
+        Returns:
+            备份结果
+
+        Raises:
+            HTTPException: 已有备份正在进行、写入频繁无法完成或校验失败时抛出
+        """
+        if output_dir is None:
+            output_dir = settings.backup_dir
+        if rate_limit_mb is None:
+            rate_limit_mb = settings.backup_rate_limit_mb_per_second
+        if database_path is None:
+            database_path = engine.url.database
+
+        if not _backup_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="已有备份正在进行")
+        try:
+            start = perf_counter()
+            os.makedirs(output_dir, exist_ok=True)
+            now = make_naive(get_current_time())
+            name = f"{BACKUP_PREFIX}{now:%Y%m%dT%H%M%S%f}Z" + (".db.gz" if compress else ".db")
+            path = os.path.join(output_dir, name)
+            copy_path = os.path.join(output_dir, name.removesuffix(".gz") + PARTIAL_SUFFIX)
+            partial_paths = [copy_path]
+            try:
+                try:
+                    copied = _copy_database(
+                        database_path, copy_path, max(settings.backup_pages_per_step, 1),
+                        rate_limit_mb, settings.backup_max_restarts
+                    )
+                except _BackupRestartLimit:
+                    raise HTTPException(
+                        status_code=503, detail="数据库写入频繁，备份多次重新开始，请稍后重试"
+                    ) from None
+                database_bytes = os.path.getsize(copy_path)
+
+                if compress:
+                    partial_paths.append(path + PARTIAL_SUFFIX)
+                    _compress(copy_path, path + PARTIAL_SUFFIX)
+                    os.remove(copy_path)
+                    os.replace(path + PARTIAL_SUFFIX, path)
+                else:
+                    os.replace(copy_path, path)
+
+                verification = None
+                if verify:
+                    verification = BackupService.verify_backup(path)
+                    if not verification["ok"]:
+                        os.remove(path)
+                        raise HTTPException(
+                            status_code=500,
+                            detail=f"备份校验失败: {'; '.join(verification['integrity'])}"
+                        )
+            finally:
+                for partial in partial_paths:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+
+            removed = BackupService.prune_backups(output_dir, settings.backup_keep)
+            return {
+                "file": name,
+                "path": path,
+                "size_bytes": os.path.getsize(path),
+                "database_bytes": database_bytes,
+                "pages": copied["pages"],
+                "restarts": copied["restarts"],
+                "compressed": compress,
+                "sha256": _sha256(path),
+                "verification": verification,
+                "removed": removed,
+                "elapsed_ms": (perf_counter() - start) * 1000,
+            }
+        finally:
+            _backup_lock.release()
+
+    @staticmethod
+    def shard_backup_dir(name: str, output_dir: Optional[str] = None) -> str:
+        """分片的备份目录（主库为备份目录本身，其他分片在其下的 shards/<分片名>；备份目录默认取配置）"""
+        if output_dir is None:
+            output_dir = settings.backup_dir
+        if name == HOME_SHARD:
+            return output_dir
+        return os.path.join(output_dir, "shards", name)
+
+    @staticmethod
+    def verify_backup(path: str) -> dict:
+        """
+        将备份还原到临时文件并校验（PRAGMA integrity_check、结构版本、主要表行数）
+
+        Args:
+            path: 备份文件（.db 或 .db.gz）
+
+        Returns:
+            {"ok", "integrity", "user_version", "tables"}
+
+        Raises:
+            HTTPException: 备份文件不存在时抛出
+        """
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="备份文件不存在")
+
+        fd, restore_path = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(path)))
+        os.close(fd)
+        try:
+            try:
+                if path.endswith(".gz"):
+                    with gzip.open(path, "rb") as src, open(restore_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                else:
+                    shutil.copyfile(path, restore_path)
+            except (OSError, EOFError) as exc:
+                return {"ok": False, "integrity": [f"无法还原: {exc}"], "user_version": None, "tables": {}}
+
+            conn = sqlite3.connect(f"file:{restore_path}?mode=ro", uri=True)
+            try:
+                integrity = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+                user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+                existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                tables = {
+                    table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                    for table in VERIFY_TABLES if table in existing
+                }
+            except sqlite3.DatabaseError as exc:
+                return {"ok": False, "integrity": [str(exc)], "user_version": None, "tables": {}}
+            finally:
+                conn.close()
+        finally:
+            os.remove(restore_path)
+
+        return {
+            "ok": integrity == ["ok"],
+            "integrity": integrity[:20],
+            "user_version": user_version,
+            "tables": tables,
+        }
+
+    @staticmethod
+    def list_backups(output_dir: Optional[str] = None) -> List[dict]:
+        """
+        列出备份目录中的备份（按时间从新到旧）
+
+        Args:
+            output_dir: 备份目录（默认取配置）
+
+        Returns:
+            [{"file", "size_bytes", "created_at"}, ...]
+        """
+        if output_dir is None:
+            output_dir = settings.backup_dir
+        if not os.path.isdir(output_dir):
+            return []
+        backups = []
+        for name in sorted(os.listdir(output_dir), reverse=True):
+            if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES):
+                stat = os.stat(os.path.join(output_dir, name))
+                backups.append({
+                    "file": name,
+                    "size_bytes": stat.st_size,
+                    "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+                })
+        return backups
+
+    @staticmethod
+    def prune_backups(output_dir: str, keep: int) -> List[str]:
+        """
+        只保留最新的 keep 个备份
+
+        Args:
+            output_dir: 备份目录
+            keep: 保留数量，0 表示不清理
+
+        Returns:
+            删除的文件名
+        """
+        if keep <= 0:
+            return []
+        removed = [backup["file"] for backup in BackupService.list_backups(output_dir)[keep:]]
+        for name in removed:
+            os.remove(os.path.join(output_dir, name))
+        return removed
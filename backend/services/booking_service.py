@@ -1,20 +1,46 @@
 """
 预约业务逻辑服务层
 将业务逻辑从路由中分离，提高可维护性和可测试性
+
+分片部署时写操作在会议室所在的分片中完成，按ID的操作由预约ID定位分片，
+不限定会议室的查询并发读取各分片后合并（见 services/shard_service.py）
 """
 
-from datetime import datetime
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+import heapq
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Iterator, Optional, List
+from sqlalchemy.orm import Session, joinedload, object_session
+from sqlalchemy import and_, func, literal_column, or_
 from fastapi import HTTPException
 
 from models import Booking, User, Room
-from schemas import BookingCreate
+from database import HOME_SHARD
+from schemas import BookingCreate, BookingResponse
 from utils.timezone import make_aware, make_naive, get_current_time
-from utils.validators import validate_time_range, validate_future_time
+from utils.validators import validate_time_range, validate_duration, validate_future_time
+from utils.metrics import BOOKING_CONFLICT_CHECKS
+from utils.profiling import profile_service
+from utils.pagination import clamp_limit, check_merge_offset, fetch_within_budget, raise_result_too_large
+from config import settings
+from services.usage_service import UsageService
+from services.notification_service import NotificationService
+from services.job_service import job_handler
+from services.archive_service import ArchiveService
+from services.idempotency_service import IdempotencyService
+from services.occupancy import ACTIVE_STATUSES, hold_not_expired
+from services.slot_service import SlotService, day_masks
+from services.calendar_service import CalendarService, ROOM_FEED, USER_FEED
+from services.event_service import EventService, EVENT_COLUMNS, CREATED, HELD, CONFIRMED, CANCELLED, EXPIRED, DELETED
+from services.shard_service import ShardService
+from utils.cache_bus import bump_generation, BOOKINGS
+
 
+# 周期取消过期 pending 预约的后台任务
+EXPIRE_PENDING_JOB = "bookings.expire_pending"
 
+
+@profile_service
 class BookingService:
     """预约服务类"""
     
@@ -45,7 +71,9 @@ class BookingService:
         
         query = db.query(Booking).filter(
             Booking.room_id == room_id,
+            Booking.deleted_at.is_(None),
             Booking.status != "cancelled",
+            hold_not_expired(),
             or_(
                 and_(Booking.start_time <= check_start, Booking.end_time > check_start),
                 and_(Booking.start_time < check_end, Booking.end_time >= check_end),
@@ -59,6 +87,73 @@ class BookingService:
         conflicting_booking = query.first()
         return conflicting_booking is not None
     
+    @staticmethod
+    def check_user_overlap(
+        db: Session,
+        user_id: int,
+        start_time: datetime,
+        end_time: datetime,
+        exclude_booking_id: Optional[int] = None
+    ) -> bool:
+        """
+        检查用户在该时间段是否已有其他预约（任意会议室）
+        
+        单次预约不超过 BOOKING_MAX_BOOKING_HOURS，与该时间段重叠的预约开始时间必然落在
+        (start_time - 上限, end_time) 内，由 ix_bookings_user_status_start 做有界范围扫描
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            start_time: 开始时间
+            end_time: 结束时间
+            exclude_booking_id: 排除的预约ID
+            
+        Returns:
+            是否存在重叠
+        """
+        check_start = make_naive(start_time)
+        check_end = make_naive(end_time)
+        
+        query = db.query(Booking.id).filter(
+            Booking.user_id == user_id,
+            Booking.deleted_at.is_(None),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time > check_start - timedelta(hours=settings.max_booking_hours),
+            Booking.start_time < check_end,
+            Booking.end_time > check_start,
+            hold_not_expired()
+        )
+        if exclude_booking_id:
+            query = query.filter(Booking.id != exclude_booking_id)
+        
+        return query.first() is not None
+    
+    @staticmethod
+    def check_user_overlap_all_shards(
+        db: Session,
+        user_id: int,
+        start_time: datetime,
+        end_time: datetime,
+        exclude_booking_id: Optional[int] = None
+    ) -> bool:
+        """
+        在全部分片中检查用户的时间重叠（并发查询；当前会话所在分片包含本事务未提交的写入，
+        其他分片读取的是已提交的数据）
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            start_time: 开始时间
+            end_time: 结束时间
+            exclude_booking_id: 排除的预约ID
+            
+        Returns:
+            是否存在重叠
+        """
+        return any(ShardService.fan_out(db, lambda shard_db: BookingService.check_user_overlap(
+            shard_db, user_id, start_time, end_time, exclude_booking_id
+        )))
+    
     @staticmethod
     def validate_booking_data(
         db: Session,
@@ -82,12 +177,12 @@ class BookingService:
             HTTPException: 验证失败时抛出
         """
         # 验证用户存在
-        user = db.query(User).filter(User.id == booking.user_id).first()
+        user = db.query(User).filter(User.id == booking.user_id, User.deleted_at.is_(None)).first()
         if not user:
             raise HTTPException(status_code=404, detail="用户不存在")
         
         # 验证会议室存在
-        room = db.query(Room).filter(Room.id == booking.room_id).first()
+        room = db.query(Room).filter(Room.id == booking.room_id, Room.deleted_at.is_(None)).first()
         if not room:
             raise HTTPException(status_code=404, detail="会议室不存在")
         
@@ -97,30 +192,49 @@ class BookingService:
         
         # 验证时间范围
         validate_time_range(start_time, end_time)
+        validate_duration(start_time, end_time, settings.max_booking_hours)
         
         # 验证不能预约过去的时间
         validate_future_time(start_time)
         
         # 检查时间冲突
         if BookingService.check_time_conflict(db, booking.room_id, start_time, end_time):
+            BOOKING_CONFLICT_CHECKS.inc(result="conflict")
             raise HTTPException(status_code=400, detail="该时间段已被预约")
+        BOOKING_CONFLICT_CHECKS.inc(result="ok")
+        
+        # 检查同一用户的时间重叠（可通过 BOOKING_PREVENT_USER_OVERLAP 关闭）
+        if settings.prevent_user_overlap and BookingService.check_user_overlap_all_shards(
+            db, booking.user_id, start_time, end_time
+        ):
+            raise HTTPException(status_code=400, detail="该用户在此时间段已有其他预约")
         
         return user, room
     
     @staticmethod
-    def create_booking(
+    def _insert_booking(
         db: Session,
-        booking: BookingCreate
+        booking: BookingCreate,
+        status: str,
+        hold_expires_at: Optional[datetime] = None
     ) -> Booking:
         """
-        创建预约
+        校验并插入预约（不提交事务）
+        
+        插入后在同一事务中再次检查冲突：事务持有写锁期间其他请求无法提交，
+        并发请求同时通过插入前的检查时，后提交的一方会在这里发现冲突并回滚
         
         Args:
-            db: 数据库会话
+            db: 会议室所在分片的数据库会话
             booking: 预约创建数据
+            status: 预约状态
+            hold_expires_at: 临时保留的过期时间
             
         Returns:
-            创建的预约对象
+            已 flush 的预约对象
+            
+        Raises:
+            HTTPException: 验证失败或时间段已被占用时抛出
         """
         # 处理时区
         start_time = make_aware(booking.start_time)
@@ -136,15 +250,157 @@ class BookingService:
             start_time=make_naive(start_time),
             end_time=make_naive(end_time),
             purpose=booking.purpose,
-            status="confirmed"
+            status=status,
+            hold_expires_at=hold_expires_at
         )
         
         db.add(db_booking)
+        db.flush()
+        
+        if BookingService.check_time_conflict(
+            db, booking.room_id, start_time, end_time, exclude_booking_id=db_booking.id
+        ):
+            db.rollback()
+            BOOKING_CONFLICT_CHECKS.inc(result="conflict")
+            raise HTTPException(status_code=400, detail="该时间段已被预约")
+        if settings.prevent_user_overlap and BookingService.check_user_overlap_all_shards(
+            db, booking.user_id, start_time, end_time, exclude_booking_id=db_booking.id
+        ):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="该用户在此时间段已有其他预约")
+        
+        return db_booking
+    
+    @staticmethod
+    def create_booking(
+        db: Session,
+        booking: BookingCreate,
+        idempotency_key: Optional[str] = None,
+        request_hash: Optional[str] = None
+    ) -> Booking:
+        """
+        创建预约
+        
+        带幂等键时预约记录幂等标识（同一标识最多创建一条预约）；预约在主库时，
+        响应与预约在同一事务中写入幂等键记录
+        
+        Args:
+            db: 数据库会话
+            booking: 预约创建数据
+            idempotency_key: 幂等键
+            request_hash: 请求指纹（与幂等键一起传入）
+            
+        Returns:
+            创建的预约对象（属于会议室所在分片的会话）
+        """
+        db = ShardService.room_session(db, booking.room_id)
+        db_booking = BookingService._insert_booking(db, booking, "confirmed")
+        if idempotency_key is not None:
+            db_booking.idempotency_key = IdempotencyService.record_key(idempotency_key, request_hash)
+            if db.shard_name == HOME_SHARD:
+                db.flush()
+                IdempotencyService.save_response(
+                    db, idempotency_key, 200, BookingResponse.model_validate(db_booking).model_dump(mode="json")
+                )
+        
+        # 每日汇总和确认邮件与预约在同一事务中入队，由后台任务处理；时段位图同步更新
+        UsageService.schedule_refresh(db, db_booking)
+        SlotService.refresh_booking(db, db_booking)
+        CalendarService.touch_booking(db, db_booking)
+        EventService.record(db, db_booking, CREATED)
+        NotificationService.enqueue_booking_confirmation(db, db_booking)
+        bump_generation(db, BOOKINGS)
+        
+        db.commit()
+        db.refresh(db_booking)
+        
+        return db_booking
+    
+    @staticmethod
+    def create_hold(
+        db: Session,
+        booking: BookingCreate,
+        ttl_seconds: Optional[int] = None
+    ) -> Booking:
+        """
+        创建临时保留（pending 预约，过期前占用时间段，需调用 confirm_hold 确认）
+        
+        Args:
+            db: 数据库会话
+            booking: 预约创建数据
+            ttl_seconds: 保留时长（秒），为空时取配置，超过上限时按上限处理
+            
+        Returns:
+            创建的预约对象
+            
+        Raises:
+            HTTPException: 用户未过期的保留数量达到上限或验证失败时抛出
+        """
+        now = make_naive(get_current_time())
+        active_holds = sum(ShardService.fan_out(db, lambda shard_db: shard_db.query(func.count(Booking.id)).filter(
+            Booking.status == "pending",
+            Booking.deleted_at.is_(None),
+            Booking.hold_expires_at > now,
+            Booking.user_id == booking.user_id
+        ).scalar()))
+        if active_holds >= settings.max_active_holds_per_user:
+            raise HTTPException(status_code=400, detail="未确认的临时保留数量已达上限")
+        
+        db = ShardService.room_session(db, booking.room_id)
+        ttl = min(ttl_seconds or settings.hold_ttl_seconds, settings.hold_max_ttl_seconds)
+        db_booking = BookingService._insert_booking(
+            db, booking, "pending", hold_expires_at=now + timedelta(seconds=ttl)
+        )
+        
+        # 临时保留不计入使用率汇总，确认后才计入；时段位图中按占用计
+        SlotService.refresh_booking(db, db_booking)
+        EventService.record(db, db_booking, HELD)
+        bump_generation(db, BOOKINGS)
+        
         db.commit()
         db.refresh(db_booking)
         
         return db_booking
     
+    @staticmethod
+    def confirm_hold(
+        db: Session,
+        booking_id: int
+    ) -> Booking:
+        """
+        确认临时保留
+        
+        Args:
+            db: 数据库会话
+            booking_id: 预约ID
+            
+        Returns:
+            已确认的预约对象
+            
+        Raises:
+            HTTPException: 预约不存在、不是临时保留或保留已过期时抛出
+        """
+        booking = BookingService.get_booking_by_id(db, booking_id)
+        db = object_session(booking)
+        
+        if booking.status != "pending" or booking.hold_expires_at is None:
+            raise HTTPException(status_code=400, detail="该预约不是待确认的临时保留")
+        if booking.hold_expires_at <= make_naive(get_current_time()):
+            raise HTTPException(status_code=400, detail="临时保留已过期")
+        
+        booking.status = "confirmed"
+        booking.hold_expires_at = None
+        UsageService.schedule_refresh(db, booking)
+        CalendarService.touch_booking(db, booking)
+        EventService.record(db, booking, CONFIRMED)
+        NotificationService.enqueue_booking_confirmation(db, booking)
+        bump_generation(db, BOOKINGS)
+        
+        db.commit()
+        db.refresh(booking)
+        
+        return booking
+    
     @staticmethod
     def get_booking_by_id(
         db: Session,
@@ -158,16 +414,41 @@ class BookingService:
             booking_id: 预约ID
             
         Returns:
-            预约对象
+            预约对象（属于预约所在分片的会话）
             
         Raises:
             HTTPException: 预约不存在时抛出
         """
-        booking = db.query(Booking).filter(Booking.id == booking_id).first()
+        db = ShardService.booking_session(db, booking_id)
+        booking = db.query(Booking).filter(Booking.id == booking_id, Booking.deleted_at.is_(None)).first()
         if not booking:
             raise HTTPException(status_code=404, detail="预约不存在")
         return booking
     
+    @staticmethod
+    def get_booking_by_idempotency_key(
+        db: Session,
+        room_id: int,
+        idempotency_key: str,
+        request_hash: str
+    ) -> Optional[Booking]:
+        """
+        查找以幂等键创建的预约（含已删除的预约）
+        
+        Args:
+            db: 数据库会话
+            room_id: 会议室ID
+            idempotency_key: 幂等键
+            request_hash: 请求指纹
+            
+        Returns:
+            预约对象，不存在时返回 None
+        """
+        db = ShardService.room_session(db, room_id)
+        return db.query(Booking).filter(
+            Booking.idempotency_key == IdempotencyService.record_key(idempotency_key, request_hash)
+        ).first()
+    
     @staticmethod
     def get_bookings(
         db: Session,
@@ -175,7 +456,7 @@ class BookingService:
         limit: int = 100
     ) -> List[Booking]:
         """
-        获取预约列表
+        获取预约列表（按ID排序；分片部署时各分片取前 skip + limit 条后合并）
         
         Args:
             db: 数据库会话
@@ -184,42 +465,227 @@ class BookingService:
             
         Returns:
             预约列表
+            
+        Raises:
+            HTTPException: 分片部署时跳过数量超过 BOOKING_MAX_RESULT_ROWS 时抛出 413
+        """
+        limit = clamp_limit(limit)
+        if not ShardService.enabled():
+            return db.query(Booking).filter(
+                Booking.deleted_at.is_(None)
+            ).order_by(Booking.id).offset(skip).limit(limit).all()
+        
+        check_merge_offset(skip)
+        parts = ShardService.fan_out(db, lambda shard_db: shard_db.query(Booking).filter(
+            Booking.deleted_at.is_(None)
+        ).order_by(Booking.id).limit(skip + limit).all())
+        return list(heapq.merge(*parts, key=attrgetter("id")))[skip:skip + limit]
+    
+    @staticmethod
+    def get_bookings_in_window(
+        db: Session,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        room_id: Optional[int] = None
+    ) -> list:
+        """
+        获取时间窗口内的预约，窗口早于归档边界时合并归档数据
+        
+        结果行数受 BOOKING_MAX_RESULT_ROWS 限制，超出时提前中止；
+        指定会议室时只查询其所在分片，否则并发查询各分片后合并
+        
+        Args:
+            db: 数据库会话
+            start: 窗口开始时间（None 表示不限）
+            end: 窗口结束时间（None 表示不限）
+            user_id: 用户ID
+            room_id: 会议室ID
+            
+        Returns:
+            按开始时间排序的预约列表（可能包含归档预约）
+            
+        Raises:
+            HTTPException: 结果超出行数预算时抛出 413
+        """
+        names = None if room_id is None else [ShardService.shard_of_room(db, room_id)]
+        parts = ShardService.fan_out(db, lambda shard_db: BookingService._bookings_in_shard_window(
+            shard_db, start, end, user_id, room_id
+        ), names)
+        if len(parts) == 1:
+            return parts[0]
+        if sum(len(part) for part in parts) > settings.max_result_rows:
+            raise_result_too_large()
+        return list(heapq.merge(*parts, key=attrgetter("start_time")))
+    
+    @staticmethod
+    def _bookings_in_shard_window(
+        db: Session,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        user_id: Optional[int],
+        room_id: Optional[int]
+    ) -> list:
+        """单个分片中时间窗口内的预约（含归档预约，按开始时间排序）"""
+        query = BookingService._window_query(db, start, end, user_id, room_id)
+        bookings = fetch_within_budget(query.order_by(Booking.start_time))
+        
+        if ArchiveService.window_reaches_archive(db, start):
+            budget = settings.max_result_rows - len(bookings)
+            archived = ArchiveService.get_archived_bookings(
+                db, start, end, user_id, room_id, limit=budget + 1
+            )
+            if len(archived) > budget:
+                raise_result_too_large()
+            bookings = sorted(archived + bookings, key=lambda b: b.start_time)
+        
+        return bookings
+    
+    @staticmethod
+    def _window_query(
+        db: Session,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        user_id: Optional[int],
+        room_id: Optional[int]
+    ):
+        """构造时间窗口查询（在线表，不含已删除预约）"""
+        query = db.query(Booking).filter(Booking.deleted_at.is_(None))
+        if user_id is not None:
+            query = query.filter(Booking.user_id == user_id)
+        if room_id is not None:
+            query = query.filter(Booking.room_id == room_id)
+        if start is not None:
+            query = query.filter(Booking.end_time > make_naive(start))
+        if end is not None:
+            query = query.filter(Booking.start_time < make_naive(end))
+        return query
+    
+    @staticmethod
+    def iter_bookings(
+        db: Session,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        room_id: Optional[int] = None
+    ) -> Iterator:
+        """
+        逐批遍历时间窗口内的预约（用于流式导出，不受行数预算限制）
+        
+        先输出归档预约，再输出在线预约，各自按开始时间排序（分片部署时按开始时间归并各分片）；
+        每批最多加载 BOOKING_EXPORT_BATCH_SIZE 个对象，内存占用与总行数无关
+        
+        Args:
+            db: 数据库会话
+            start: 窗口开始时间
+            end: 窗口结束时间
+            user_id: 用户ID
+            room_id: 会议室ID
+            
+        Yields:
+            预约对象（可能包含归档预约）
         """
-        return db.query(Booking).offset(skip).limit(limit).all()
+        batch_size = settings.export_batch_size
+        names = ShardService.names() if room_id is None else [ShardService.shard_of_room(db, room_id)]
+        sessions = [db.shard(name) for name in names]
+        archived = [
+            ArchiveService.archived_window_query(shard_db, start, end, user_id, room_id).yield_per(batch_size)
+            for shard_db in sessions if ArchiveService.window_reaches_archive(shard_db, start)
+        ]
+        yield from heapq.merge(*archived, key=attrgetter("start_time"))
+        live = [
+            BookingService._window_query(shard_db, start, end, user_id, room_id)
+            .order_by(Booking.start_time).yield_per(batch_size)
+            for shard_db in sessions
+        ]
+        yield from heapq.merge(*live, key=attrgetter("start_time"))
     
     @staticmethod
     def get_user_bookings(
         db: Session,
-        user_id: int
-    ) -> List[Booking]:
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> list:
         """
         获取用户的预约列表
         
         Args:
             db: 数据库会话
             user_id: 用户ID
+            start: 窗口开始时间
+            end: 窗口结束时间
             
         Returns:
             预约列表
         """
-        return db.query(Booking).filter(Booking.user_id == user_id).all()
+        return BookingService.get_bookings_in_window(db, start, end, user_id=user_id)
     
     @staticmethod
-    def get_room_bookings(
+    def get_user_agenda(
         db: Session,
-        room_id: int
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
     ) -> List[Booking]:
+        """
+        获取用户日程：时间窗口内仍有效的预约（含进行中的），按开始时间排序
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            start: 窗口开始时间（默认当前时间）
+            end: 窗口结束时间（默认开始后 BOOKING_AGENDA_DEFAULT_DAYS 天）
+            
+        Returns:
+            预约列表
+            
+        Raises:
+            HTTPException: 用户不存在、时间窗口无效或结果超出行数预算时抛出
+        """
+        if not db.query(User.id).filter(User.id == user_id, User.deleted_at.is_(None)).first():
+            raise HTTPException(status_code=404, detail="用户不存在")
+        
+        start = make_naive(make_aware(start)) if start else make_naive(get_current_time())
+        end = make_naive(make_aware(end)) if end else start + timedelta(days=settings.agenda_default_days)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="开始时间必须早于结束时间")
+        
+        parts = ShardService.fan_out(db, lambda shard_db: fetch_within_budget(
+            shard_db.query(Booking).options(joinedload(Booking.room)).filter(
+                Booking.user_id == user_id,
+                Booking.deleted_at.is_(None),
+                Booking.status.in_(ACTIVE_STATUSES),
+                Booking.start_time > start - timedelta(hours=settings.max_booking_hours),
+                Booking.start_time < end,
+                Booking.end_time > start,
+                hold_not_expired()
+            ).order_by(Booking.start_time)
+        ))
+        if sum(len(part) for part in parts) > settings.max_result_rows:
+            raise_result_too_large()
+        return list(heapq.merge(*parts, key=attrgetter("start_time")))
+    
+    @staticmethod
+    def get_room_bookings(
+        db: Session,
+        room_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> list:
         """
         获取会议室的预约列表
         
         Args:
             db: 数据库会话
             room_id: 会议室ID
+            start: 窗口开始时间
+            end: 窗口结束时间
             
         Returns:
             预约列表
         """
-        return db.query(Booking).filter(Booking.room_id == room_id).all()
+        return BookingService.get_bookings_in_window(db, start, end, room_id=room_id)
     
     @staticmethod
     def cancel_booking(
@@ -240,11 +706,17 @@ class BookingService:
             HTTPException: 预约不存在或已取消时抛出
         """
         booking = BookingService.get_booking_by_id(db, booking_id)
+        db = object_session(booking)
         
         if booking.status == "cancelled":
             raise HTTPException(status_code=400, detail="预约已取消")
         
         booking.status = "cancelled"
+        UsageService.schedule_refresh(db, booking)
+        SlotService.refresh_booking(db, booking)
+        CalendarService.touch_booking(db, booking)
+        EventService.record(db, booking, CANCELLED)
+        bump_generation(db, BOOKINGS)
         db.commit()
         
         return {"message": "预约已取消"}
@@ -255,7 +727,7 @@ class BookingService:
         booking_id: int
     ) -> dict:
         """
-        删除预约
+        删除预约（软删除，只写入墓碑时间，由清理任务稍后物理删除）
         
         Args:
             db: 数据库会话
@@ -265,9 +737,125 @@ class BookingService:
             操作结果消息
         """
         booking = BookingService.get_booking_by_id(db, booking_id)
+        db = object_session(booking)
         
-        db.delete(booking)
+        booking.deleted_at = make_naive(get_current_time())
+        if booking.status != "cancelled":
+            UsageService.schedule_refresh(db, booking)
+            SlotService.refresh_booking(db, booking)
+            CalendarService.touch_booking(db, booking)
+        EventService.record(db, booking, DELETED)
+        bump_generation(db, BOOKINGS)
         db.commit()
         
         return {"message": "预约已删除"}
+    
+    @staticmethod
+    def cancel_future_bookings(
+        db: Session,
+        user_id: Optional[int] = None,
+        room_id: Optional[int] = None
+    ) -> int:
+        """
+        取消用户或会议室尚未开始的有效预约（删除用户或会议室时调用）
+        
+        指定会议室时只处理其所在分片，否则处理全部分片；其他分片的修改在返回前提交，
+        db 所在分片的修改不提交，随调用方的事务（写入墓碑）一起提交
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            room_id: 会议室ID
+        
+        Returns:
+            取消的预约数量
+        """
+        now = make_naive(get_current_time())
+        names = ShardService.names() if room_id is None else [ShardService.shard_of_room(db, room_id)]
+        count = 0
+        for name in names:
+            shard_db = db.shard(name)
+            query = shard_db.query(Booking).filter(
+                Booking.deleted_at.is_(None),
+                Booking.status.in_(ACTIVE_STATUSES),
+                Booking.start_time > now
+            )
+            if user_id is not None:
+                query = query.filter(Booking.user_id == user_id)
+            if room_id is not None:
+                query = query.filter(Booking.room_id == room_id)
+            bookings = query.all()
+            if not bookings:
+                continue
+        
+            for booking in bookings:
+                booking.status = "cancelled"
+            days_by_room = _days_by_room(bookings)
+            UsageService.schedule_refresh_rooms(shard_db, days_by_room)
+            SlotService.refresh_rooms(shard_db, days_by_room)
+            CalendarService.touch_many(shard_db, ROOM_FEED, days_by_room)
+            CalendarService.touch_many(shard_db, USER_FEED, {booking.user_id for booking in bookings})
+            EventService.record_rows(shard_db, [
+                {**{column: getattr(booking, column) for column in EVENT_COLUMNS[1:]}, "booking_id": booking.id}
+                for booking in bookings
+            ], CANCELLED)
+            bump_generation(shard_db, BOOKINGS)
+            if shard_db is not db:
+                shard_db.commit()
+            count += len(bookings)
+        return count
+        
+    @staticmethod
+    def expire_stale_pending(db: Session, limit: int = 500) -> int:
+        """
+        取消已过期的临时保留，以及开始时间已过但仍未确认（pending）的预约
+        由周期后台任务调用（每个分片各自执行），不提交事务；超过 limit 条时剩余的留给下一次执行
+        
+        过期的临时保留与开始时间已过的预约分别在部分索引 ix_bookings_pending / ix_bookings_pending_start
+        （仅包含未删除的 pending 预约）上做范围扫描，不扫描预约表；状态条件写成字面量，与索引的 WHERE 子句一致，
+        绑定参数时 SQLite 无法使用部分索引
+        
+        Args:
+            db: 数据库会话
+            limit: 单次最多处理的条数
+            
+        Returns:
+            取消的预约数量
+        """
+        now = make_naive(get_current_time())
+        pending = (Booking.status == literal_column("'pending'"), Booking.deleted_at.is_(None))
+        stale = db.query(Booking).filter(*pending, Booking.hold_expires_at <= now).limit(limit).all()
+        if len(stale) < limit:
+            seen = {booking.id for booking in stale}
+            stale += [
+                booking for booking in db.query(Booking).filter(*pending, Booking.start_time < now).limit(limit)
+                if booking.id not in seen
+            ][:limit - len(stale)]
+        
+        for booking in stale:
+            booking.status = "cancelled"
+            EventService.record(db, booking, EXPIRED)
+            # 临时保留未计入汇总，无需重新计算
+            if booking.hold_expires_at is None:
+                UsageService.schedule_refresh(db, booking)
+                CalendarService.touch_booking(db, booking)
+        SlotService.refresh_rooms(db, _days_by_room(stale))
+        if stale:
+            bump_generation(db, BOOKINGS)
+        return len(stale)
+
+
+def _days_by_room(bookings: List[Booking]) -> dict:
+    """按会议室汇总预约所跨的日期"""
+    days = {}
+    for booking in bookings:
+        days.setdefault(booking.room_id, set()).update(
+            day for day, _ in day_masks(booking.start_time, booking.end_time)
+        )
+    return days
+
+
+@job_handler(EXPIRE_PENDING_JOB)
+def _expire_pending_job(db: Session, payload: dict) -> None:
+    BookingService.expire_stale_pending(db)
 
@@ -0,0 +1,203 @@
+"""
+日历订阅服务层
+
+会议室和用户的 iCalendar 订阅只包含配置的时间窗口（过去 calendar_past_days 天至未来 calendar_future_days 天）。
+calendar_versions 表为每个会议室、每个用户保存一个版本号，相关预约变更时在同一事务中递增；
+会议室、用户资料的变更（改名、删除）较少，通过 cache_generations 中 ROOMS / USERS 的版本号统一失效。
+各 worker 缓存序列化后的日历文本，版本号或窗口起始日期变化时才重新生成。
+ETag 由上述版本号和窗口起始日期构成，客户端轮询时多数请求只需一次主键查询即可返回 304。
+分片部署时会议室订阅只读取会议室所在分片；用户的预约可能分布在多个分片，版本号取各分片之和（只增不减）
+"""
+
+import heapq
+import threading
+from datetime import datetime, time, timedelta
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload
+
+from config import settings
+from models import Booking, CalendarVersion, Room, User
+from services.occupancy import ACTIVE_STATUSES
+from services.shard_service import ShardService
+from utils.cache_bus import ROOMS, USERS, get_cache_bus
+from utils.ics import etag_matches, render_calendar
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+ROOM_FEED = "room"
+USER_FEED = "user"
+
+UID_DOMAIN = "booking.local"
+
+ICS_STATUSES = {"confirmed": "CONFIRMED", "pending": "TENTATIVE"}
+
+
+class _FeedCache:
+    """已生成的日历 {(类型, ID): (ETag, 文本)}（超过上限时整体清空）"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: Dict[Tuple[str, int], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int], etag: str) -> Optional[str]:
+        item = self._items.get(key)
+        return item[1] if item is not None and item[0] == etag else None
+
+    def put(self, key: Tuple[str, int], etag: str, body: str) -> None:
+        with self._lock:
+            if len(self._items) >= self.max_entries:
+                self._items.clear()
+            self._items[key] = (etag, body)
+
+
+_feed_cache = _FeedCache(settings.calendar_cache_size)
+
+
+def _window() -> Tuple[datetime, datetime]:
+    """订阅时间窗口（起点取整到 UTC 日期，同一天内 ETag 不变）"""
+    today = make_naive(get_current_time()).date()
+    start = datetime.combine(today - timedelta(days=settings.calendar_past_days), time.min)
+    end = datetime.combine(today + timedelta(days=settings.calendar_future_days + 1), time.min)
+    return start, end
+
+
+@profile_service
+class CalendarService:
+    """日历订阅服务类"""
+
+    @staticmethod
+    def touch(db: Session, scope: str, owner_id: int) -> None:
+        """
+        在当前事务中递增订阅版本号（不提交事务）
+
+        Args:
+            db: 数据库会话
+            scope: ROOM_FEED / USER_FEED
+            owner_id: 会议室ID或用户ID
+        """
+        CalendarService.touch_many(db, scope, [owner_id])
+
+    @staticmethod
+    def touch_many(db: Session, scope: str, owner_ids: Iterable[int]) -> None:
+        """
+        在当前事务中批量递增订阅版本号（一条 executemany 语句，不提交事务）
+
+        Args:
+            db: 数据库会话
+            scope: ROOM_FEED / USER_FEED
+            owner_ids: 会议室ID或用户ID
+        """
+        params = [{"scope": scope, "owner_id": owner_id, "version": 1} for owner_id in sorted(set(owner_ids))]
+        if not params:
+            return
+        table = CalendarVersion.__table__
+        db.execute(sqlite_insert(table).on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.owner_id],
+            set_={"version": table.c.version + 1}
+        ), params)
+
+    @staticmethod
+    def touch_booking(db: Session, booking: Booking) -> None:
+        """预约变更后递增其会议室和用户的订阅版本号（不提交事务）"""
+        CalendarService.touch(db, ROOM_FEED, booking.room_id)
+        CalendarService.touch(db, USER_FEED, booking.user_id)
+
+    @staticmethod
+    def get_feed(
+        db: Session,
+        scope: str,
+        owner_id: int,
+        if_none_match: Optional[str] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        获取订阅日历
+
+        Args:
+            db: 数据库会话
+            scope: ROOM_FEED / USER_FEED
+            owner_id: 会议室ID或用户ID
+            if_none_match: 客户端的 If-None-Match 请求头
+
+        Returns:
+            (ETag, 日历文本)，客户端已有当前版本时文本为 None
+
+        Raises:
+            HTTPException: 会议室或用户不存在时抛出
+        """
+        if scope == ROOM_FEED:
+            names = [ShardService.shard_of_room(db, owner_id)]
+        else:
+            names = None
+        version = sum(ShardService.fan_out(db, lambda shard_db: shard_db.query(CalendarVersion.version).filter(
+            CalendarVersion.scope == scope, CalendarVersion.owner_id == owner_id
+        ).scalar() or 0, names))
+        generations = get_cache_bus().poll()
+        window_start, window_end = _window()
+        etag = (
+            f'"{scope}-{owner_id}-{version}-{generations.get(ROOMS, 0)}.{generations.get(USERS, 0)}'
+            f'-{window_start:%Y%m%d}"'
+        )
+        if etag_matches(if_none_match, etag):
+            return etag, None
+
+        key = (scope, owner_id)
+        body = _feed_cache.get(key, etag)
+        if body is None:
+            body = CalendarService._render(db, scope, owner_id, window_start, window_end, names)
+            _feed_cache.put(key, etag, body)
+        return etag, body
+
+    @staticmethod
+    def _render(
+        db: Session,
+        scope: str,
+        owner_id: int,
+        window_start: datetime,
+        window_end: datetime,
+        names: Optional[List[str]] = None
+    ) -> str:
+        """生成时间窗口内的日历文本（不含临时保留；names 为需要查询的分片，默认全部分片）"""
+        if scope == ROOM_FEED:
+            owner = db.query(Room).filter(Room.id == owner_id, Room.deleted_at.is_(None)).first()
+            if owner is None:
+                raise HTTPException(status_code=404, detail="会议室不存在")
+            name, owner_column, related = f"{owner.name}（{owner.location}）", Booking.room_id, Booking.user
+        else:
+            owner = db.query(User).filter(User.id == owner_id, User.deleted_at.is_(None)).first()
+            if owner is None:
+                raise HTTPException(status_code=404, detail="用户不存在")
+            name, owner_column, related = f"{owner.username} 的会议", Booking.user_id, Booking.room
+
+        # 单次预约不超过 max_booking_hours，开始时间的下界使范围扫描有界
+        parts = ShardService.fan_out(db, lambda shard_db: shard_db.query(Booking).options(joinedload(related)).filter(
+            owner_column == owner_id,
+            Booking.deleted_at.is_(None),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.hold_expires_at.is_(None),
+            Booking.start_time > window_start - timedelta(hours=settings.max_booking_hours),
+            Booking.start_time < window_end,
+            Booking.end_time > window_start
+        ).order_by(Booking.start_time, Booking.id).all(), names)
+        bookings = list(heapq.merge(*parts, key=attrgetter("start_time", "id")))
+
+        events = []
+        for booking in bookings:
+            room = booking.room if scope == USER_FEED else owner
+            user = booking.user if scope == ROOM_FEED else owner
+            events.append({
+                "uid": f"booking-{booking.id}@{UID_DOMAIN}",
+                "dtstamp": booking.created_at or booking.start_time,
+                "start": booking.start_time,
+                "end": booking.end_time,
+                "summary": booking.purpose or (room.name if scope == USER_FEED else "会议室预约"),
+                "location": f"{room.name}（{room.location}）",
+                "description": f"预约人：{user.username}",
+                "status": ICS_STATUSES[booking.status],
+            })
+        return render_calendar(name, events)
@@ -0,0 +1,250 @@
+"""
+预约事件日志服务层
+
+预约的每次变更在同一事务中追加一条 booking_events（seq 单调递增）。SQLite 写事务串行执行，
+seq 的顺序即提交顺序，读取尾部时不会出现稍后才提交的较小 seq；
+进程内索引、缓存和汇总可以记录处理到的 seq 作为检查点，之后只需读取并重放检查点之后的事件。
+
+状态 = 最新快照（booking_snapshots）+ 快照之后的事件，对应 bookings 表中未删除的预约。
+周期任务定期生成新快照，并删除上一个快照之前的事件与快照（保留一个快照周期的事件，
+检查点稍旧的消费者仍可继续重放），重建时间不随历史增长。
+分片部署时每个分片库有各自的事件日志和 seq，对应该分片的 bookings 表
+"""
+
+import gzip
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, String, func, literal, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Booking, BookingEvent, BookingSnapshot
+from services.job_service import job_handler
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+COMPACT_JOB = "events.compact"
+
+# 事件类型
+CREATED = "created"
+HELD = "held"
+CONFIRMED = "confirmed"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+DELETED = "deleted"
+ARCHIVED = "archived"
+# 会议室在分片之间迁移（见 services/shard_service.py）：源分片记录 moved_out，目标分片记录 moved_in
+MOVED_OUT = "moved_out"
+MOVED_IN = "moved_in"
+
+# 预约离开 bookings 表（或被软删除）的事件，重放时从状态中移除
+REMOVAL_KINDS = (DELETED, ARCHIVED, MOVED_OUT)
+
+EVENT_COLUMNS = ("booking_id", "user_id", "room_id", "start_time", "end_time", "status", "hold_expires_at")
+
+# 状态中每个预约保存的字段（时间为与数据库一致的字符串）
+STATE_FIELDS = ("user_id", "room_id", "start_time", "end_time", "status", "hold_expires_at")
+TIME_FIELDS = ("start_time", "end_time", "hold_expires_at")
+
+
+def state_row(values: dict) -> list:
+    """预约字段转换为状态中的一行（时间格式与数据库中保存的字符串一致）"""
+    return [
+        values[field].isoformat(" ", "microseconds")
+        if field in TIME_FIELDS and isinstance(values[field], datetime) else values[field]
+        for field in STATE_FIELDS
+    ]
+
+
+def apply_event(state: Dict[str, list], event: dict) -> None:
+    """
+    将一条事件应用到状态上（原地修改）
+
+    Args:
+        state: {预约ID（字符串）: [user_id, room_id, start_time, end_time, status, hold_expires_at]}
+        event: 事件
+    """
+    key = str(event["booking_id"])
+    if event["kind"] in REMOVAL_KINDS:
+        state.pop(key, None)
+    else:
+        state[key] = state_row(event)
+
+
+@profile_service
+class EventService:
+    """预约事件日志服务类"""
+
+    @staticmethod
+    def record(db: Session, booking: Booking, kind: str) -> None:
+        """
+        在当前事务中追加一条事件（不提交事务，预约需已 flush）
+
+        Args:
+            db: 数据库会话
+            booking: 变更后的预约对象
+            kind: 事件类型
+        """
+        row = {column: getattr(booking, column) for column in EVENT_COLUMNS if column != "booking_id"}
+        EventService.record_rows(db, [{**row, "booking_id": booking.id}], kind)
+
+    @staticmethod
+    def record_rows(db: Session, rows: Sequence[dict], kind: str) -> None:
+        """
+        在当前事务中批量追加事件（不提交事务）
+
+        Args:
+            db: 数据库会话
+            rows: 包含 EVENT_COLUMNS 字段的预约数据
+            kind: 事件类型
+        """
+        if not rows:
+            return
+        now = make_naive(get_current_time())
+        db.execute(BookingEvent.__table__.insert(), [
+            {**{column: row.get(column) for column in EVENT_COLUMNS}, "kind": kind, "occurred_at": now}
+            for row in rows
+        ])
+
+    @staticmethod
+    def record_from_bookings(db: Session, booking_ids: Sequence[int], kind: str) -> None:
+        """
+        在当前事务中为 bookings 表中的若干预约追加事件（INSERT ... SELECT，不提交事务）
+
+        Args:
+            db: 数据库会话
+            booking_ids: 预约ID
+            kind: 事件类型
+        """
+        if not booking_ids:
+            return
+        bookings = Booking.__table__
+        events = BookingEvent.__table__
+        now = make_naive(get_current_time())
+        db.execute(events.insert().from_select(
+            list(EVENT_COLUMNS) + ["kind", "occurred_at"],
+            select(
+                bookings.c.id, bookings.c.user_id, bookings.c.room_id, bookings.c.start_time,
+                bookings.c.end_time, bookings.c.status, bookings.c.hold_expires_at,
+                literal(kind, String), literal(now, DateTime)
+            ).where(bookings.c.id.in_(booking_ids)).order_by(bookings.c.id)
+        ))
+
+    @staticmethod
+    def last_seq(db: Session) -> int:
+        """最新事件的 seq（没有事件时取最新快照的 seq）"""
+        seq = db.query(func.max(BookingEvent.seq)).scalar()
+        if seq is None:
+            seq = db.query(func.max(BookingSnapshot.seq)).scalar()
+        return seq or 0
+
+    @staticmethod
+    def read_tail(db: Session, after_seq: int, limit: int = 1000) -> List[dict]:
+        """
+        读取检查点之后的事件
+
+        Args:
+            db: 数据库会话
+            after_seq: 检查点（已处理的最后一个 seq）
+            limit: 最多返回条数
+
+        Returns:
+            按 seq 升序的事件
+
+        Raises:
+            HTTPException: 检查点之后的事件已被压缩删除时抛出（需从快照重建）
+        """
+        oldest_snapshot = db.query(func.min(BookingSnapshot.seq)).scalar() or 0
+        if after_seq < oldest_snapshot:
+            raise HTTPException(status_code=410, detail="检查点之后的事件已被压缩，请从快照重建")
+        table = BookingEvent.__table__
+        rows = db.execute(
+            table.select().where(table.c.seq > after_seq).order_by(table.c.seq).limit(limit)
+        ).mappings().all()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def latest_snapshot(db: Session) -> Tuple[int, Dict[str, list]]:
+        """
+        读取最新快照
+
+        Returns:
+            (快照 seq, 状态)
+        """
+        snapshot = db.query(BookingSnapshot).order_by(BookingSnapshot.seq.desc()).first()
+        if snapshot is None:
+            return 0, {}
+        return snapshot.seq, json.loads(gzip.decompress(snapshot.state))
+
+    @staticmethod
+    def rebuild_state(db: Session) -> Tuple[int, Dict[str, list]]:
+        """
+        由最新快照和之后的事件重建状态
+
+        Returns:
+            (状态对应的 seq, 状态)
+        """
+        seq, state = EventService.latest_snapshot(db)
+        while True:
+            events = EventService.read_tail(db, seq, settings.event_replay_batch_size)
+            for event in events:
+                apply_event(state, event)
+            if not events:
+                return seq, state
+            seq = events[-1]["seq"]
+
+    @staticmethod
+    def compact(db: Session, min_events: Optional[int] = None) -> Optional[int]:
+        """
+        生成新快照并删除上一个快照之前的事件和快照（不提交事务）
+
+        Args:
+            db: 数据库会话
+            min_events: 最新快照之后的事件少于该数量时不生成快照（默认取配置）
+
+        Returns:
+            新快照的 seq，未生成时返回 None
+        """
+        if min_events is None:
+            min_events = settings.event_snapshot_min_events
+        previous = db.query(func.max(BookingSnapshot.seq)).scalar() or 0
+        pending = db.query(func.count(BookingEvent.seq)).filter(BookingEvent.seq > previous).scalar()
+        if pending < max(min_events, 1):
+            return None
+
+        seq, state = EventService.rebuild_state(db)
+        db.add(BookingSnapshot(
+            seq=seq,
+            created_at=make_naive(get_current_time()),
+            booking_count=len(state),
+            state=gzip.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+        ))
+        db.execute(BookingEvent.__table__.delete().where(BookingEvent.seq <= previous))
+        db.execute(BookingSnapshot.__table__.delete().where(BookingSnapshot.seq < previous))
+        return seq
+
+    @staticmethod
+    def verify(db: Session) -> List[int]:
+        """
+        比较重建的状态与 bookings 表
+
+        Returns:
+            不一致的预约ID（为空表示一致）
+        """
+        _, state = EventService.rebuild_state(db)
+        actual = {
+            str(row.id): state_row(row._mapping)
+            for row in db.query(Booking.id, *(getattr(Booking, field) for field in STATE_FIELDS)).filter(
+                Booking.deleted_at.is_(None)
+            )
+        }
+        return sorted(int(key) for key in state.keys() | actual.keys() if state.get(key) != actual.get(key))
+
+
+@job_handler(COMPACT_JOB)
+def _compact_events_job(db: Session, payload: dict) -> None:
+    EventService.compact(db)
@@ -0,0 +1,319 @@
+"""
+幂等键服务层
+客户端通过 Idempotency-Key 请求头重试写请求时，直接返回首次请求的响应
+
+- 已完成的响应保存在 idempotency_keys 表（带过期时间），并缓存在进程内存中
+- 首次请求先插入一条"处理中"记录占位；主键冲突即说明有并发的重复请求，
+  重复请求等待首个请求完成后返回同一响应（跨 worker 同样有效）
+- 占位记录的 created_at 即占用时间；进程在完成前退出时，占位超过
+  idempotency_wait_seconds * STALE_CLAIM_FACTOR 后由新的请求接管
+- 业务数据记录幂等标识（record_key）并尽量与响应在同一事务中写入；接管的请求先按标识查找
+  已完成的操作，进程在提交业务数据后、保存响应前退出时不会重复执行
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import IdempotencyKey
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+MAX_KEY_LENGTH = 255
+
+# 等待并发重复请求完成时的轮询间隔（秒）
+POLL_INTERVAL = 0.05
+
+# 占位记录超过等待时长的多少倍视为占用者已退出，可被接管
+STALE_CLAIM_FACTOR = 3
+
+# 每处理多少个新幂等键清理一次过期记录
+PURGE_EVERY = 1000
+
+# (请求指纹, 状态码, 响应体, 过期时间)
+StoredResponse = Tuple[str, int, object, datetime]
+
+
+class _ResponseCache:
+    """已完成响应的进程内 LRU 缓存"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[3] <= _now():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def put(self, key: str, item: StoredResponse) -> None:
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+_cache = _ResponseCache(settings.idempotency_cache_size)
+_claims_since_purge = 0
+
+
+def _now() -> datetime:
+    return make_naive(get_current_time())
+
+
+def _replay(stored: StoredResponse) -> JSONResponse:
+    """返回保存的响应"""
+    _, status_code, body, _ = stored
+    return JSONResponse(content=body, status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+
+@profile_service
+class IdempotencyService:
+    """幂等键服务类"""
+
+    @staticmethod
+    def fingerprint(payload: dict) -> str:
+        """
+        计算请求体指纹
+
+        Args:
+            payload: 可 JSON 序列化的请求数据
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def record_key(key: str, request_hash: str) -> str:
+        """
+        业务数据中保存的幂等标识（幂等键过期后以同一键发送的不同请求不会与之混淆）
+
+        Args:
+            key: 幂等键
+            request_hash: 请求指纹
+
+        Returns:
+            标识字符串
+        """
+        return f"{request_hash}:{key}"
+
+    @staticmethod
+    def _check_fingerprint(stored: StoredResponse, request_hash: str) -> None:
+        if stored[0] != request_hash:
+            raise HTTPException(status_code=422, detail="幂等键已被用于不同的请求内容")
+
+    @staticmethod
+    def claim(db: Session, key: str, request_hash: str) -> Optional[StoredResponse]:
+        """
+        占用幂等键
+
+        Args:
+            db: 数据库会话
+            key: 幂等键
+            request_hash: 请求指纹
+
+        Returns:
+            已保存的响应；返回 None 表示占用成功，由调用方执行请求
+
+        Raises:
+            HTTPException: 幂等键对应不同请求，或重复请求等待超时
+        """
+        global _claims_since_purge
+
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key 长度必须在 1-{MAX_KEY_LENGTH} 之间")
+
+        stored = _cache.get(key)
+        if stored is not None:
+            IdempotencyService._check_fingerprint(stored, request_hash)
+            return stored
+
+        now = _now()
+        expires_at = now + timedelta(hours=settings.idempotency_ttl_hours)
+        deadline = monotonic() + settings.idempotency_wait_seconds
+        while True:
+            record = db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+            if record is not None and record.expires_at <= now:
+                # 过期记录视为不存在
+                db.delete(record)
+                db.commit()
+                record = None
+
+            if record is None:
+                db.add(IdempotencyKey(key=key, request_hash=request_hash, created_at=now, expires_at=expires_at))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # 并发的重复请求抢先占用，重新读取
+                    db.rollback()
+                    continue
+                _claims_since_purge += 1
+                if _claims_since_purge >= PURGE_EVERY:
+                    _claims_since_purge = 0
+                    IdempotencyService.purge_expired(db)
+                return None
+
+            if record.request_hash != request_hash:
+                raise HTTPException(status_code=422, detail="幂等键已被用于不同的请求内容")
+
+            if record.response_body is not None:
+                stored = (record.request_hash, record.status_code,
+                          json.loads(record.response_body), record.expires_at)
+                _cache.put(key, stored)
+                return stored
+
+            # 占用者长时间未完成（进程已退出），按旧的占用时间条件更新，仅一个请求能接管
+            stale_before = _now() - timedelta(seconds=settings.idempotency_wait_seconds * STALE_CLAIM_FACTOR)
+            if record.created_at is None or record.created_at <= stale_before:
+                taken = db.query(IdempotencyKey).filter(
+                    IdempotencyKey.key == key,
+                    IdempotencyKey.response_body.is_(None),
+                    IdempotencyKey.created_at.is_(None) if record.created_at is None
+                    else IdempotencyKey.created_at == record.created_at
+                ).update({"created_at": _now(), "expires_at": expires_at}, synchronize_session=False)
+                db.commit()
+                if taken:
+                    return None
+                continue
+
+            # 首个请求仍在处理中
+            if monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="相同幂等键的请求正在处理中，请稍后重试")
+            db.rollback()
+            sleep(POLL_INTERVAL)
+
+    @staticmethod
+    def save_response(db: Session, key: str, status_code: int, body) -> None:
+        """
+        在当前事务中写入响应（不提交事务，与业务数据一起提交）
+
+        Args:
+            db: 主库的数据库会话
+            key: 幂等键
+            status_code: 响应状态码
+            body: 可 JSON 序列化的响应体
+        """
+        db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update({
+            "status_code": status_code,
+            "response_body": json.dumps(body, ensure_ascii=False),
+        }, synchronize_session=False)
+
+    @staticmethod
+    def complete(db: Session, key: str, request_hash: str, status_code: int, body) -> None:
+        """
+        保存请求的最终响应
+
+        Args:
+            db: 数据库会话
+            key: 幂等键
+            request_hash: 请求指纹
+            status_code: 响应状态码
+            body: 可 JSON 序列化的响应体
+        """
+        record = db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+        if record is None:
+            return
+        record.status_code = status_code
+        record.response_body = json.dumps(body, ensure_ascii=False)
+        db.commit()
+        _cache.put(key, (request_hash, status_code, body, record.expires_at))
+
+    @staticmethod
+    def release(db: Session, key: str) -> None:
+        """
+        释放幂等键（请求意外失败时调用，允许客户端重试）
+
+        Args:
+            db: 数据库会话
+            key: 幂等键
+        """
+        db.rollback()
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.key == key,
+            IdempotencyKey.response_body.is_(None)
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def purge_expired(db: Session) -> int:
+        """
+        清理过期的幂等键记录
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            清理的记录数
+        """
+        count = db.query(IdempotencyKey).filter(
+            IdempotencyKey.expires_at <= _now()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return count
+
+    @staticmethod
+    def execute(
+        db: Session,
+        key: str,
+        payload: dict,
+        handler: Callable[[str], object],
+        existing: Optional[Callable[[str], Optional[object]]] = None
+    ) -> JSONResponse:
+        """
+        以幂等方式执行写请求
+
+        Args:
+            db: 数据库会话
+            key: 幂等键
+            payload: 请求数据（用于计算指纹）
+            handler: handler(请求指纹)，执行实际操作并返回可 JSON 序列化的响应体
+            existing: existing(请求指纹)，查找此前以该幂等键完成的操作并返回响应体（未找到时返回 None），
+                接管已退出进程的占位时据此返回结果，不重复执行
+
+        Returns:
+            首次执行或重放的 JSON 响应
+        """
+        request_hash = IdempotencyService.fingerprint(payload)
+        stored = IdempotencyService.claim(db, key, request_hash)
+        if stored is not None:
+            return _replay(stored)
+
+        try:
+            body = None if existing is None else existing(request_hash)
+            if body is None:
+                body = handler(request_hash)
+        except HTTPException as exc:
+            if exc.status_code >= 500:
+                IdempotencyService.release(db, key)
+                raise
+            # 业务错误（如时间冲突）同样是确定的结果，重试时原样返回
+            db.rollback()
+            IdempotencyService.complete(db, key, request_hash, exc.status_code, {"detail": exc.detail})
+            raise
+        except Exception:
+            IdempotencyService.release(db, key)
+            raise
+
+        IdempotencyService.complete(db, key, request_hash, 200, body)
+        return JSONResponse(content=body)
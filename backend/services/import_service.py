@@ -0,0 +1,622 @@
+"""
+批量导入服务层
+
+从 CSV（首行为列名）或 NDJSON（每行一个 JSON 对象）文件流式导入会议室、用户和预约，文件不会整体读入内存：
+- 逐行解析，每 import_batch_size 行为一批：先逐行校验字段，再用一次 IN 查询检查整批的唯一性（名称、用户名、邮箱），
+  通过的行在一个事务中批量写入；单行错误只跳过该行，并在结果中给出行号和原因
+- 用户可以提供已有系统导出的 bcrypt 哈希直接写入；明文密码由线程池并行计算哈希
+- 预约先完整扫描一遍文件（只保存校验后的元组），与已有预约、文件内其他预约的冲突按会议室/用户排序后扫描一次得出，
+  再分批写入；写入后在同一事务中复查，期间有其他预约写入时去掉冲突的行后重试该批。
+  分片部署时每批按会议室所在分片拆分，分别写入各分片
+"""
+
+import csv
+import io
+import json
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from time import perf_counter
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Booking, Room, RoomEquipment, User
+from schemas import BookingImportRow, RoomCreate, UserImportRow
+from services.occupancy import ACTIVE_STATUSES, hold_not_expired
+from services.room_service import normalize_tags
+from services.user_service import UserService, get_pwd_context
+from services.slot_service import SlotService
+from services.calendar_service import CalendarService, ROOM_FEED, USER_FEED
+from services.event_service import EventService, CREATED
+from services.shard_service import ShardService
+from services.usage_service import UsageService, split_minutes_by_day
+from utils.cache_bus import bump_generation, BOOKINGS, ROOMS, USERS
+from utils.timezone import make_aware, make_naive
+from utils.profiling import profile_service
+
+
+ROOMS_KIND = "rooms"
+USERS_KIND = "users"
+BOOKINGS_KIND = "bookings"
+IMPORT_KINDS = (ROOMS_KIND, USERS_KIND, BOOKINGS_KIND)
+
+CSV_FORMAT = "csv"
+NDJSON_FORMAT = "ndjson"
+FORMAT_SUFFIXES = {".csv": CSV_FORMAT, ".ndjson": NDJSON_FORMAT, ".jsonl": NDJSON_FORMAT}
+
+# CSV 中列表字段以分号分隔
+CSV_LIST_FIELDS = ("equipment",)
+CSV_LIST_SEPARATOR = ";"
+
+# (行号, 记录, 解析错误)
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    """
+    确定文件格式（显式指定优先，否则按扩展名）
+
+    Raises:
+        HTTPException: 无法确定或不支持的格式时抛出
+    """
+    if fmt is None and filename:
+        fmt = next((value for suffix, value in FORMAT_SUFFIXES.items() if filename.lower().endswith(suffix)), None)
+    if fmt not in (CSV_FORMAT, NDJSON_FORMAT):
+        raise HTTPException(status_code=400, detail="不支持的文件格式，请使用 csv 或 ndjson")
+    return fmt
+
+
+def iter_records(stream: BinaryIO, fmt: str) -> Iterator[Record]:
+    """
+    逐行解析文件（CSV 中的空值视为未填写）
+
+    Args:
+        stream: 二进制文件流（UTF-8，可带 BOM）
+        fmt: csv / ndjson
+
+    Yields:
+        (行号, 记录, 解析错误)，解析失败时记录为 None
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == CSV_FORMAT:
+            reader = csv.DictReader(text)
+            for row in reader:
+                record = {}
+                for key, value in row.items():
+                    if key is None:
+                        continue
+                    value = (value or "").strip()
+                    if value:
+                        record[key.strip()] = (
+                            value.split(CSV_LIST_SEPARATOR) if key.strip() in CSV_LIST_FIELDS else value
+                        )
+                yield reader.line_num, record, None
+        else:
+            for line, raw in enumerate(text, start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    record = json.loads(raw)
+                except ValueError as exc:
+                    yield line, None, f"JSON 格式错误: {exc}"
+                    continue
+                if not isinstance(record, dict):
+                    yield line, None, "每行必须是一个 JSON 对象"
+                    continue
+                yield line, record, None
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="文件必须是 UTF-8 编码")
+    finally:
+        # 关闭文件由调用方负责
+        text.detach()
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """按固定大小分批"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or '记录'}: {error['msg']}" for error in exc.errors()
+    )
+
+
+class _Report:
+    """导入结果统计（错误只保留前 max_errors 条）"""
+
+    def __init__(self, kind: str, fmt: str, dry_run: bool):
+        self.kind = kind
+        self.format = fmt
+        self.dry_run = dry_run
+        self.processed = 0
+        self.valid = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.started = perf_counter()
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < settings.import_max_errors:
+            self.errors.append({"line": line, "message": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "format": self.format,
+            "dry_run": self.dry_run,
+            "processed": self.processed,
+            "valid": self.valid,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "elapsed_ms": round((perf_counter() - self.started) * 1000, 1),
+        }
+
+
+def _validate(chunk: Sequence[Record], model, report: _Report) -> List[tuple]:
+    """逐行校验字段，返回 [(行号, 模型对象)]"""
+    valid = []
+    for line, record, error in chunk:
+        if error is not None:
+            report.error(line, error)
+            continue
+        try:
+            valid.append((line, model.model_validate(record)))
+        except ValidationError as exc:
+            report.error(line, _validation_message(exc))
+    return valid
+
+
+def _room_key(booking: BookingImportRow) -> tuple:
+    return ("id", booking.room_id) if booking.room_id is not None else ("name", booking.room)
+
+
+def _user_key(booking: BookingImportRow) -> tuple:
+    return ("id", booking.user_id) if booking.user_id is not None else ("name", booking.username)
+
+
+def _overlap_owners() -> Tuple[str, ...]:
+    """需要检查重叠的分组（同一用户的重叠可通过 BOOKING_PREVENT_USER_OVERLAP 关闭）"""
+    return ("room_id", "user_id") if settings.prevent_user_overlap else ("room_id",)
+
+
+@dataclass
+class _BookingRow:
+    line: int
+    room_id: int
+    user_id: int
+    start_time: datetime
+    end_time: datetime
+    purpose: Optional[str]
+    status: str
+
+
+def _existing_conflicts(rows: Sequence[_BookingRow], existing: Sequence[tuple], owner: str) -> Dict[int, str]:
+    """
+    与已有预约重叠的行（按会议室或用户分组，组内按开始时间排序并计算结束时间的前缀最大值，每行一次二分查找）
+
+    Args:
+        rows: 待导入的预约
+        existing: 已有预约 (room_id, user_id, start_time, end_time)
+        owner: room_id / user_id
+
+    Returns:
+        {行下标: 原因}
+    """
+    position = 0 if owner == "room_id" else 1
+    grouped = defaultdict(list)
+    for row in existing:
+        grouped[row[position]].append((row[2], row[3]))
+    index = {}
+    for key, intervals in grouped.items():
+        intervals.sort()
+        index[key] = ([start for start, _ in intervals], list(accumulate((end for _, end in intervals), max)))
+
+    reason = "与已有预约冲突" if owner == "room_id" else "该用户在此时间段已有其他预约"
+    conflicts = {}
+    for i, row in enumerate(rows):
+        entry = index.get(getattr(row, owner))
+        if entry is None:
+            continue
+        starts, max_ends = entry
+        # 开始时间早于本行结束时间的已有预约中，最晚的结束时间晚于本行开始时间即为重叠
+        k = bisect_left(starts, row.end_time)
+        if k and max_ends[k - 1] > row.start_time:
+            conflicts[i] = reason
+    return conflicts
+
+
+def _file_conflicts(rows: Sequence[_BookingRow], owner: str) -> Dict[int, str]:
+    """
+    文件内互相重叠的行（排序后扫描一次，开始时间较早的一方保留）
+
+    Returns:
+        {行下标: 原因}
+    """
+    conflicts = {}
+    last_owner, last_end, last_line = None, None, None
+    for i in sorted(range(len(rows)), key=lambda i: (getattr(rows[i], owner), rows[i].start_time, rows[i].line)):
+        row = rows[i]
+        key = getattr(row, owner)
+        if key == last_owner and row.start_time < last_end:
+            conflicts[i] = f"与第 {last_line} 行的预约时间重叠"
+            continue
+        if key != last_owner or row.end_time > last_end:
+            last_owner, last_end, last_line = key, row.end_time, row.line
+    return conflicts
+
+
+def _active_bookings(db: Session, start_time: datetime, end_time: datetime, exclude_ids=()) -> List[tuple]:
+    """时间范围内各分片的占用 (room_id, user_id, start_time, end_time)"""
+    parts = ShardService.fan_out(db, lambda shard_db: shard_db.query(
+        Booking.id, Booking.room_id, Booking.user_id, Booking.start_time, Booking.end_time
+    ).filter(
+        Booking.deleted_at.is_(None),
+        Booking.status.in_(ACTIVE_STATUSES),
+        Booking.start_time < end_time,
+        Booking.end_time > start_time,
+        hold_not_expired()
+    ).all())
+    excluded = set(exclude_ids)
+    return [row[1:] for rows in parts for row in rows if row[0] not in excluded]
+
+
+@profile_service
+class ImportService:
+    """批量导入服务类"""
+
+    @staticmethod
+    def import_file(
+        db: Session,
+        kind: str,
+        stream: BinaryIO,
+        fmt: str,
+        dry_run: bool = False,
+        progress: Optional[Callable[[dict], None]] = None
+    ) -> dict:
+        """
+        流式导入文件
+
+        Args:
+            db: 数据库会话
+            kind: rooms / users / bookings
+            stream: 二进制文件流
+            fmt: csv / ndjson
+            dry_run: 只校验，不写入
+            progress: 每批处理完成后的回调，参数为当前统计
+
+        Returns:
+            导入结果统计
+
+        Raises:
+            HTTPException: 导入类型或格式不支持、文件编码错误时抛出
+        """
+        if kind not in IMPORT_KINDS:
+            raise HTTPException(status_code=400, detail="不支持的导入类型，请使用 rooms、users 或 bookings")
+        report = _Report(kind, detect_format(None, fmt), dry_run)
+        chunks = chunked(iter_records(stream, fmt), max(settings.import_batch_size, 1))
+
+        def notify():
+            if progress is not None:
+                progress(report.as_dict())
+
+        if kind == ROOMS_KIND:
+            seen = set()
+            for chunk in chunks:
+                ImportService._import_rooms(db, chunk, report, seen, dry_run)
+                notify()
+        elif kind == USERS_KIND:
+            seen_usernames, seen_emails = set(), set()
+            with ThreadPoolExecutor(max(settings.import_hash_workers, 1)) as executor:
+                for chunk in chunks:
+                    ImportService._import_users(db, chunk, report, seen_usernames, seen_emails, dry_run, executor)
+                    notify()
+        else:
+            rows = ImportService._validate_bookings(db, chunks, report, notify)
+            if not dry_run:
+                room_shards = ShardService.shards_of_rooms(db, {row.room_id for row in rows})
+                for batch in chunked(rows, max(settings.import_batch_size, 1)):
+                    by_shard = defaultdict(list)
+                    for row in batch:
+                        by_shard[room_shards[row.room_id]].append(row)
+                    for name in sorted(by_shard):
+                        ImportService._insert_bookings(db.shard(name), by_shard[name], report)
+                    notify()
+        return report.as_dict()
+
+    @staticmethod
+    def _import_rooms(db: Session, chunk: Sequence[Record], report: _Report, seen: set, dry_run: bool) -> None:
+        """校验并写入一批会议室"""
+        report.processed += len(chunk)
+        candidates = []
+        for line, room in _validate(chunk, RoomCreate, report):
+            if room.capacity <= 0:
+                report.error(line, "容量必须是正整数")
+            elif room.name in seen:
+                report.error(line, "文件中会议室名称重复")
+            else:
+                seen.add(room.name)
+                candidates.append((line, room))
+
+        for attempt in range(2):
+            existing = {
+                name for (name,) in db.query(Room.name).filter(
+                    Room.name.in_([room.name for _, room in candidates]), Room.deleted_at.is_(None)
+                )
+            } if candidates else set()
+            valid = []
+            for line, room in candidates:
+                if room.name in existing:
+                    report.error(line, "会议室名称已存在")
+                else:
+                    valid.append((line, room))
+            if dry_run or not valid:
+                report.valid += len(valid)
+                return
+
+            try:
+                ids = db.scalars(insert(Room).returning(Room.id, sort_by_parameter_order=True), [
+                    {
+                        "name": room.name,
+                        "location": room.location,
+                        "capacity": room.capacity,
+                        "description": room.description,
+                        "building": room.building,
+                        "floor": room.floor,
+                    }
+                    for _, room in valid
+                ]).all()
+                equipment = [
+                    {"room_id": room_id, "tag": tag}
+                    for room_id, (_, room) in zip(ids, valid) for tag in normalize_tags(room.equipment)
+                ]
+                if equipment:
+                    db.execute(insert(RoomEquipment), equipment)
+                bump_generation(db, ROOMS)
+                db.commit()
+            except IntegrityError:
+                # 校验之后有其他请求创建了同名会议室：重新检查后重试一次
+                db.rollback()
+                if attempt:
+                    raise HTTPException(status_code=409, detail="导入期间会议室数据持续变化，请重试")
+                candidates = valid
+                continue
+            report.valid += len(valid)
+            report.imported += len(valid)
+            return
+
+    @staticmethod
+    def _import_users(
+        db: Session,
+        chunk: Sequence[Record],
+        report: _Report,
+        seen_usernames: set,
+        seen_emails: set,
+        dry_run: bool,
+        executor: ThreadPoolExecutor
+    ) -> None:
+        """校验并写入一批用户（唯一性检查通过后才计算密码哈希）"""
+        report.processed += len(chunk)
+        candidates = []
+        for line, user in _validate(chunk, UserImportRow, report):
+            email = str(user.email)
+            if bool(user.password) == bool(user.hashed_password):
+                report.error(line, "password 与 hashed_password 必须且只能提供一个")
+            elif user.hashed_password and get_pwd_context().identify(user.hashed_password) is None:
+                report.error(line, "hashed_password 不是 bcrypt 哈希")
+            elif user.username in seen_usernames:
+                report.error(line, "文件中用户名重复")
+            elif email in seen_emails:
+                report.error(line, "文件中邮箱重复")
+            else:
+                seen_usernames.add(user.username)
+                seen_emails.add(email)
+                candidates.append((line, user))
+
+        hashes = {}
+        for attempt in range(2):
+            existing_usernames, existing_emails = set(), set()
+            if candidates:
+                for username, email in db.query(User.username, User.email).filter(
+                    User.deleted_at.is_(None),
+                    User.username.in_([user.username for _, user in candidates])
+                    | User.email.in_([str(user.email) for _, user in candidates])
+                ):
+                    existing_usernames.add(username)
+                    existing_emails.add(email)
+            valid = []
+            for line, user in candidates:
+                if user.username in existing_usernames:
+                    report.error(line, "用户名已存在")
+                elif str(user.email) in existing_emails:
+                    report.error(line, "邮箱已被注册")
+                else:
+                    valid.append((line, user))
+            if dry_run or not valid:
+                report.valid += len(valid)
+                return
+
+            plain = [(line, user.password) for line, user in valid if not user.hashed_password and line not in hashes]
+            hashed = executor.map(UserService.hash_password, [password for _, password in plain])
+            hashes.update(zip([line for line, _ in plain], hashed))
+            try:
+                db.execute(insert(User), [
+                    {
+                        "username": user.username,
+                        "email": str(user.email),
+                        "phone": user.phone,
+                        "hashed_password": user.hashed_password or hashes[line],
+                    }
+                    for line, user in valid
+                ])
+                bump_generation(db, USERS)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                if attempt:
+                    raise HTTPException(status_code=409, detail="导入期间用户数据持续变化，请重试")
+                candidates = valid
+                continue
+            report.valid += len(valid)
+            report.imported += len(valid)
+            return
+
+    @staticmethod
+    def _validate_bookings(
+        db: Session,
+        chunks: Iterable[Sequence[Record]],
+        report: _Report,
+        notify: Callable[[], None]
+    ) -> List[_BookingRow]:
+        """
+        扫描整个文件：逐批校验字段并解析会议室、用户引用，然后排除与已有预约或文件内其他预约重叠的行
+
+        Returns:
+            可写入的预约（按行号排序）
+        """
+        max_duration = timedelta(hours=settings.max_booking_hours)
+        room_ids: Dict[object, Optional[int]] = {}
+        user_ids: Dict[object, Optional[int]] = {}
+        rows: List[_BookingRow] = []
+
+        for chunk in chunks:
+            report.processed += len(chunk)
+            valid = _validate(chunk, BookingImportRow, report)
+
+            # 一次查询解析本批中尚未解析过的会议室、用户引用
+            new_rooms = {_room_key(booking) for _, booking in valid} - room_ids.keys()
+            new_users = {_user_key(booking) for _, booking in valid} - user_ids.keys()
+            if new_rooms:
+                room_ids.update(dict.fromkeys(new_rooms))
+                for room_id, name in db.query(Room.id, Room.name).filter(
+                    Room.deleted_at.is_(None),
+                    Room.is_available.is_(True),
+                    Room.id.in_([value for key, value in new_rooms if key == "id"])
+                    | Room.name.in_([value for key, value in new_rooms if key == "name"])
+                ):
+                    room_ids[("id", room_id)] = room_id
+                    room_ids[("name", name)] = room_id
+            if new_users:
+                user_ids.update(dict.fromkeys(new_users))
+                for user_id, username in db.query(User.id, User.username).filter(
+                    User.deleted_at.is_(None),
+                    User.is_active.is_(True),
+                    User.id.in_([value for key, value in new_users if key == "id"])
+                    | User.username.in_([value for key, value in new_users if key == "name"])
+                ):
+                    user_ids[("id", user_id)] = user_id
+                    user_ids[("name", username)] = user_id
+
+            for line, booking in valid:
+                room_id = room_ids.get(_room_key(booking))
+                user_id = user_ids.get(_user_key(booking))
+                start_time = make_naive(make_aware(booking.start_time))
+                end_time = make_naive(make_aware(booking.end_time))
+                if booking.room_id is None and not booking.room:
+                    report.error(line, "room_id 与 room 至少提供一个")
+                elif booking.user_id is None and not booking.username:
+                    report.error(line, "user_id 与 username 至少提供一个")
+                elif room_id is None:
+                    report.error(line, "会议室不存在或不可用")
+                elif user_id is None:
+                    report.error(line, "用户不存在或已停用")
+                elif start_time >= end_time:
+                    report.error(line, "开始时间必须早于结束时间")
+                elif end_time - start_time > max_duration:
+                    report.error(line, f"单次预约不能超过 {settings.max_booking_hours:g} 小时")
+                else:
+                    rows.append(_BookingRow(
+                        line, room_id, user_id, start_time, end_time, booking.purpose, booking.status
+                    ))
+            notify()
+
+        active = [row for row in rows if row.status in ACTIVE_STATUSES]
+        if active:
+            existing = _active_bookings(
+                db, min(row.start_time for row in active), max(row.end_time for row in active)
+            )
+            for owner in _overlap_owners():
+                conflicts = _existing_conflicts(active, existing, owner)
+                remaining = [row for i, row in enumerate(active) if i not in conflicts]
+                file_conflicts = _file_conflicts(remaining, owner)
+                for i, reason in conflicts.items():
+                    report.error(active[i].line, reason)
+                for i, reason in file_conflicts.items():
+                    report.error(remaining[i].line, reason)
+                active = [row for i, row in enumerate(remaining) if i not in file_conflicts]
+
+        accepted = {row.line for row in active}
+        rows = [row for row in rows if row.status not in ACTIVE_STATUSES or row.line in accepted]
+        report.valid += len(rows)
+        return rows
+
+    @staticmethod
+    def _insert_bookings(db: Session, batch: List[_BookingRow], report: _Report) -> None:
+        """在一个事务中写入一批预约（同一分片的会议室），写入后复查冲突"""
+        while batch:
+            rows = [
+                {
+                    "user_id": row.user_id,
+                    "room_id": row.room_id,
+                    "start_time": row.start_time,
+                    "end_time": row.end_time,
+                    "purpose": row.purpose,
+                    "status": row.status,
+                }
+                for row in batch
+            ]
+            ids = db.scalars(insert(Booking).returning(Booking.id, sort_by_parameter_order=True), rows).all()
+
+            # 写入后事务持有写锁，读到的已是最终状态；扫描期间有其他预约写入时去掉冲突的行后重试
+            active = [row for row in batch if row.status in ACTIVE_STATUSES]
+            conflicts = {}
+            if active:
+                existing = _active_bookings(
+                    db, min(row.start_time for row in active), max(row.end_time for row in active), ids
+                )
+                for owner in _overlap_owners():
+                    conflicts.update(
+                        (active[i].line, reason) for i, reason in _existing_conflicts(active, existing, owner).items()
+                    )
+            if conflicts:
+                db.rollback()
+                for line, reason in conflicts.items():
+                    report.error(line, reason)
+                report.valid -= len(conflicts)
+                batch = [row for row in batch if row.line not in conflicts]
+                continue
+
+            # 已取消的预约不占用时段，只需记录事件
+            days_by_room = defaultdict(set)
+            for row in active:
+                days_by_room[row.room_id].update(
+                    day for day, _ in split_minutes_by_day(row.start_time, row.end_time)
+                )
+            UsageService.schedule_refresh_rooms(db, days_by_room)
+            SlotService.refresh_rooms(db, days_by_room)
+            CalendarService.touch_many(db, ROOM_FEED, days_by_room)
+            CalendarService.touch_many(db, USER_FEED, {row.user_id for row in active})
+            EventService.record_rows(
+                db, [{**row, "booking_id": booking_id} for row, booking_id in zip(rows, ids)], CREATED
+            )
+            bump_generation(db, BOOKINGS)
+            db.commit()
+            report.imported += len(batch)
+            return
@@ -0,0 +1,381 @@
+"""
+后台任务服务层
+
+任务保存在 jobs 表中，由业务代码在自身事务内入队：业务数据提交时任务随之提交，回滚则一并消失。
+各 worker 中的 JobRunner 线程领取到期任务并执行，语义为"至少一次"：
+执行中进程退出时，租约（locked_until）过期后任务会被重新领取，因此处理函数必须是幂等的。
+处理函数与删除任务在同一事务中提交，只改动数据库的任务实际只生效一次。
+分片部署时任务随业务数据写入所在分片的 jobs 表，每个分片由各自的 JobRunner 执行
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Job
+from utils.metrics import JOBS_PROCESSED, JOB_DURATION_SECONDS, JOB_START_DELAY_SECONDS
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+logger = logging.getLogger("booking.jobs")
+
+# 任务类型 -> 处理函数 handler(db, payload)，处理函数不提交事务
+HANDLERS: Dict[str, Callable[[Session, dict], None]] = {}
+
+# 本进程有任务提交时唤醒 JobRunner，无需等待下一次轮询
+_wakeup = threading.Event()
+
+
+def job_handler(kind: str):
+    """
+    注册任务处理函数
+
+    Args:
+        kind: 任务类型
+    """
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session):
+    if session.info.pop("jobs_enqueued", False):
+        _wakeup.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+_CLAIM_SQL = text(
+    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+    "locked_until = :locked_until, dedupe_key = NULL "
+    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_at <= :now ORDER BY run_at LIMIT 1) "
+    "RETURNING id, kind, payload, attempts, max_attempts, run_at"
+)
+
+
+@profile_service
+class JobService:
+    """后台任务服务类"""
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        kind: str,
+        payload: Optional[dict] = None,
+        delay_seconds: float = 0,
+        dedupe_key: Optional[str] = None,
+        max_attempts: Optional[int] = None
+    ) -> None:
+        """
+        在当前事务中加入后台任务（不提交事务，随调用方一起提交）
+
+        Args:
+            db: 数据库会话
+            kind: 任务类型（需已通过 job_handler 注册）
+            payload: 任务参数（可 JSON 序列化）
+            delay_seconds: 延迟执行的秒数
+            dedupe_key: 去重键，已有相同键的任务在排队时本次入队被忽略
+            max_attempts: 最多执行次数（默认取配置）
+        """
+        JobService.enqueue_many(db, kind, [(payload, dedupe_key)], delay_seconds, max_attempts)
+
+    @staticmethod
+    def enqueue_many(
+        db: Session,
+        kind: str,
+        items: Sequence[Tuple[Optional[dict], Optional[str]]],
+        delay_seconds: float = 0,
+        max_attempts: Optional[int] = None
+    ) -> None:
+        """
+        在当前事务中批量加入同一类型的后台任务（一条 executemany 语句，不提交事务）
+
+        Args:
+            db: 数据库会话
+            kind: 任务类型（需已通过 job_handler 注册）
+            items: (任务参数, 去重键)
+            delay_seconds: 延迟执行的秒数
+            max_attempts: 最多执行次数（默认取配置）
+        """
+        if not items:
+            return
+        now = make_naive(get_current_time())
+        common = {
+            "kind": kind,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts or settings.job_max_attempts,
+            "run_at": now + timedelta(seconds=delay_seconds),
+            "created_at": now,
+        }
+        db.execute(sqlite_insert(Job.__table__).prefix_with("OR IGNORE"), [
+            {**common, "payload": json.dumps(payload or {}, ensure_ascii=False), "dedupe_key": dedupe_key}
+            for payload, dedupe_key in items
+        ])
+        db.info["jobs_enqueued"] = True
+
+    @staticmethod
+    def claim(db: Session, lease_seconds: float) -> Optional[dict]:
+        """
+        领取一个到期任务并提交（多个 worker 并发领取时由 SQLite 写锁保证互斥）
+
+        Args:
+            db: 数据库会话
+            lease_seconds: 租约时长，超时未完成的任务会被重新领取
+
+        Returns:
+            任务信息，没有到期任务时返回 None
+        """
+        now = make_naive(get_current_time())
+        # 先用只读查询判断，空闲轮询不获取写锁
+        due = db.execute(
+            text("SELECT 1 FROM jobs WHERE status = 'queued' AND run_at <= :now LIMIT 1"),
+            {"now": now}
+        ).first()
+        if due is None:
+            db.rollback()
+            return None
+
+        row = db.execute(_CLAIM_SQL, {
+            "now": now,
+            "locked_until": now + timedelta(seconds=lease_seconds),
+        }).mappings().first()
+        db.commit()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        if isinstance(job["run_at"], str):
+            job["run_at"] = datetime.fromisoformat(job["run_at"])
+        return job
+
+    @staticmethod
+    def complete(db: Session, job_id: int) -> None:
+        """删除已完成的任务（不提交事务）"""
+        db.execute(Job.__table__.delete().where(Job.id == job_id))
+
+    @staticmethod
+    def fail(db: Session, job: dict, error: str) -> bool:
+        """
+        记录任务失败并提交；未达到最大次数时按指数退避重新排队
+
+        Args:
+            db: 数据库会话
+            job: claim 返回的任务信息
+            error: 错误描述
+
+        Returns:
+            是否会重试
+        """
+        retry = job["attempts"] < job["max_attempts"]
+        values = {"last_error": error[:2000], "locked_until": None}
+        if retry:
+            delay = settings.job_retry_base_seconds * 2 ** (job["attempts"] - 1)
+            values.update(status="queued", run_at=make_naive(get_current_time()) + timedelta(seconds=delay))
+        else:
+            values.update(status="failed")
+        db.execute(Job.__table__.update().where(Job.id == job["id"]).values(**values))
+        db.commit()
+        return retry
+
+    @staticmethod
+    def recover_expired(db: Session) -> int:
+        """
+        将租约已过期的任务（执行中进程退出）重新排队并提交
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            重新排队的任务数
+        """
+        result = db.execute(
+            text("UPDATE jobs SET status = 'queued', locked_until = NULL "
+                 "WHERE status = 'running' AND locked_until < :now"),
+            {"now": make_naive(get_current_time())}
+        )
+        db.commit()
+        return result.rowcount
+
+
+class JobRunner:
+    """进程内后台任务执行器（若干守护线程轮询 jobs 表）"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int,
+        poll_interval: float,
+        lease_seconds: float,
+        periodic: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            session_factory: 创建数据库会话的函数
+            workers: 线程数
+            poll_interval: 空闲时的轮询间隔（秒）
+            lease_seconds: 任务租约时长（秒）
+            periodic: 周期任务 {任务类型: 间隔秒数}，每次执行完成或最终失败后重新排入下一次
+        """
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.periodic = periodic or {}
+        self._stopping = threading.Event()
+        self._threads = []
+        self._recover_lock = threading.Lock()
+        self._last_recover = 0.0
+
+    def start(self) -> None:
+        """排入周期任务并启动线程"""
+        db = self.session_factory()
+        try:
+            # 各 worker 重复排入时按 dedupe_key 合并
+            for kind in self.periodic:
+                JobService.enqueue(db, kind, dedupe_key=kind)
+            db.commit()
+        finally:
+            db.close()
+
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-runner-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10) -> None:
+        """停止线程（等待正在执行的任务完成）"""
+        self._stopping.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_pending(self) -> int:
+        """
+        在当前线程中执行全部到期任务
+
+        Returns:
+            执行的任务数
+        """
+        count = 0
+        while not self._stopping.is_set() and self.run_one():
+            count += 1
+        return count
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._maybe_recover()
+                self.run_pending()
+            except Exception:
+                logger.exception("后台任务轮询失败")
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
+
+    def _maybe_recover(self) -> None:
+        """每个租约周期检查一次过期租约"""
+        with self._recover_lock:
+            if perf_counter() - self._last_recover < self.lease_seconds / 2:
+                return
+            self._last_recover = perf_counter()
+        db = self.session_factory()
+        try:
+            count = JobService.recover_expired(db)
+            if count:
+                logger.warning("重新排队 %d 个租约过期的后台任务", count)
+        finally:
+            db.close()
+
+    def run_one(self) -> bool:
+        """
+        领取并执行一个任务
+
+        Returns:
+            是否执行了任务
+        """
+        db = self.session_factory()
+        try:
+            job = JobService.claim(db, self.lease_seconds)
+            if job is None:
+                return False
+
+            kind = job["kind"]
+            delay = (make_naive(get_current_time()) - job["run_at"]).total_seconds()
+            JOB_START_DELAY_SECONDS.observe(max(delay, 0.0), kind=kind)
+            start = perf_counter()
+            try:
+                handler = HANDLERS.get(kind)
+                if handler is None:
+                    raise LookupError(f"未注册的任务类型: {kind}")
+                handler(db, job["payload"])
+                JobService.complete(db, job["id"])
+                if kind in self.periodic:
+                    JobService.enqueue(db, kind, delay_seconds=self.periodic[kind], dedupe_key=kind)
+                db.commit()
+                JOBS_PROCESSED.inc(kind=kind, result="done")
+            except Exception as exc:
+                db.rollback()
+                retry = JobService.fail(db, job, f"{type(exc).__name__}: {exc}")
+                if not retry and kind in self.periodic:
+                    # 周期任务放弃本次后仍排入下一次，否则要等进程重启才会恢复
+                    JobService.enqueue(db, kind, delay_seconds=self.periodic[kind], dedupe_key=kind)
+                    db.commit()
+                JOBS_PROCESSED.inc(kind=kind, result="retry" if retry else "failed")
+                logger.exception("后台任务 %s#%d 第 %d 次执行失败", kind, job["id"], job["attempts"])
+            finally:
+                JOB_DURATION_SECONDS.observe(perf_counter() - start, kind=kind)
+            return True
+        finally:
+            db.close()
+
+
+def create_job_runner(workers: int, session_factory: Optional[Callable[[], Session]] = None) -> JobRunner:
+    """
+    按配置创建任务执行器（导入各服务模块以注册处理函数）
+
+    Args:
+        workers: 线程数
+        session_factory: 任务所在数据库的会话工厂（默认为主库；分片部署时每个分片一个执行器）
+
+    Returns:
+        任务执行器（未启动）
+    """
+    from database import SessionLocal
+    from services.booking_service import EXPIRE_PENDING_JOB
+    from services.event_service import COMPACT_JOB
+    from services.purge_service import PURGE_JOB
+    import services.notification_service  # noqa: F401
+    import services.usage_service  # noqa: F401
+
+    session_factory = session_factory or SessionLocal
+    periodic = {
+        EXPIRE_PENDING_JOB: settings.pending_expire_interval_seconds,
+        COMPACT_JOB: settings.event_compact_interval_seconds,
+    }
+    if session_factory is SessionLocal:
+        # 墓碑清理从主库遍历各分片，只在主库的执行器中排入
+        periodic[PURGE_JOB] = settings.purge_interval_seconds
+
+    return JobRunner(
+        session_factory,
+        workers=workers,
+        poll_interval=settings.job_poll_interval_ms / 1000,
+        lease_seconds=settings.job_lease_seconds,
+        periodic=periodic
+    )
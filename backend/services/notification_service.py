@@ -0,0 +1,102 @@
+"""
+邮件通知服务层
+通知在业务事务中排入后台任务，由 JobRunner 通过 SMTP 发送，不占用请求耗时
+"""
+
+import smtplib
+from email.message import EmailMessage
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Booking, User
+from services.job_service import JobService, job_handler
+from utils.profiling import profile_service
+
+
+BOOKING_CONFIRMATION_JOB = "email.booking_confirmation"
+WELCOME_JOB = "email.welcome"
+
+# Message-ID 按业务对象生成：任务重试导致重复发送时，收件端可据此去重
+MESSAGE_ID_DOMAIN = "booking.local"
+
+
+def send_email(to: str, subject: str, body: str, message_id: str) -> None:
+    """
+    通过配置的 SMTP 服务器发送纯文本邮件
+
+    Args:
+        to: 收件人
+        subject: 主题
+        body: 正文
+        message_id: 邮件 Message-ID
+    """
+    message = EmailMessage()
+    message["From"] = settings.mail_from
+    message["To"] = to
+    message["Subject"] = subject
+    message["Message-ID"] = f"<{message_id}@{MESSAGE_ID_DOMAIN}>"
+    message.set_content(body)
+    with smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout_seconds) as smtp:
+        smtp.send_message(message)
+
+
+@profile_service
+class NotificationService:
+    """邮件通知服务类"""
+
+    @staticmethod
+    def enqueue_booking_confirmation(db: Session, booking: Booking) -> None:
+        """
+        在当前事务中排入预约确认邮件（未开启通知时忽略）
+
+        Args:
+            db: 数据库会话
+            booking: 已 flush 的预约对象
+        """
+        if settings.notifications_enabled:
+            JobService.enqueue(db, BOOKING_CONFIRMATION_JOB, {"booking_id": booking.id})
+
+    @staticmethod
+    def enqueue_welcome(db: Session, user: User) -> None:
+        """
+        在当前事务中排入注册欢迎邮件（未开启通知时忽略）
+
+        Args:
+            db: 数据库会话
+            user: 已 flush 的用户对象
+        """
+        if settings.notifications_enabled:
+            JobService.enqueue(db, WELCOME_JOB, {"user_id": user.id})
+
+
+@job_handler(BOOKING_CONFIRMATION_JOB)
+def _send_booking_confirmation(db: Session, payload: dict) -> None:
+    booking = db.query(Booking).filter(Booking.id == payload["booking_id"]).first()
+    # 发送前预约已被取消或删除时不再通知
+    if booking is None or booking.deleted_at is not None or booking.status == "cancelled":
+        return
+    start_time = booking.start_time.strftime("%Y-%m-%d %H:%M")
+    end_time = booking.end_time.strftime("%H:%M")
+    send_email(
+        booking.user.email,
+        f"预约确认：{booking.room.name} {start_time}",
+        f"{booking.user.username}，您好：\n\n"
+        f"您已成功预约 {booking.room.name}（{booking.room.location}），"
+        f"时间 {start_time} - {end_time}（UTC）。\n"
+        f"用途：{booking.purpose or '未填写'}\n",
+        f"booking-{booking.id}-confirmation"
+    )
+
+
+@job_handler(WELCOME_JOB)
+def _send_welcome(db: Session, payload: dict) -> None:
+    user = db.query(User).filter(User.id == payload["user_id"], User.deleted_at.is_(None)).first()
+    if user is None:
+        return
+    send_email(
+        user.email,
+        "欢迎使用会议室预约系统",
+        f"{user.username}，您好：\n\n您的账号已创建，现在可以预约会议室了。\n",
+        f"user-{user.id}-welcome"
+    )
@@ -0,0 +1,18 @@
+"""
+预约占用规则
+哪些预约占用会议室时间段，供预约、批量分配和时段位图共用
+"""
+
+from sqlalchemy import or_
+
+from models import Booking
+from utils.timezone import make_naive, get_current_time
+
+
+# 占用时间段的预约状态（pending 仅在临时保留未过期时占用）
+ACTIVE_STATUSES = ("pending", "confirmed")
+
+
+def hold_not_expired(model=Booking):
+    """已过期的临时保留不再占用时间段（即使清理任务尚未将其取消）"""
+    return or_(model.hold_expires_at.is_(None), model.hold_expires_at > make_naive(get_current_time()))
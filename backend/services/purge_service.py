@@ -0,0 +1,165 @@
+"""
+墓碑清理服务层
+分批物理删除软删除超过保留期的预约、会议室和用户（周期后台任务，也可由 manage.py purge 手动执行）
+"""
+
+from datetime import timedelta
+from time import sleep
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import GLOBAL_TABLES, HOME_SHARD
+from models import Booking, BookingArchive, Room, RoomEquipment, RoomUsageDaily, User
+from services.job_service import job_handler
+from services.shard_service import ShardService
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+# 周期清理墓碑的后台任务（从主库遍历各分片，只由主库的执行器排入）
+PURGE_JOB = "purge.tombstones"
+
+
+@profile_service
+class PurgeService:
+    """墓碑清理服务类"""
+
+    @staticmethod
+    def purge_tombstones(
+        db: Session,
+        older_than_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None
+    ) -> Dict[str, int]:
+        """
+        物理删除软删除超过指定天数的记录
+
+        先清理预约，再清理不再被任何预约（含归档预约）引用的会议室和用户；
+        仍被引用的会议室和用户保留墓碑，等引用的预约清理后再删除。
+        每批在独立的短事务中完成，通过墓碑部分索引定位，不扫描在线数据。
+        分片部署时逐个分片清理预约，会议室和用户还需不被任何分片中的预约引用
+
+        Args:
+            db: 数据库会话（主库）
+            older_than_days: 保留天数
+            batch_size: 每批条数
+            pause_seconds: 批次间隔
+
+        Returns:
+            {"bookings": 数量, "rooms": 数量, "users": 数量}
+        """
+        if older_than_days is None:
+            older_than_days = settings.purge_after_days
+        if batch_size is None:
+            batch_size = settings.purge_batch_size
+        if pause_seconds is None:
+            pause_seconds = settings.purge_batch_pause_ms / 1000
+
+        cutoff = make_naive(get_current_time()) - timedelta(days=older_than_days)
+
+        def referenced_by(column, model):
+            # 未删除与已删除的预约分开判断，分别命中各自的部分索引
+            return (
+                exists().where(getattr(Booking, column) == model.id, Booking.deleted_at.is_(None))
+                | exists().where(getattr(Booking, column) == model.id, Booking.deleted_at.isnot(None))
+                | exists().where(getattr(BookingArchive, column) == model.id)
+            )
+
+        other_shards = [name for name in ShardService.names() if name != HOME_SHARD]
+
+        def referenced_in_shards(column):
+            # 被其他分片中的预约引用的ID（会议室和用户只在主库，主库的引用由上面的条件排除）
+            def check(ids):
+                if not other_shards:
+                    return set()
+                return {
+                    owner_id for found in ShardService.fan_out(db, lambda shard_db: [
+                        owner_id for model in (Booking, BookingArchive)
+                        for (owner_id,) in shard_db.query(getattr(model, column)).filter(
+                            getattr(model, column).in_(ids)
+                        ).distinct()
+                    ], other_shards) for owner_id in found
+                }
+            return check
+
+        counts = {}
+        counts["bookings"] = sum(
+            PurgeService._purge(db.shard(name), Booking, (), batch_size, pause_seconds, cutoff)
+            for name in ShardService.names()
+        )
+        counts["rooms"] = PurgeService._purge(
+            db, Room, (~referenced_by("room_id", Room),), batch_size, pause_seconds, cutoff,
+            dependents=(RoomEquipment.room_id, RoomUsageDaily.room_id),
+            referenced_elsewhere=referenced_in_shards("room_id")
+        )
+        counts["users"] = PurgeService._purge(
+            db, User, (~referenced_by("user_id", User),), batch_size, pause_seconds, cutoff,
+            referenced_elsewhere=referenced_in_shards("user_id")
+        )
+        return counts
+
+    @staticmethod
+    def _purge(
+        db: Session,
+        model,
+        conditions,
+        batch_size,
+        pause_seconds,
+        cutoff,
+        dependents=(),
+        referenced_elsewhere: Optional[Callable[[List[int]], Set[int]]] = None
+    ) -> int:
+        """
+        分批删除单个表的墓碑行（连同各分片依赖表中的行）
+
+        referenced_elsewhere(ids) 返回仍被其他分片引用、需要保留的ID，这些ID在本次清理中不再选取
+        """
+        conditions = list(conditions)
+        if not model.__table__.kwargs.get("sqlite_autoincrement"):
+            # 表未使用 AUTOINCREMENT，始终保留 id 最大的一行，避免 id 被复用
+            max_id = db.query(model.id).order_by(model.id.desc()).limit(1).scalar()
+            if max_id is None:
+                return 0
+            conditions.append(model.id < max_id)
+
+        total = 0
+        kept: Set[int] = set()
+        while True:
+            selected = [
+                row[0] for row in db.query(model.id).filter(
+                    model.deleted_at.isnot(None),
+                    model.deleted_at < cutoff,
+                    *conditions,
+                    *((model.id.notin_(kept),) if kept else ())
+                ).order_by(model.deleted_at).limit(batch_size)
+            ]
+            if not selected:
+                break
+
+            ids = selected
+            if referenced_elsewhere is not None:
+                kept |= referenced_elsewhere(selected)
+                ids = [owner_id for owner_id in selected if owner_id not in kept]
+            # 全局表的依赖行只在主库，其余依赖表（每日汇总）在各分片中都可能有
+            sessions = [db] if not dependents else [db.shard(name) for name in ShardService.names()]
+            for column in dependents:
+                for shard_db in (sessions[:1] if column.table.name in GLOBAL_TABLES else sessions):
+                    shard_db.execute(column.table.delete().where(column.in_(ids)))
+            db.execute(model.__table__.delete().where(model.id.in_(ids)))
+            for shard_db in sessions:
+                shard_db.commit()
+
+            total += len(ids)
+            if len(selected) < batch_size:
+                break
+            if pause_seconds:
+                sleep(pause_seconds)
+        return total
+
+
+@job_handler(PURGE_JOB)
+def _purge_tombstones_job(db: Session, payload: dict) -> None:
+    PurgeService.purge_tombstones(db)
@@ -0,0 +1,252 @@
+"""
+会议室分面筛选服务层
+
+每个 worker 在内存中维护会议室属性的位图索引（Python 整数作为位集），
+筛选为位图按位与，分面计数为位图与结果集按位与后计数；
+索引在会议室数据变更后（cache_generations 版本号变化）自动重建
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Room, RoomEquipment
+from services.room_service import normalize_tags
+from utils.cache_bus import GenerationCache, ROOMS
+from utils.pagination import clamp_limit
+from utils.profiling import profile_service
+
+
+# 容量分面区间（下限, 上限, 标签），上限为 None 表示不限
+CAPACITY_RANGES = (
+    (1, 4, "1-4"),
+    (5, 10, "5-10"),
+    (11, 20, "11-20"),
+    (21, None, "21+"),
+)
+
+_index_cache = GenerationCache(ROOMS, max_entries=1)
+
+
+def _add_bit(bitmaps: Dict, key, bit: int) -> None:
+    bitmaps[key] = bitmaps.get(key, 0) | bit
+
+
+def _facet_counts(bitmaps: Dict, base: int) -> List[dict]:
+    """计算各取值在结果集中的数量（忽略数量为 0 的取值）"""
+    counts = []
+    for value, bitmap in sorted(bitmaps.items()):
+        count = (bitmap & base).bit_count()
+        if count:
+            counts.append({"value": str(value), "count": count})
+    return counts
+
+
+class RoomFacetIndex:
+    """会议室属性位图索引（第 i 位对应 room_ids[i]）"""
+
+    def __init__(self, rooms: Sequence[Tuple], equipment: Iterable[Tuple[int, str]]):
+        """
+        Args:
+            rooms: 按 id 排序的 (id, building, floor, capacity, is_available)
+            equipment: (room_id, tag)
+        """
+        self.room_ids = [room[0] for room in rooms]
+        self.all = (1 << len(self.room_ids)) - 1
+        self.buildings: Dict[str, int] = {}
+        self.floors: Dict[int, int] = {}
+        self.equipment: Dict[str, int] = {}
+        self.available = 0
+        # 会议室ID -> 对应的位
+        self.positions: Dict[int, int] = {}
+
+        positions = self.positions
+        capacities: Dict[int, int] = {}
+        for position, (room_id, building, floor, capacity, is_available) in enumerate(rooms):
+            bit = 1 << position
+            positions[room_id] = bit
+            if building:
+                _add_bit(self.buildings, building, bit)
+            if floor is not None:
+                _add_bit(self.floors, floor, bit)
+            _add_bit(capacities, capacity, bit)
+            if is_available:
+                self.available |= bit
+        for room_id, tag in equipment:
+            bit = positions.get(room_id)
+            if bit is not None:
+                _add_bit(self.equipment, tag, bit)
+
+        # 容量从大到小累积："容量 >= 阈值" 只需一次二分查找
+        self._capacities = sorted(capacities)
+        self._capacity_at_least = [0] * len(self._capacities)
+        cumulative = 0
+        for i in range(len(self._capacities) - 1, -1, -1):
+            cumulative |= capacities[self._capacities[i]]
+            self._capacity_at_least[i] = cumulative
+
+    def capacity_at_least(self, minimum: int) -> int:
+        """容量不小于 minimum 的会议室位图"""
+        i = bisect_left(self._capacities, minimum)
+        return self._capacity_at_least[i] if i < len(self._capacities) else 0
+
+    def capacity_between(self, minimum: Optional[int], maximum: Optional[int]) -> int:
+        """容量在 [minimum, maximum] 区间内的会议室位图"""
+        bitmap = self.all if minimum is None else self.capacity_at_least(minimum)
+        if maximum is not None:
+            bitmap &= ~self.capacity_at_least(maximum + 1)
+        return bitmap
+
+    def match(
+        self,
+        building: Optional[str] = None,
+        floor: Optional[int] = None,
+        equipment: Sequence[str] = (),
+        min_capacity: Optional[int] = None,
+        max_capacity: Optional[int] = None,
+        available: Optional[bool] = None,
+        ignore: Optional[str] = None
+    ) -> int:
+        """
+        计算满足条件的会议室位图
+
+        Args:
+            building: 楼栋
+            floor: 楼层
+            equipment: 必须具备的设备标签（全部满足）
+            min_capacity: 最小容量
+            max_capacity: 最大容量
+            available: 是否可用
+            ignore: 计算分面计数时忽略的条件（building / floor）
+
+        Returns:
+            位图
+        """
+        bitmap = self.all
+        if building is not None and ignore != "building":
+            bitmap &= self.buildings.get(building, 0)
+        if floor is not None and ignore != "floor":
+            bitmap &= self.floors.get(floor, 0)
+        for tag in equipment:
+            bitmap &= self.equipment.get(tag, 0)
+        if min_capacity is not None or max_capacity is not None:
+            bitmap &= self.capacity_between(min_capacity, max_capacity)
+        if available is not None:
+            bitmap &= self.available if available else ~self.available
+        return bitmap
+
+    def ids(self, bitmap: int) -> List[int]:
+        """位图对应的会议室 ID（按 ID 升序）"""
+        ids = []
+        while bitmap:
+            lowest = bitmap & -bitmap
+            ids.append(self.room_ids[lowest.bit_length() - 1])
+            bitmap ^= lowest
+        return ids
+
+    def facets(self, **filters) -> dict:
+        """
+        计算分面计数
+
+        楼栋、楼层为单选条件，其计数忽略自身条件（便于切换取值）；
+        设备和容量区间的计数基于当前筛选结果
+
+        Returns:
+            {"total": 结果数, "buildings": [...], "floors": [...], "equipment": [...], "capacity": [...]}
+        """
+        result = self.match(**filters)
+        capacity_counts = []
+        for minimum, maximum, label in CAPACITY_RANGES:
+            count = (result & self.capacity_between(minimum, maximum)).bit_count()
+            if count:
+                capacity_counts.append({"value": label, "count": count})
+        return {
+            "total": result.bit_count(),
+            "buildings": _facet_counts(self.buildings, self.match(**filters, ignore="building")),
+            "floors": _facet_counts(self.floors, self.match(**filters, ignore="floor")),
+            "equipment": _facet_counts(self.equipment, result),
+            "capacity": capacity_counts,
+        }
+
+
+@profile_service
+class RoomFacetService:
+    """会议室分面筛选服务类"""
+
+    @staticmethod
+    def get_index(db: Session) -> RoomFacetIndex:
+        """
+        获取当前 worker 的位图索引（会议室变更后自动重建）
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            位图索引
+        """
+        def build():
+            rooms = db.query(
+                Room.id, Room.building, Room.floor, Room.capacity, Room.is_available
+            ).filter(Room.deleted_at.is_(None)).order_by(Room.id).all()
+            equipment = db.query(RoomEquipment.room_id, RoomEquipment.tag).all()
+            return RoomFacetIndex(rooms, equipment)
+
+        return _index_cache.get_or_load("index", build)
+
+    @staticmethod
+    def normalize_filters(filters: dict) -> dict:
+        """规范化筛选条件中的设备标签"""
+        return {**filters, "equipment": normalize_tags(filters.get("equipment") or [])}
+
+    @staticmethod
+    def filter_rooms(db: Session, filters: dict, skip: int = 0, limit: int = 100) -> List[Room]:
+        """
+        按属性筛选会议室
+
+        Args:
+            db: 数据库会话
+            filters: 筛选条件（见 RoomFacetIndex.match）
+            skip: 跳过数量
+            limit: 限制数量
+
+        Returns:
+            会议室列表（按 ID 升序）
+        """
+        index = RoomFacetService.get_index(db)
+        ids = index.ids(index.match(**RoomFacetService.normalize_filters(filters)))
+        return RoomFacetService.rooms_page(db, ids, skip, limit)
+
+    @staticmethod
+    def rooms_page(db: Session, ids: List[int], skip: int = 0, limit: int = 100) -> List[Room]:
+        """
+        按 ID 列表分页读取会议室
+
+        Args:
+            db: 数据库会话
+            ids: 按 ID 升序的会议室 ID
+            skip: 跳过数量
+            limit: 限制数量
+
+        Returns:
+            会议室列表（按 ID 升序）
+        """
+        page = ids[skip:skip + clamp_limit(limit)]
+        if not page:
+            return []
+        return db.query(Room).filter(Room.id.in_(page)).order_by(Room.id).all()
+
+    @staticmethod
+    def get_facets(db: Session, filters: dict) -> dict:
+        """
+        获取分面计数
+
+        Args:
+            db: 数据库会话
+            filters: 筛选条件
+
+        Returns:
+            分面计数
+        """
+        index = RoomFacetService.get_index(db)
+        return index.facets(**RoomFacetService.normalize_filters(filters))
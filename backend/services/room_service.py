@@ -6,10 +6,29 @@ from typing import List
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
-from models import Room
+from models import Room, RoomEquipment
 from schemas import RoomCreate
+from services.shard_service import ShardService
+from utils.profiling import profile_service
+from utils.pagination import clamp_limit
+from utils.cache_bus import bump_generation, ROOMS
+from utils.timezone import make_naive, get_current_time
 
 
+def normalize_tags(tags: List[str]) -> List[str]:
+    """
+    规范化设备标签（去除空白、转小写、去重并排序）
+
+    Args:
+        tags: 原始标签列表
+
+    Returns:
+        规范化后的标签列表
+    """
+    return sorted({tag.strip().lower() for tag in tags if tag and tag.strip()})
+
+
+@profile_service
 class RoomService:
     """会议室服务类"""
     
@@ -26,7 +45,7 @@ class RoomService:
         Returns:
             是否存在
         """
-        query = db.query(Room).filter(Room.name == name)
+        query = db.query(Room).filter(Room.name == name, Room.deleted_at.is_(None))
         if exclude_id:
             query = query.filter(Room.id != exclude_id)
         return query.first() is not None
@@ -53,10 +72,14 @@ class RoomService:
             name=room.name,
             location=room.location,
             capacity=room.capacity,
-            description=room.description
+            description=room.description,
+            building=room.building,
+            floor=room.floor,
+            equipment_items=[RoomEquipment(tag=tag) for tag in normalize_tags(room.equipment)]
         )
         
         db.add(db_room)
+        bump_generation(db, ROOMS)
         db.commit()
         db.refresh(db_room)
         
@@ -77,7 +100,7 @@ class RoomService:
         Raises:
             HTTPException: 会议室不存在时抛出
         """
-        room = db.query(Room).filter(Room.id == room_id).first()
+        room = db.query(Room).filter(Room.id == room_id, Room.deleted_at.is_(None)).first()
         if not room:
             raise HTTPException(status_code=404, detail="会议室不存在")
         return room
@@ -95,7 +118,7 @@ class RoomService:
         Returns:
             会议室列表
         """
-        return db.query(Room).offset(skip).limit(limit).all()
+        return db.query(Room).filter(Room.deleted_at.is_(None)).offset(skip).limit(clamp_limit(limit)).all()
     
     @staticmethod
     def update_room(db: Session, room_id: int, room: RoomCreate) -> Room:
@@ -111,7 +134,7 @@ class RoomService:
             更新后的会议室对象
             
         Raises:
-            HTTPException: 会议室不存在或名称冲突时抛出
+            HTTPException: 会议室不存在、名称冲突，或有预约的会议室改到其他分片的地点时抛出
         """
         db_room = RoomService.get_room_by_id(db, room_id)
         
@@ -120,11 +143,33 @@ class RoomService:
             if RoomService.check_room_name_exists(db, room.name, room_id):
                 raise HTTPException(status_code=400, detail="会议室名称已存在")
         
+        # 预约数据只能由 manage.py rebalance-shards 离线迁移，在线修改只允许分片不变或没有预约的会议室
+        if (
+            ShardService.shard_for_location(room.location) != ShardService.shard_for_location(db_room.location)
+            and ShardService.room_has_bookings(db, room_id)
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="会议室已有预约，不能改到属于其他分片的地点"
+            )
+        
         db_room.name = room.name
         db_room.location = room.location
         db_room.capacity = room.capacity
         db_room.description = room.description
+        db_room.building = room.building
+        db_room.floor = room.floor
+        
+        # 只增删有变化的设备标签
+        tags = set(normalize_tags(room.equipment))
+        for item in list(db_room.equipment_items):
+            if item.tag not in tags:
+                db_room.equipment_items.remove(item)
+        existing = {item.tag for item in db_room.equipment_items}
+        for tag in sorted(tags - existing):
+            db_room.equipment_items.append(RoomEquipment(tag=tag))
         
+        bump_generation(db, ROOMS)
         db.commit()
         db.refresh(db_room)
         
@@ -133,7 +178,9 @@ class RoomService:
     @staticmethod
     def delete_room(db: Session, room_id: int) -> dict:
         """
-        删除会议室
+        删除会议室（软删除，只写入墓碑时间，由清理任务稍后物理删除）
+        
+        尚未开始的有效预约同时取消，不再出现在预约列表的有效预约中
         
         Args:
             db: 数据库会话
@@ -142,8 +189,13 @@ class RoomService:
         Returns:
             操作结果消息
         """
+        # 预约服务间接依赖本模块（room_facet_service 使用 normalize_tags）
+        from services.booking_service import BookingService
+        
         room = RoomService.get_room_by_id(db, room_id)
-        db.delete(room)
+        room.deleted_at = make_naive(get_current_time())
+        BookingService.cancel_future_bookings(db, room_id=room_id)
+        bump_generation(db, ROOMS)
         db.commit()
         return {"message": "会议室已删除"}
 
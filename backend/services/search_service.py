@@ -0,0 +1,169 @@
+"""
+搜索服务层
+基于 search_index（FTS5 trigram 索引）搜索用户、会议室和预约用途
+"""
+
+import heapq
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import HOME_SHARD
+from services.shard_service import ShardService
+from utils.pagination import clamp_limit, check_merge_offset
+from utils.profiling import profile_service
+
+
+# search_index 的 rowid = 源记录 id * 4 + 类型编号（见 migrations/v0002_search_index.py）
+KIND_CODES = {"user": 1, "room": 2, "booking": 3}
+KIND_NAMES = {code: name for name, code in KIND_CODES.items()}
+
+# trigram 分词下，短于 3 个字符的词无法走索引，改用 LIKE 过滤
+MIN_MATCH_LENGTH = 3
+MAX_TERMS = 8
+
+# 标题（名称 / 用户名 / 预约用途）的权重高于正文
+RANK_EXPRESSION = "bm25(search_index, 10.0, 1.0)"
+
+
+def _quote_match_term(term: str) -> str:
+    """将搜索词转为 FTS5 短语（避免特殊字符被解析为查询语法）"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_pattern(term: str) -> str:
+    """将搜索词转为 LIKE 子串匹配模式"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def parse_query(q: str) -> Tuple[List[str], List[str]]:
+    """
+    拆分搜索词
+
+    Args:
+        q: 搜索字符串（空白分隔的多个词为"且"关系）
+
+    Returns:
+        (可使用全文索引的词, 需要 LIKE 过滤的短词)
+    """
+    terms = q.split()[:MAX_TERMS]
+    match_terms = [term for term in terms if len(term) >= MIN_MATCH_LENGTH]
+    like_terms = [term for term in terms if len(term) < MIN_MATCH_LENGTH]
+    return match_terms, like_terms
+
+
+@profile_service
+class SearchService:
+    """搜索服务类"""
+
+    @staticmethod
+    def search(
+        db: Session,
+        q: str,
+        kind: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20
+    ) -> Tuple[List[dict], bool]:
+        """
+        全文搜索
+
+        包含不少于 3 个字符的词时按相关度（bm25）排序，某一类型的命中行超过 BOOKING_SEARCH_CANDIDATE_LIMIT 时
+        只在该类型最新的候选中排序；只有短词时按子串匹配，结果按最新优先。
+        分片部署时各分片的索引分别查询后合并，相关度按各自索引的统计计算
+
+        Args:
+            db: 数据库会话
+            q: 搜索字符串
+            kind: 结果类型（user / room / booking），None 表示全部
+            skip: 跳过数量
+            limit: 限制数量
+
+        Returns:
+            (结果列表, 是否还有更多结果)
+
+        Raises:
+            HTTPException: 搜索词为空，或多个分片合并时跳过数量超过 BOOKING_MAX_RESULT_ROWS 时抛出
+        """
+        match_terms, like_terms = parse_query(q)
+        if not match_terms and not like_terms:
+            raise HTTPException(status_code=400, detail="搜索词不能为空")
+
+        limit = clamp_limit(limit)
+        conditions = []
+        params = {}
+        if match_terms:
+            conditions.append("search_index MATCH :match")
+            params["match"] = " AND ".join(_quote_match_term(term) for term in match_terms)
+        for i, term in enumerate(like_terms):
+            conditions.append(f"(title LIKE :like{i} ESCAPE '\\' OR body LIKE :like{i} ESCAPE '\\')")
+            params[f"like{i}"] = _like_pattern(term)
+        if kind is not None:
+            conditions.append("rowid % 4 = :kind")
+            params["kind"] = KIND_CODES[kind]
+        where = " AND ".join(conditions)
+
+        # 用户和会议室只在主库的索引中；多个分片时各分片取前 skip + limit + 1 条后按同一顺序合并
+        names = [HOME_SHARD] if kind in ("user", "room") else ShardService.names()
+        if len(names) > 1:
+            check_merge_offset(skip)
+            page = {"limit": skip + limit + 1, "skip": 0}
+        else:
+            page = {"limit": limit + 1, "skip": skip}
+
+        def search_shard(shard_db: Session) -> list:
+            shard_params = dict(params)
+            if not match_terms:
+                return shard_db.execute(text(
+                    f"SELECT rowid, title, body, NULL AS score FROM search_index "
+                    f"WHERE {where} ORDER BY rowid DESC LIMIT :limit OFFSET :skip"
+                ), {**shard_params, **page}).all()
+
+            # 命中行很多时只对最新的 N 个候选计算相关度（rowid 范围条件由 FTS5 直接处理）。
+            # 候选数按类型分别限制：用户和会议室的 rowid 较小，与预约一起取最新的 N 个时会被大量预约挤掉
+            if kind is not None:
+                codes = [KIND_CODES[kind]]
+            elif shard_db.shard_name == HOME_SHARD:
+                codes = sorted(KIND_NAMES)
+            else:
+                codes = [KIND_CODES["booking"]]
+            selects = []
+            for code in codes:
+                kind_where = where if kind is not None else f"{where} AND rowid % 4 = {code}"
+                floor = shard_db.execute(text(
+                    f"SELECT rowid FROM search_index WHERE {kind_where} "
+                    f"ORDER BY rowid DESC LIMIT 1 OFFSET :offset"
+                ), {**shard_params, "offset": settings.search_candidate_limit - 1}).scalar()
+                if floor is not None:
+                    kind_where += f" AND rowid >= :floor{code}"
+                    shard_params[f"floor{code}"] = floor
+                selects.append(
+                    f"SELECT rowid, title, body, {RANK_EXPRESSION} AS score FROM search_index WHERE {kind_where}"
+                )
+            return shard_db.execute(text(
+                f"SELECT rowid, title, body, score FROM ({' UNION ALL '.join(selects)}) "
+                f"ORDER BY score LIMIT :limit OFFSET :skip"
+            ), {**shard_params, **page}).all()
+
+        parts = ShardService.fan_out(db, search_shard, names)
+        if len(parts) == 1:
+            rows = parts[0]
+        elif match_terms:
+            rows = list(heapq.merge(*parts, key=lambda row: row[3]))[skip:]
+        else:
+            rows = list(heapq.merge(*parts, key=lambda row: row[0], reverse=True))[skip:]
+
+        results = [
+            {
+                "type": KIND_NAMES[rowid % 4],
+                "id": rowid // 4,
+                "title": title,
+                "subtitle": body or None,
+                "score": None if score is None else -score,
+            }
+            for rowid, title, body, score in rows[:limit]
+        ]
+        return results, len(rows) > limit
@@ -0,0 +1,432 @@
+"""
+分片路由服务层
+
+按会议室地点分片（BOOKING_SHARD_LOCATIONS）：每个分片是一个独立的 SQLite 文件，保存所辖地点会议室的预约
+及其派生数据（归档、事件日志、时段位图、每日汇总、日历版本号、后台任务），不同分片的写事务互不阻塞；
+用户、会议室等全局数据只保存在主库，分片连接附加主库并通过临时视图读取（见 database.py）。
+
+- 写路径按 room_id 路由到会议室所在分片，会议室的冲突检查在单个分片内完成，与不分片时一致
+- 按预约ID的操作由ID定位分片：编号为 k 的分片从 k * 2^40 开始分配预约ID
+- 不限定会议室的读路径（列表、用户日程、报表、搜索等）在线程池中并发查询各分片后合并
+- 同一用户在不同分片的预约之间的重叠检查读取的是其他分片已提交的数据，无法与写入原子完成
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import HOME_SHARD, SessionLocal, shard_path, shard_sessionmakers
+from migrations import SchemaVersionError, check_schema_version
+from models import Booking, BookingArchive, Room, Shard
+from services.event_service import MOVED_IN, MOVED_OUT
+from utils.cache_bus import GenerationCache, BOOKINGS, ROOMS, SLOTS
+from utils.timezone import make_naive, get_current_time
+from utils.profiling import profile_service
+
+
+# 分片内预约ID的起点为 分片编号 << SHARD_ID_BITS（2^40 个ID / 分片，最大ID仍在 JavaScript 安全整数范围内）
+SHARD_ID_BITS = 40
+
+# 迁移会议室时随之移动的表 (表名, 条件)
+ROOM_TABLES = (
+    ("bookings", "room_id = :room_id"),
+    ("bookings_archive", "room_id = :room_id"),
+    ("room_slot_bitmaps", "room_id = :room_id"),
+    ("room_usage_daily", "room_id = :room_id"),
+    ("calendar_versions", "scope = 'room' AND owner_id = :room_id"),
+)
+
+_EVENT_SQL = (
+    "INSERT INTO {schema}.booking_events "
+    "(booking_id, kind, user_id, room_id, start_time, end_time, status, hold_expires_at, occurred_at) "
+    "SELECT id, :kind, user_id, room_id, start_time, end_time, status, hold_expires_at, :now "
+    "FROM {schema}.bookings WHERE room_id = :room_id AND deleted_at IS NULL ORDER BY id"
+)
+
+_BUMP_SQL = (
+    "INSERT INTO {schema}.cache_generations (namespace, generation) "
+    "VALUES (:namespace, (SELECT COALESCE(MAX(generation), 0) + 1 FROM {schema}.cache_generations)) "
+    "ON CONFLICT(namespace) DO UPDATE SET generation = excluded.generation"
+)
+
+T = TypeVar("T")
+
+
+def _location_map() -> Dict[str, str]:
+    """{地点: 分片名}（配置错误时在启动时报错）"""
+    locations = {}
+    for name, shard_locations in settings.shard_locations.items():
+        if name == HOME_SHARD:
+            raise ValueError(f"分片名不能为 {HOME_SHARD}（主库保留名称）")
+        for location in shard_locations:
+            owner = locations.setdefault(location.strip(), name)
+            if owner != name:
+                raise ValueError(f"地点 {location} 同时配置在分片 {owner} 和 {name} 中")
+    return locations
+
+
+_location_shards = _location_map()
+
+# {会议室ID: 分片名}（会议室数据变更后失效）
+_room_shards = GenerationCache(ROOMS, max_entries=10000)
+
+# {分片编号: 分片名}（分片只由 manage.py migrate 创建，进程内只需读取一次）
+_shard_names_by_index: Optional[Dict[int, str]] = None
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max(settings.shard_fanout_workers, 1), thread_name_prefix="shard-fanout"
+            )
+        return _executor
+
+
+@profile_service
+class ShardService:
+    """分片路由服务类"""
+
+    @staticmethod
+    def enabled() -> bool:
+        """是否配置了分片"""
+        return len(shard_sessionmakers) > 1
+
+    @staticmethod
+    def names() -> List[str]:
+        """全部分片名（主库在前）"""
+        return list(shard_sessionmakers)
+
+    @staticmethod
+    def require(name: str) -> str:
+        """
+        校验分片名（管理接口参数）
+
+        Raises:
+            HTTPException: 分片未配置时抛出
+        """
+        if name not in shard_sessionmakers:
+            raise HTTPException(status_code=404, detail="分片不存在")
+        return name
+
+    @staticmethod
+    def shard_for_location(location: Optional[str]) -> str:
+        """地点所属的分片（未配置的地点属于主库）"""
+        return _location_shards.get((location or "").strip(), HOME_SHARD)
+
+    @staticmethod
+    def shard_of_room(db: Session, room_id: int) -> str:
+        """
+        会议室所在的分片（含已删除的会议室；会议室不存在时为主库）
+
+        Args:
+            db: 数据库会话
+            room_id: 会议室ID
+
+        Returns:
+            分片名
+        """
+        if not ShardService.enabled():
+            return HOME_SHARD
+        return _room_shards.get_or_load(room_id, lambda: ShardService.shard_for_location(
+            db.query(Room.location).filter(Room.id == room_id).scalar()
+        ))
+
+    @staticmethod
+    def shards_of_rooms(db: Session, room_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        批量查询会议室所在的分片（一次查询）
+
+        Args:
+            db: 数据库会话
+            room_ids: 会议室ID
+
+        Returns:
+            {会议室ID: 分片名}
+        """
+        room_ids = set(room_ids)
+        if not ShardService.enabled():
+            return dict.fromkeys(room_ids, HOME_SHARD)
+        shards = dict.fromkeys(room_ids, HOME_SHARD)
+        if room_ids:
+            for room_id, location in db.query(Room.id, Room.location).filter(Room.id.in_(room_ids)):
+                shards[room_id] = ShardService.shard_for_location(location)
+        return shards
+
+    @staticmethod
+    def room_session(db: Session, room_id: int) -> Session:
+        """会议室所在分片的会话"""
+        return db.shard(ShardService.shard_of_room(db, room_id))
+
+    @staticmethod
+    def shard_of_booking(db: Session, booking_id: int) -> str:
+        """
+        按ID范围判断预约所属的分片（不查询预约表）
+
+        Args:
+            db: 数据库会话
+            booking_id: 预约ID
+
+        Returns:
+            分片名（编号未登记或未配置时为主库）
+        """
+        global _shard_names_by_index
+        if not ShardService.enabled():
+            return HOME_SHARD
+        if _shard_names_by_index is None:
+            _shard_names_by_index = {
+                index: name for name, index in db.shard(HOME_SHARD).query(Shard.name, Shard.shard_index)
+                if name in shard_sessionmakers
+            }
+        return _shard_names_by_index.get(booking_id >> SHARD_ID_BITS, HOME_SHARD)
+
+    @staticmethod
+    def booking_session(db: Session, booking_id: int, model=Booking) -> Session:
+        """
+        预约所在分片的会话
+
+        先按ID范围定位；预约随会议室迁移过分片时不在范围对应的分片中，再并发查询其余分片
+
+        Args:
+            db: 数据库会话
+            booking_id: 预约ID
+            model: Booking 或 BookingArchive
+
+        Returns:
+            数据库会话（预约不存在时为范围对应分片的会话）
+        """
+        name = ShardService.shard_of_booking(db, booking_id)
+        session = db.shard(name)
+        if not ShardService.enabled() or session.query(model.id).filter(model.id == booking_id).first():
+            return session
+        others = [other for other in ShardService.names() if other != name]
+        found = ShardService.fan_out(
+            db, lambda shard_db: shard_db.query(model.id).filter(model.id == booking_id).first() is not None, others
+        )
+        for other, hit in zip(others, found):
+            if hit:
+                return db.shard(other)
+        return session
+
+    @staticmethod
+    def fan_out(db: Session, fn: Callable[[Session], T], names: Optional[Sequence[str]] = None) -> List[T]:
+        """
+        在各分片上并发执行 fn，按分片顺序返回结果
+
+        每个分片使用各自的会话，同一会话同一时刻只在一个线程中使用；只有一个分片时在当前线程中执行。
+        任一分片抛出异常时，等其余分片执行完后重新抛出。fn 中不能再次调用 fan_out
+
+        Args:
+            db: 数据库会话
+            fn: fn(分片会话) -> 结果
+            names: 分片名（默认全部分片）
+
+        Returns:
+            各分片的结果
+        """
+        sessions = [db.shard(name) for name in (ShardService.names() if names is None else names)]
+        if len(sessions) <= 1:
+            return [fn(session) for session in sessions]
+        executor = _get_executor()
+        # 复制上下文，SQL 计时和剖析记录计入当前请求
+        futures = [executor.submit(copy_context().run, fn, session) for session in sessions]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def room_has_bookings(db: Session, room_id: int) -> bool:
+        """会议室在其所在分片中是否有预约（含已删除和已归档的预约）"""
+        shard_db = ShardService.room_session(db, room_id)
+        return any(
+            shard_db.query(model.id).filter(model.room_id == room_id).first() is not None
+            for model in (Booking, BookingArchive)
+        )
+
+    @staticmethod
+    def check_schema(expected: int) -> None:
+        """
+        校验全部分片库已创建且结构版本一致（worker 启动时调用）
+
+        Raises:
+            SchemaVersionError: 分片未创建或版本不一致时抛出
+        """
+        for name in ShardService.names():
+            if name != HOME_SHARD and not os.path.exists(shard_path(name)):
+                raise SchemaVersionError(f"分片 {name} 的数据库不存在，请先运行 `python manage.py migrate`")
+            check_schema_version(shard_path(name), expected)
+        if ShardService.enabled():
+            db = SessionLocal()
+            try:
+                registered = {name for (name,) in db.query(Shard.name)}
+            finally:
+                db.close()
+            missing = set(ShardService.names()) - registered
+            if missing:
+                raise SchemaVersionError(
+                    f"分片 {', '.join(sorted(missing))} 尚未登记，请先运行 `python manage.py migrate`"
+                )
+
+    @staticmethod
+    def create_shards(log: Callable[[str], None] = print) -> Dict[str, int]:
+        """
+        创建并迁移配置中的分片库，登记分片编号并设置预约ID起点（由 manage.py migrate 调用，可重复执行）
+
+        Args:
+            log: 日志输出函数
+
+        Returns:
+            {分片名: 结构版本}
+        """
+        from migrations import migrate
+
+        versions = {}
+        db = SessionLocal()
+        try:
+            indexes = dict(db.query(Shard.name, Shard.shard_index))
+            for name in ShardService.names():
+                if name == HOME_SHARD:
+                    continue
+                os.makedirs(settings.shard_dir, exist_ok=True)
+                versions[name] = migrate(shard_path(name), lambda message: log(f"[{name}] {message}"))
+                if name not in indexes:
+                    # 编号只增不减，移出配置的分片仍保留编号，新分片的预约ID不会与其重复
+                    indexes[name] = max(indexes.values(), default=0) + 1
+                    db.add(Shard(name=name, shard_index=indexes[name], created_at=make_naive(get_current_time())))
+                    db.commit()
+                shard_db = db.shard(name)
+                shard_db.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT 'bookings', 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'bookings')"
+                ))
+                shard_db.execute(
+                    text("UPDATE sqlite_sequence SET seq = MAX(seq, :base) WHERE name = 'bookings'"),
+                    {"base": indexes[name] << SHARD_ID_BITS}
+                )
+                shard_db.commit()
+        finally:
+            db.close()
+        return versions
+
+    @staticmethod
+    def misplaced_rooms(db: Session) -> Dict[int, tuple]:
+        """
+        数据所在分片与地点配置不一致的会议室（修改分片配置或会议室地点之后）
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            {会议室ID: (当前分片, 目标分片)}
+        """
+        union = " UNION ".join(
+            f"SELECT {'owner_id' if table == 'calendar_versions' else 'room_id'} FROM {table}"
+            + (" WHERE scope = 'room'" if table == "calendar_versions" else "")
+            for table, _ in ROOM_TABLES
+        )
+        present = ShardService.fan_out(db, lambda shard_db: [row[0] for row in shard_db.execute(text(union))])
+        targets = ShardService.shards_of_rooms(db, {room_id for room_ids in present for room_id in room_ids})
+        return {
+            room_id: (name, targets[room_id])
+            for name, room_ids in zip(ShardService.names(), present)
+            for room_id in room_ids if targets[room_id] != name
+        }
+
+    @staticmethod
+    def move_room(room_id: int, source: str, target: str) -> int:
+        """
+        将会议室的预约及派生数据从一个分片移动到另一个分片（一个跨库事务，原子完成）
+
+        源分片记录 moved_out 事件、目标分片记录 moved_in 事件，两边的事件日志重放后仍与预约表一致；
+        预约保留原ID（之后按ID访问时由 booking_session 回退查找），目标分片的ID起点不变
+
+        Args:
+            room_id: 会议室ID
+            source: 当前分片
+            target: 目标分片
+
+        Returns:
+            移动的预约数量
+        """
+        from services.usage_service import REFRESH_JOB
+
+        conn = sqlite3.connect(shard_path(target), isolation_level=None, timeout=30)
+        try:
+            conn.execute("ATTACH DATABASE ? AS source", (shard_path(source),))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = make_naive(get_current_time()).isoformat(" ", "microseconds")
+                params = {"room_id": room_id, "now": now}
+                moved = conn.execute(
+                    "SELECT count(*) FROM source.bookings WHERE room_id = :room_id", params
+                ).fetchone()[0]
+                sequence = conn.execute("SELECT seq FROM main.sqlite_sequence WHERE name = 'bookings'").fetchone()
+
+                conn.execute(_EVENT_SQL.format(schema="source"), {**params, "kind": MOVED_OUT})
+                for table, condition in ROOM_TABLES:
+                    columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO main.{table} ({columns}) "
+                        f"SELECT {columns} FROM source.{table} WHERE {condition}", params
+                    )
+                    conn.execute(f"DELETE FROM source.{table} WHERE {condition}", params)
+                # 尚未执行的每日汇总任务随会议室移动
+                job_condition = (
+                    "kind = :kind AND status = 'queued' AND json_extract(payload, '$.room_id') = :room_id"
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO main.jobs "
+                    "(kind, payload, status, attempts, max_attempts, run_at, dedupe_key, created_at) "
+                    "SELECT kind, payload, status, attempts, max_attempts, run_at, dedupe_key, created_at "
+                    f"FROM source.jobs WHERE {job_condition}", {**params, "kind": REFRESH_JOB}
+                )
+                conn.execute(f"DELETE FROM source.jobs WHERE {job_condition}", {**params, "kind": REFRESH_JOB})
+                conn.execute(_EVENT_SQL.format(schema="main"), {**params, "kind": MOVED_IN})
+
+                # 写入原ID会推高目标分片的 sqlite_sequence，恢复后新预约仍在本分片的ID范围内
+                if sequence is not None:
+                    conn.execute("UPDATE main.sqlite_sequence SET seq = ? WHERE name = 'bookings'", sequence)
+                conn.execute(
+                    "INSERT INTO main.calendar_versions (scope, owner_id, version) "
+                    "SELECT DISTINCT 'user', user_id, 1 FROM main.bookings WHERE room_id = :room_id "
+                    "ON CONFLICT (scope, owner_id) DO UPDATE SET version = version + 1", params
+                )
+                for schema in ("main", "source"):
+                    for namespace in (BOOKINGS, SLOTS):
+                        conn.execute(_BUMP_SQL.format(schema=schema), {"namespace": namespace})
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return moved
+        finally:
+            conn.close()
+
+    @staticmethod
+    def rebalance(db: Session, log: Callable[[str], None] = print) -> int:
+        """
+        将数据所在分片与地点配置不一致的会议室逐个移动到目标分片
+
+        Args:
+            db: 数据库会话
+            log: 日志输出函数
+
+        Returns:
+            移动的会议室数量
+        """
+        misplaced = ShardService.misplaced_rooms(db)
+        for room_id, (source, target) in sorted(misplaced.items()):
+            moved = ShardService.move_room(room_id, source, target)
+            log(f"🚚 会议室 {room_id}: {source} -> {target}（{moved} 条预约）")
+        return len(misplaced)
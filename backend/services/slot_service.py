@@ -0,0 +1,298 @@
+"""
+会议室时段位图服务层
+
+room_slot_bitmaps 为每个会议室每个 UTC 日期保存一个 96 位位图（每位对应 15 分钟时段，
+时段内有任何占用即置位），预约变更时在同一事务中重新计算受影响的会议室-日期。
+
+各 worker 按日期缓存 {会议室ID: 位图}（位图变更后自动失效）：
+- 空闲会议室查询：每个会议室的位图与查询时段掩码按位与，结果映射到分面索引的会议室位图上，
+  再与属性筛选条件按位与
+- 月视图热力图：按天对位图计数（popcount）
+
+位图只用于快速筛选，按时段取整后偏保守（部分占用的时段视为占用），
+已过期但尚未被清理任务取消的临时保留在取消前仍视为占用；创建预约时仍以预约表的冲突检查为准
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Booking, BookingArchive, Room, RoomSlotBitmap
+from services.occupancy import ACTIVE_STATUSES, hold_not_expired
+from services.room_facet_service import RoomFacetService
+from services.shard_service import ShardService
+from utils.cache_bus import GenerationCache, SLOTS, bump_generation
+from utils.timezone import make_naive
+from utils.profiling import profile_service
+
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_BYTES = SLOTS_PER_DAY // 8
+
+# 按日期缓存 {会议室ID: 位图}
+_day_cache = GenerationCache(SLOTS, max_entries=400)
+
+
+def day_masks(start_time: datetime, end_time: datetime) -> List[Tuple[date, int]]:
+    """
+    时间段按 UTC 日期拆分为时段掩码（首尾不足一个时段的部分按整个时段计）
+
+    Args:
+        start_time: 开始时间（UTC）
+        end_time: 结束时间（UTC）
+
+    Returns:
+        [(日期, 掩码), ...]
+    """
+    start = make_naive(start_time)
+    end = make_naive(end_time)
+    masks = []
+    while start < end:
+        day_start = datetime.combine(start.date(), time.min)
+        piece_end = min(end, day_start + timedelta(days=1))
+        first = int((start - day_start).total_seconds()) // (SLOT_MINUTES * 60)
+        last = -(-int((piece_end - day_start).total_seconds()) // (SLOT_MINUTES * 60))
+        masks.append((start.date(), ((1 << last) - 1) ^ ((1 << first) - 1)))
+        start = piece_end
+    return masks
+
+
+def encode(bits: int) -> bytes:
+    return bits.to_bytes(BITMAP_BYTES, "little")
+
+
+def decode(blob: bytes) -> int:
+    return int.from_bytes(blob, "little")
+
+
+@profile_service
+class SlotService:
+    """会议室时段位图服务类"""
+
+    @staticmethod
+    def refresh_booking(db: Session, booking: Booking) -> None:
+        """
+        预约新增或状态变更后，重新计算其所在会议室、所跨日期的位图（不提交事务）
+
+        Args:
+            db: 数据库会话
+            booking: 发生变更的预约对象
+        """
+        days = [day for day, _ in day_masks(booking.start_time, booking.end_time)]
+        SlotService.refresh_days(db, booking.room_id, days)
+
+    @staticmethod
+    def refresh_days(db: Session, room_id: int, days: Iterable[date]) -> None:
+        """
+        根据预约表重新计算单个会议室若干天的位图（幂等，不提交事务）
+
+        Args:
+            db: 数据库会话
+            room_id: 会议室ID
+            days: 需要重新计算的日期
+        """
+        SlotService.refresh_rooms(db, {room_id: days})
+
+    @staticmethod
+    def refresh_rooms(db: Session, days_by_room: Dict[int, Iterable[date]]) -> None:
+        """
+        根据预约表重新计算多个会议室若干天的位图（批量写入时每个模型只查询一次，幂等，不提交事务）
+
+        Args:
+            db: 数据库会话
+            days_by_room: {会议室ID: 需要重新计算的日期}
+        """
+        bitmaps: Dict[Tuple[date, int], int] = {
+            (day, room_id): 0 for room_id, days in days_by_room.items() for day in days
+        }
+        if not bitmaps:
+            return
+        room_ids = list({room_id for _, room_id in bitmaps})
+        # 会话未开启 autoflush，先写入调用方对预约的修改
+        db.flush()
+        range_start = datetime.combine(min(day for day, _ in bitmaps), time.min)
+        range_end = datetime.combine(max(day for day, _ in bitmaps) + timedelta(days=1), time.min)
+
+        for model in (Booking, BookingArchive):
+            query = db.query(model.room_id, model.start_time, model.end_time).filter(
+                model.room_id == room_ids[0] if len(room_ids) == 1 else model.room_id.in_(room_ids),
+                model.start_time < range_end,
+                model.end_time > range_start
+            )
+            if model is Booking:
+                query = query.filter(
+                    Booking.deleted_at.is_(None), Booking.status.in_(ACTIVE_STATUSES), hold_not_expired()
+                )
+            else:
+                query = query.filter(BookingArchive.status != "cancelled")
+            for room_id, start_time, end_time in query:
+                for day, mask in day_masks(start_time, end_time):
+                    if (day, room_id) in bitmaps:
+                        bitmaps[day, room_id] |= mask
+
+        table = RoomSlotBitmap.__table__
+        upserts = [
+            {"day": day, "room_id": room_id, "bits": encode(bits)}
+            for (day, room_id), bits in bitmaps.items() if bits
+        ]
+        deletes = [{"day_": day, "room_id_": room_id} for (day, room_id), bits in bitmaps.items() if not bits]
+        if upserts:
+            stmt = sqlite_insert(table)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.day, table.c.room_id], set_={"bits": stmt.excluded.bits}
+            ), upserts)
+        if deletes:
+            db.execute(table.delete().where(
+                table.c.day == bindparam("day_"), table.c.room_id == bindparam("room_id_")
+            ), deletes)
+        bump_generation(db, SLOTS)
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """
+        根据预约表和归档表全量重建会话所在分片的位图并提交
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            写入的位图条数
+        """
+        bitmaps: Dict[Tuple[date, int], int] = {}
+        for model in (Booking, BookingArchive):
+            query = db.query(model.room_id, model.start_time, model.end_time)
+            if model is Booking:
+                query = query.filter(
+                    Booking.deleted_at.is_(None), Booking.status.in_(ACTIVE_STATUSES), hold_not_expired()
+                )
+            else:
+                query = query.filter(BookingArchive.status != "cancelled")
+            for room_id, start_time, end_time in query.yield_per(1000):
+                for day, mask in day_masks(start_time, end_time):
+                    bitmaps[day, room_id] = bitmaps.get((day, room_id), 0) | mask
+
+        table = RoomSlotBitmap.__table__
+        db.execute(table.delete())
+        rows = [{"day": day, "room_id": room_id, "bits": encode(bits)} for (day, room_id), bits in bitmaps.items()]
+        if rows:
+            db.execute(table.insert(), rows)
+        bump_generation(db, SLOTS)
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    def get_day(db: Session, day: date) -> Dict[int, int]:
+        """
+        某一天各会议室的位图（进程内缓存，合并各分片；没有占用的会议室不在结果中）
+
+        Args:
+            db: 数据库会话
+            day: UTC 日期
+
+        Returns:
+            {会议室ID: 位图}
+        """
+        def load() -> Dict[int, int]:
+            day_bitmaps = {}
+            for rows in ShardService.fan_out(db, lambda shard_db: shard_db.query(
+                RoomSlotBitmap.room_id, RoomSlotBitmap.bits
+            ).filter(RoomSlotBitmap.day == day).all()):
+                day_bitmaps.update((room_id, decode(bits)) for room_id, bits in rows)
+            return day_bitmaps
+
+        return _day_cache.get_or_load(day, load)
+
+    @staticmethod
+    def find_free_rooms(
+        db: Session,
+        start_time: datetime,
+        end_time: datetime,
+        filters: dict,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Room]:
+        """
+        查找时间段内空闲且满足属性筛选条件的会议室
+
+        Args:
+            db: 数据库会话
+            start_time: 开始时间（UTC）
+            end_time: 结束时间（UTC）
+            filters: 属性筛选条件（见 RoomFacetIndex.match）
+            skip: 跳过数量
+            limit: 限制数量
+
+        Returns:
+            会议室列表（按 ID 升序）
+
+        Raises:
+            HTTPException: 时间段无效时抛出
+        """
+        if end_time <= start_time:
+            raise HTTPException(status_code=400, detail="结束时间必须晚于开始时间")
+        if end_time - start_time > timedelta(hours=settings.max_booking_hours):
+            raise HTTPException(status_code=400, detail=f"查询时段不能超过 {settings.max_booking_hours:g} 小时")
+
+        index = RoomFacetService.get_index(db)
+        busy = 0
+        for day, mask in day_masks(start_time, end_time):
+            for room_id, bits in SlotService.get_day(db, day).items():
+                if bits & mask:
+                    busy |= index.positions.get(room_id, 0)
+
+        candidates = index.match(**RoomFacetService.normalize_filters(filters))
+        return RoomFacetService.rooms_page(db, index.ids(candidates & ~busy), skip, limit)
+
+    @staticmethod
+    def get_heatmap(
+        db: Session,
+        date_from: date,
+        date_to: date,
+        filters: dict,
+        room_id: Optional[int] = None
+    ) -> dict:
+        """
+        月视图热力图：每天被占用的时段数（位图计数）占全部时段的比例
+
+        Args:
+            db: 数据库会话
+            date_from: 开始日期（包含）
+            date_to: 结束日期（包含）
+            filters: 属性筛选条件（指定 room_id 时忽略）
+            room_id: 只统计单个会议室
+
+        Returns:
+            {"slot_minutes": 时段分钟数, "room_count": 会议室数, "days": [...]}
+
+        Raises:
+            HTTPException: 日期范围无效时抛出
+        """
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+        if (date_to - date_from).days >= settings.slot_heatmap_max_days:
+            raise HTTPException(status_code=400, detail=f"查询范围不能超过 {settings.slot_heatmap_max_days} 天")
+        index = RoomFacetService.get_index(db)
+        if room_id is not None:
+            room_ids = {room_id} if room_id in index.room_ids else set()
+        else:
+            room_ids = set(index.ids(index.match(**RoomFacetService.normalize_filters(filters))))
+
+        total_slots = len(room_ids) * SLOTS_PER_DAY
+        days = []
+        day = date_from
+        while day <= date_to:
+            booked = sum(bits.bit_count() for rid, bits in SlotService.get_day(db, day).items() if rid in room_ids)
+            days.append({
+                "day": day,
+                "booked_slots": booked,
+                "total_slots": total_slots,
+                "occupancy": round(booked / total_slots, 4) if total_slots else 0.0,
+            })
+            day += timedelta(days=1)
+        return {"slot_minutes": SLOT_MINUTES, "room_count": len(room_ids), "days": days}
@@ -0,0 +1,283 @@
+"""
+会议室使用率统计服务层
+维护 room_usage_daily 汇总表（预约变更后由后台任务按会议室、日期重新计算），并基于汇总表生成使用率报表
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import Booking, BookingArchive, Room, RoomUsageDaily
+from services.job_service import JobService, job_handler
+from services.shard_service import ShardService
+from utils.timezone import make_naive
+from utils.profiling import profile_service
+
+
+MINUTES_PER_DAY = 24 * 60
+
+# 支持的报表分组方式
+GROUP_BY_OPTIONS = ("room", "location", "day")
+
+# 批量写入汇总表时每批的行数
+REBUILD_BATCH_SIZE = 1000
+
+# 重新计算每日汇总的后台任务
+REFRESH_JOB = "usage.refresh"
+
+
+def split_minutes_by_day(start_time: datetime, end_time: datetime) -> List[Tuple[date, int]]:
+    """
+    将时间段按 UTC 日期拆分，计算每天占用的分钟数
+
+    Args:
+        start_time: 开始时间（UTC）
+        end_time: 结束时间（UTC）
+
+    Returns:
+        [(日期, 分钟数), ...]
+    """
+    start = make_naive(start_time)
+    end = make_naive(end_time)
+    pieces = []
+    while start < end:
+        next_day = datetime.combine(start.date() + timedelta(days=1), time.min)
+        piece_end = min(end, next_day)
+        minutes = int((piece_end - start).total_seconds() // 60)
+        if minutes > 0:
+            pieces.append((start.date(), minutes))
+        start = piece_end
+    return pieces
+
+
+@profile_service
+class UsageService:
+    """使用率统计服务类"""
+
+    @staticmethod
+    def schedule_refresh(db: Session, booking: Booking) -> None:
+        """
+        在当前事务中排入后台任务，重新计算预约所跨日期的每日汇总
+        不提交事务，由调用方与预约变更一起提交
+
+        Args:
+            db: 数据库会话
+            booking: 发生变更的预约对象
+        """
+        days = [day for day, _ in split_minutes_by_day(booking.start_time, booking.end_time)]
+        UsageService.schedule_refresh_days(db, booking.room_id, days)
+
+    @staticmethod
+    def schedule_refresh_days(db: Session, room_id: int, days: Iterable[date]) -> None:
+        """
+        在当前事务中排入后台任务，重新计算单个会议室若干天的每日汇总（不提交事务）
+
+        Args:
+            db: 数据库会话
+            room_id: 会议室ID
+            days: 需要重新计算的日期
+        """
+        UsageService.schedule_refresh_rooms(db, {room_id: days})
+
+    @staticmethod
+    def schedule_refresh_rooms(db: Session, days_by_room: Dict[int, Iterable[date]]) -> None:
+        """
+        在当前事务中为多个会议室批量排入汇总任务（每个会议室一个任务，不提交事务）
+
+        Args:
+            db: 数据库会话
+            days_by_room: {会议室ID: 需要重新计算的日期}
+        """
+        items = []
+        for room_id, days in days_by_room.items():
+            days = [day.isoformat() for day in sorted(set(days))]
+            if days:
+                items.append((
+                    {"room_id": room_id, "days": days},
+                    f"{REFRESH_JOB}:{room_id}:{days[0]}:{days[-1]}:{len(days)}"
+                ))
+        JobService.enqueue_many(db, REFRESH_JOB, items)
+
+    @staticmethod
+    def refresh_days(db: Session, room_id: int, days: List[date]) -> None:
+        """
+        根据预约表重新计算单个会议室若干天的每日汇总（幂等，不提交事务）
+
+        Args:
+            db: 数据库会话
+            room_id: 会议室ID
+            days: 需要重新计算的日期
+        """
+        if not days:
+            return
+        wanted = set(days)
+        range_start = datetime.combine(min(wanted), time.min)
+        range_end = datetime.combine(max(wanted) + timedelta(days=1), time.min)
+
+        totals: Dict[date, List[int]] = {day: [0, 0] for day in wanted}
+        for model in (Booking, BookingArchive):
+            query = db.query(model.start_time, model.end_time).filter(
+                model.room_id == room_id,
+                model.start_time < range_end,
+                model.end_time > range_start,
+                model.status != "cancelled"
+            )
+            if model is Booking:
+                # 未确认的临时保留不计入汇总
+                query = query.filter(Booking.deleted_at.is_(None), Booking.hold_expires_at.is_(None))
+            for start_time, end_time in query:
+                for day, minutes in split_minutes_by_day(start_time, end_time):
+                    if day in totals:
+                        totals[day][0] += minutes
+                        totals[day][1] += 1
+
+        table = RoomUsageDaily.__table__
+        for day, (minutes, count) in totals.items():
+            if not count:
+                db.execute(table.delete().where(table.c.room_id == room_id, table.c.day == day))
+                continue
+            stmt = sqlite_insert(table).values(
+                room_id=room_id, day=day, booked_minutes=minutes, booking_count=count
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.room_id, table.c.day],
+                set_={"booked_minutes": minutes, "booking_count": count}
+            ))
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """
+        根据预约表重新计算会话所在分片的全部每日汇总
+
+        流式扫描预约表与归档表，在内存中按 (会议室, 日期) 聚合后批量写入
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            写入的汇总行数
+        """
+        totals: Dict[Tuple[int, date], List[int]] = defaultdict(lambda: [0, 0])
+        # 汇总同时包含在线预约与已归档预约
+        for model in (Booking, BookingArchive):
+            query = db.query(model.room_id, model.start_time, model.end_time).filter(
+                model.status != "cancelled"
+            )
+            if model is Booking:
+                # 未确认的临时保留不计入汇总
+                query = query.filter(Booking.deleted_at.is_(None), Booking.hold_expires_at.is_(None))
+            rows = query.yield_per(REBUILD_BATCH_SIZE)
+            for room_id, start_time, end_time in rows:
+                for day, minutes in split_minutes_by_day(start_time, end_time):
+                    entry = totals[(room_id, day)]
+                    entry[0] += minutes
+                    entry[1] += 1
+
+        db.query(RoomUsageDaily).delete()
+        records = [
+            {"room_id": room_id, "day": day, "booked_minutes": minutes, "booking_count": count}
+            for (room_id, day), (minutes, count) in totals.items()
+        ]
+        for offset in range(0, len(records), REBUILD_BATCH_SIZE):
+            db.execute(RoomUsageDaily.__table__.insert(), records[offset:offset + REBUILD_BATCH_SIZE])
+        db.commit()
+        return len(records)
+
+    @staticmethod
+    def get_utilization(
+        db: Session,
+        date_from: date,
+        date_to: date,
+        group_by: str = "room"
+    ) -> List[dict]:
+        """
+        生成使用率报表（仅读取汇总表，各分片的汇总并发查询后相加）
+
+        Args:
+            db: 数据库会话
+            date_from: 起始日期（含）
+            date_to: 结束日期（含）
+            group_by: 分组方式 room / location / day
+
+        Returns:
+            报表行列表
+
+        Raises:
+            HTTPException: 参数无效时抛出
+        """
+        if group_by not in GROUP_BY_OPTIONS:
+            raise HTTPException(status_code=400, detail=f"group_by 仅支持: {', '.join(GROUP_BY_OPTIONS)}")
+        if date_from > date_to:
+            raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+
+        days = (date_to - date_from).days + 1
+        in_range = (
+            RoomUsageDaily.day >= date_from,
+            RoomUsageDaily.day <= date_to,
+        )
+        minutes = func.sum(RoomUsageDaily.booked_minutes)
+        count = func.sum(RoomUsageDaily.booking_count)
+
+        if group_by == "room":
+            usage = _sum_shards(db, lambda shard_db: shard_db.query(RoomUsageDaily.room_id, minutes, count)
+                                .filter(*in_range).group_by(RoomUsageDaily.room_id).all())
+            rows = []
+            for room in db.query(Room.id, Room.name).filter(Room.deleted_at.is_(None)).order_by(Room.id):
+                booked, booking_count = usage.get(room.id, (0, 0))
+                rows.append(_report_row(room.name, booked, booking_count, days * MINUTES_PER_DAY, room_id=room.id))
+            return rows
+
+        if group_by == "location":
+            usage = _sum_shards(db, lambda shard_db: shard_db.query(Room.location, minutes, count)
+                                .join(Room, Room.id == RoomUsageDaily.room_id)
+                                .filter(*in_range, Room.deleted_at.is_(None)).group_by(Room.location).all())
+            rows = []
+            for location, room_count in db.query(Room.location, func.count(Room.id)).filter(
+                Room.deleted_at.is_(None)
+            ).group_by(Room.location):
+                booked, booking_count = usage.get(location, (0, 0))
+                rows.append(_report_row(location, booked, booking_count, days * MINUTES_PER_DAY * room_count))
+            return rows
+
+        room_count = db.query(func.count(Room.id)).filter(Room.deleted_at.is_(None)).scalar() or 0
+        usage = _sum_shards(db, lambda shard_db: shard_db.query(RoomUsageDaily.day, minutes, count)
+                            .filter(*in_range).group_by(RoomUsageDaily.day).all())
+        rows = []
+        for offset in range(days):
+            day = date_from + timedelta(days=offset)
+            booked, booking_count = usage.get(day, (0, 0))
+            rows.append(_report_row(day.isoformat(), booked, booking_count, MINUTES_PER_DAY * room_count))
+        return rows
+
+
+def _sum_shards(db: Session, query_shard) -> Dict[object, Tuple[int, int]]:
+    """在各分片上执行分组汇总查询，按分组键合并 (分钟数, 预约数)"""
+    usage: Dict[object, Tuple[int, int]] = {}
+    for rows in ShardService.fan_out(db, query_shard):
+        for key, m, c in rows:
+            booked, booking_count = usage.get(key, (0, 0))
+            usage[key] = (booked + int(m or 0), booking_count + int(c or 0))
+    return usage
+
+
+def _report_row(key: str, booked_minutes, booking_count, available_minutes: int, room_id: int = None) -> dict:
+    """组装报表行"""
+    booked_minutes = int(booked_minutes or 0)
+    return {
+        "key": key,
+        "room_id": room_id,
+        "booked_minutes": booked_minutes,
+        "booking_count": int(booking_count or 0),
+        "available_minutes": available_minutes,
+        "utilization": round(booked_minutes / available_minutes, 4) if available_minutes else 0.0,
+    }
+
+
+@job_handler(REFRESH_JOB)
+def _refresh_usage_job(db: Session, payload: dict) -> None:
+    UsageService.refresh_days(db, payload["room_id"], [date.fromisoformat(day) for day in payload["days"]])
@@ -5,15 +5,28 @@
 from typing import List
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from passlib.context import CryptContext
+from functools import lru_cache
 
 from models import User
 from schemas import UserCreate
+from utils.metrics import PASSWORD_HASH_SECONDS
+from utils.profiling import profile_service
+from utils.pagination import clamp_limit
+from utils.cache_bus import bump_generation, USERS
+from utils.timezone import make_naive, get_current_time
+from services.notification_service import NotificationService
+from services.booking_service import BookingService
+from utils.auth import revoke_user_tokens
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """密码哈希上下文（首次使用时才导入 passlib/bcrypt，加快 worker 启动）"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+@profile_service
 class UserService:
     """用户服务类"""
     
@@ -28,7 +41,8 @@ class UserService:
         Returns:
             哈希后的密码
         """
-        return pwd_context.hash(password)
+        with PASSWORD_HASH_SECONDS.time():
+            return get_pwd_context().hash(password)
     
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -42,7 +56,7 @@ class UserService:
         Returns:
             密码是否匹配
         """
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
     
     @staticmethod
     def check_username_exists(db: Session, username: str) -> bool:
@@ -56,7 +70,7 @@ class UserService:
         Returns:
             是否存在
         """
-        return db.query(User).filter(User.username == username).first() is not None
+        return db.query(User).filter(User.username == username, User.deleted_at.is_(None)).first() is not None
     
     @staticmethod
     def check_email_exists(db: Session, email: str) -> bool:
@@ -70,7 +84,7 @@ class UserService:
         Returns:
             是否存在
         """
-        return db.query(User).filter(User.email == email).first() is not None
+        return db.query(User).filter(User.email == email, User.deleted_at.is_(None)).first() is not None
     
     @staticmethod
     def create_user(db: Session, user: UserCreate) -> User:
@@ -105,6 +119,11 @@ class UserService:
         )
         
         db.add(db_user)
+        db.flush()
+        
+        # 欢迎邮件由后台任务发送
+        NotificationService.enqueue_welcome(db, db_user)
+        bump_generation(db, USERS)
         db.commit()
         db.refresh(db_user)
         
@@ -125,7 +144,7 @@ class UserService:
         Raises:
             HTTPException: 用户不存在时抛出
         """
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.query(User).filter(User.id == user_id, User.deleted_at.is_(None)).first()
         if not user:
             raise HTTPException(status_code=404, detail="用户不存在")
         return user
@@ -143,12 +162,14 @@ class UserService:
         Returns:
             用户列表
         """
-        return db.query(User).offset(skip).limit(limit).all()
+        return db.query(User).filter(User.deleted_at.is_(None)).offset(skip).limit(clamp_limit(limit)).all()
     
     @staticmethod
     def delete_user(db: Session, user_id: int) -> dict:
         """
-        删除用户
+        删除用户（软删除，只写入墓碑时间，由清理任务稍后物理删除）
+        
+        尚未开始的有效预约同时取消，不再占用会议室
         
         Args:
             db: 数据库会话
@@ -158,7 +179,11 @@ class UserService:
             操作结果消息
         """
         user = UserService.get_user_by_id(db, user_id)
-        db.delete(user)
+        user.deleted_at = make_naive(get_current_time())
+        BookingService.cancel_future_bookings(db, user_id=user_id)
+        # 已签发的令牌随之失效
+        revoke_user_tokens(db, user_id)
+        bump_generation(db, USERS)
         db.commit()
         return {"message": "用户已删除"}
 
@@ -0,0 +1,283 @@
+"""
+JWT 认证模块
+
+- 访问令牌（access）短期有效，刷新令牌（refresh）用于换取新的令牌对，签名密钥在进程内只加载一次
+- 校验令牌不查询数据库：解码结果按令牌缓存，吊销列表保存在各 worker 内存中，
+  吊销时写入 token_revocations 表并递增 AUTH 命名空间版本号，其他 worker 通过 cache_bus 感知后重新加载
+"""
+
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from middleware.rate_limit import header_user_id
+from models import TokenRevocation
+from utils.cache_bus import AUTH, GenerationCache, bump_generation
+from utils.timezone import make_aware, make_naive, get_current_time
+
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+@lru_cache(maxsize=None)
+def _jose():
+    """首次签发或校验令牌时才导入 python-jose（加快 worker 启动）"""
+    from jose import JWTError, jwt
+    return jwt, JWTError
+
+
+@lru_cache(maxsize=None)
+def get_signing_key() -> str:
+    """
+    签名密钥（进程内缓存）
+
+    未配置 BOOKING_JWT_SECRET 时读取 jwt_secret_path 文件，文件不存在时生成；
+    以 O_EXCL 创建，多个 worker 同时启动时只有一个写入，其余读取同一密钥
+    """
+    if settings.jwt_secret:
+        return settings.jwt_secret
+    path = settings.jwt_secret_path
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # 等待创建方写完
+        for _ in range(50):
+            with open(path, encoding="ascii") as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.01)
+        raise RuntimeError(f"JWT 密钥文件为空: {path}")
+    key = secrets.token_urlsafe(48)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(key)
+    return key
+
+
+def issue_token(user_id: int, username: str, token_type: str, lifetime: timedelta) -> dict:
+    """
+    签发令牌
+
+    Args:
+        user_id: 用户ID
+        username: 用户名
+        token_type: access / refresh
+        lifetime: 有效期
+
+    Returns:
+        {"token": 令牌, "jti": 令牌ID, "expires_at": 过期时间（naive UTC）}
+    """
+    now = int(time.time())
+    exp = now + int(lifetime.total_seconds())
+    jti = secrets.token_hex(16)
+    claims = {"sub": str(user_id), "name": username, "type": token_type, "jti": jti, "iat": now, "exp": exp}
+    jwt, _ = _jose()
+    token = jwt.encode(claims, get_signing_key(), algorithm=settings.jwt_algorithm)
+    return {"token": token, "jti": jti, "expires_at": make_naive(datetime.fromtimestamp(exp, timezone.utc))}
+
+
+class _ClaimsCache:
+    """已验证令牌的解码结果（只缓存签名有效的令牌，过期时间在每次读取时检查）"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        return self._items.get(token)
+
+    def put(self, token: str, claims: dict) -> None:
+        with self._lock:
+            if len(self._items) >= self.max_entries:
+                self._items.clear()
+            self._items[token] = claims
+
+
+_claims_cache = _ClaimsCache(settings.token_cache_size)
+_revocations = GenerationCache(AUTH, max_entries=1)
+
+
+def _load_revocations() -> Dict[str, int]:
+    """读取未过期的吊销记录 {key: 吊销时间戳（整秒）}"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        now = make_naive(get_current_time())
+        return {
+            key: int(make_aware(revoked_at).timestamp()) for key, revoked_at in
+            db.query(TokenRevocation.key, TokenRevocation.revoked_at).filter(TokenRevocation.expires_at > now)
+        }
+    finally:
+        db.close()
+
+
+def is_revoked(claims: dict) -> bool:
+    """令牌是否已被吊销（内存查找，吊销列表变更后才重新加载）"""
+    revocations = _revocations.get_or_load("all", _load_revocations)
+    if not revocations:
+        return False
+    if f"jti:{claims['jti']}" in revocations:
+        return True
+    # iat 精确到秒：吊销的同一秒内重新登录签发的令牌仍然有效
+    revoked_at = revocations.get(f"user:{claims['sub']}")
+    return revoked_at is not None and claims["iat"] < revoked_at
+
+
+def _verified_claims(token: str) -> Optional[dict]:
+    """校验签名与有效期（签名校验结果按令牌缓存）"""
+    claims = _claims_cache.get(token)
+    if claims is None:
+        jwt, JWTError = _jose()
+        try:
+            claims = jwt.decode(token, get_signing_key(), algorithms=[settings.jwt_algorithm])
+        except JWTError:
+            return None
+        _claims_cache.put(token, claims)
+    if claims["exp"] <= time.time():
+        return None
+    return claims
+
+
+def decode_token(token: str, token_type: str = ACCESS) -> Optional[dict]:
+    """
+    校验令牌
+
+    Args:
+        token: 令牌
+        token_type: 期望的令牌类型
+
+    Returns:
+        令牌声明，令牌无效、过期、类型不符或已吊销时返回 None
+    """
+    claims = _verified_claims(token)
+    if claims is None or claims.get("type") != token_type or is_revoked(claims):
+        return None
+    return claims
+
+
+def revoke(db: Session, key: str, expires_at: datetime) -> None:
+    """
+    在当前事务中吊销令牌（不提交事务）
+
+    Args:
+        db: 数据库会话
+        key: jti:<令牌ID> 或 user:<用户ID>
+        expires_at: 被吊销令牌的最晚过期时间，之后记录可以删除
+    """
+    # 与令牌的 iat 一样精确到秒
+    now = make_naive(get_current_time()).replace(microsecond=0)
+    table = TokenRevocation.__table__
+    # 顺带删除已无意义的记录，保持吊销列表很小
+    db.execute(table.delete().where(table.c.expires_at <= now))
+    stmt = sqlite_insert(table).values(key=key, revoked_at=now, expires_at=expires_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={"revoked_at": stmt.excluded.revoked_at, "expires_at": stmt.excluded.expires_at}
+    ))
+    bump_generation(db, AUTH)
+
+
+def revoke_claims(db: Session, claims: dict) -> bool:
+    """
+    吊销单个令牌（不提交事务）
+
+    Args:
+        db: 数据库会话
+        claims: 令牌声明
+
+    Returns:
+        是否由本次调用吊销（并发吊销同一令牌时只有一方返回 True）
+    """
+    table = TokenRevocation.__table__
+    stmt = sqlite_insert(table).values(
+        key=f"jti:{claims['jti']}",
+        revoked_at=make_naive(get_current_time()),
+        expires_at=make_naive(datetime.fromtimestamp(claims["exp"], timezone.utc))
+    ).on_conflict_do_nothing(index_elements=[table.c.key])
+    inserted = db.execute(stmt).rowcount == 1
+    bump_generation(db, AUTH)
+    return inserted
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> None:
+    """吊销用户此前签发的全部令牌（不提交事务）"""
+    revoke(
+        db, f"user:{user_id}",
+        make_naive(get_current_time()) + timedelta(days=settings.refresh_token_days)
+    )
+
+
+def optional_claims(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)
+) -> Optional[dict]:
+    """
+    依赖项：携带 Bearer 令牌时返回令牌声明，未携带时返回 None
+    （BOOKING_AUTH_REQUIRED=true 时未携带令牌返回 401）
+
+    Raises:
+        HTTPException: 令牌无效，或要求认证但未携带令牌时抛出
+    """
+    if credentials is None:
+        if settings.auth_required:
+            raise HTTPException(status_code=401, detail="未登录", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    claims = decode_token(credentials.credentials)
+    if claims is None:
+        raise HTTPException(status_code=401, detail="令牌无效或已过期", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+
+def current_claims(claims: Optional[dict] = Depends(optional_claims)) -> dict:
+    """
+    依赖项：必须登录，返回令牌声明
+
+    Raises:
+        HTTPException: 未携带有效令牌时抛出
+    """
+    if claims is None:
+        raise HTTPException(status_code=401, detail="未登录", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+
+def check_acting_user(claims: Optional[dict], user_id: int) -> None:
+    """
+    已登录时只允许以自己的身份操作
+
+    Args:
+        claims: 令牌声明（未登录为 None）
+        user_id: 请求中的用户ID
+
+    Raises:
+        HTTPException: 请求中的用户与令牌不一致时抛出
+    """
+    if claims is not None and int(claims["sub"]) != user_id:
+        raise HTTPException(status_code=403, detail="不能以其他用户的身份操作")
+
+
+def bearer_or_header_user_id(scope) -> Optional[str]:
+    """
+    限流中间件识别用户：优先使用 Bearer 令牌中的用户（只校验签名与有效期），其次使用 X-User-Id 请求头
+    """
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                claims = _verified_claims(token.strip())
+                if claims is not None:
+                    return claims["sub"]
+    return header_user_id(scope)
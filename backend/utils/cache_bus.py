@@ -0,0 +1,175 @@
+"""
+跨进程缓存失效模块
+多个 gunicorn worker 共用同一个 SQLite 文件时，保证各 worker 的进程内缓存及时失效
+
+原理：
+- 写操作在同一事务中调用 bump_generation()，更新 cache_generations 表中对应命名空间的
+  版本号（全局单调递增）
+- 每个 worker 持有一个专用的只读连接，读缓存前执行 PRAGMA data_version
+  （只读取数据库头部，耗时为微秒级）；该值变化说明有其他连接提交过写入，
+  此时只读取版本号大于上次所见值的命名空间，并清空对应的本地缓存
+- 分片部署时每个分片库各有一个只读连接和各自的版本号，命名空间的版本号取各库之和（仍单调递增）
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+
+
+# 命名空间
+ROOMS = "rooms"
+USERS = "users"
+BOOKINGS = "bookings"
+AUTH = "auth"
+SLOTS = "slots"
+
+
+_BUMP_SQL = text(
+    "INSERT INTO cache_generations (namespace, generation) "
+    "VALUES (:namespace, (SELECT COALESCE(MAX(generation), 0) + 1 FROM cache_generations)) "
+    "ON CONFLICT(namespace) DO UPDATE SET generation = excluded.generation"
+)
+
+
+def bump_generation(db: Session, *namespaces: str) -> None:
+    """
+    在当前事务中标记命名空间已变更（随事务提交生效）
+
+    Args:
+        db: 数据库会话
+        namespaces: 发生变更的命名空间
+    """
+    for namespace in namespaces:
+        db.execute(_BUMP_SQL, {"namespace": namespace})
+
+
+class CacheBus:
+    """基于 SQLite data_version 的缓存失效总线（每个进程一个实例）"""
+
+    def __init__(self, *database_paths: str):
+        self.database_paths = database_paths
+        self._lock = threading.Lock()
+        self._conns: List[Optional[sqlite3.Connection]] = [None] * len(database_paths)
+        self._pid = None
+        self._data_versions: List[Optional[int]] = [None] * len(database_paths)
+        self._last_generations = [0] * len(database_paths)
+        self._generations: List[Dict[str, int]] = [{} for _ in database_paths]
+        self.generations: Dict[str, int] = {}
+
+    def _connect(self, i: int) -> sqlite3.Connection:
+        # fork 之后每个 worker 需要自己的连接
+        if self._pid != os.getpid():
+            self._conns = [None] * len(self.database_paths)
+            self._data_versions = [None] * len(self.database_paths)
+            self._pid = os.getpid()
+        if self._conns[i] is None:
+            self._conns[i] = sqlite3.connect(
+                self.database_paths[i], check_same_thread=False, isolation_level=None
+            )
+        return self._conns[i]
+
+    def poll(self) -> Dict[str, int]:
+        """
+        检查其他连接的写入，返回各命名空间的最新版本号
+
+        Returns:
+            {命名空间: 版本号}
+        """
+        with self._lock:
+            changed = False
+            for i in range(len(self.database_paths)):
+                conn = self._connect(i)
+                data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == self._data_versions[i]:
+                    continue
+                self._data_versions[i] = data_version
+                try:
+                    rows = conn.execute(
+                        "SELECT namespace, generation FROM cache_generations WHERE generation > ?",
+                        (self._last_generations[i],)
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    # 表尚未创建
+                    rows = []
+                for namespace, generation in rows:
+                    self._generations[i][namespace] = generation
+                    self._last_generations[i] = max(self._last_generations[i], generation)
+                    changed = True
+            if changed:
+                totals: Dict[str, int] = {}
+                for generations in self._generations:
+                    for namespace, generation in generations.items():
+                        totals[namespace] = totals.get(namespace, 0) + generation
+                self.generations = totals
+            return self.generations
+
+
+_bus: Optional[CacheBus] = None
+
+
+def get_cache_bus() -> CacheBus:
+    """获取当前进程的缓存失效总线"""
+    global _bus
+    if _bus is None:
+        from database import shard_path, shard_sessionmakers
+        _bus = CacheBus(*(shard_path(name) for name in shard_sessionmakers))
+    return _bus
+
+
+class GenerationCache:
+    """
+    进程内缓存，命名空间版本号变化时整体失效
+
+    用法:
+        rooms_cache = GenerationCache(ROOMS)
+        value = rooms_cache.get_or_load(key, loader)
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 1024):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._items: Dict[Hashable, object] = {}
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], object]):
+        """
+        读取缓存，未命中时调用 loader 加载
+
+        Args:
+            key: 缓存键
+            loader: 加载函数
+
+        Returns:
+            缓存值
+        """
+        if not settings.cache_enabled:
+            return loader()
+
+        generation = get_cache_bus().poll().get(self.namespace, 0)
+        with self._lock:
+            if generation != self._generation:
+                self._items.clear()
+                self._generation = generation
+            if key in self._items:
+                return self._items[key]
+
+        value = loader()
+        with self._lock:
+            # 加载期间版本号已变化时不写入，避免缓存旧数据
+            if self._generation == generation:
+                if len(self._items) >= self.max_entries:
+                    self._items.clear()
+                self._items[key] = value
+        return value
+
+    def clear(self) -> None:
+        """清空本地缓存"""
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,75 @@
+"""
+响应编码工具模块
+预约列表支持紧凑的列式 JSON：用户和会议室只各发送一次，预约按字段拆成并行数组
+
+客户端在 Accept 请求头中声明 COLUMNAR_MEDIA_TYPE 时启用，其余情况保持原有的嵌套 JSON
+"""
+
+from typing import Iterable, Optional
+
+from fastapi.responses import JSONResponse
+
+from schemas import BookingResponse, RoomResponse, UserResponse
+
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.booking.columnar+json"
+
+# 列式格式中预约的字段顺序
+BOOKING_COLUMNS = tuple(BookingResponse.model_fields)
+
+
+def wants_columnar(accept: Optional[str]) -> bool:
+    """
+    判断客户端是否接受列式格式
+
+    Args:
+        accept: Accept 请求头
+
+    Returns:
+        是否返回列式格式
+    """
+    return bool(accept) and COLUMNAR_MEDIA_TYPE in accept
+
+
+def encode_bookings_columnar(bookings: Iterable) -> dict:
+    """
+    将预约列表编码为列式结构
+
+    格式:
+        {
+            "users": [{用户}, ...],            # 去重后的用户
+            "rooms": [{会议室}, ...],          # 去重后的会议室
+            "bookings": {"id": [...], "user_id": [...], ...}  # 每个字段一个数组
+        }
+
+    Args:
+        bookings: 预约对象（需已加载 user、room 关系并补充时区）
+
+    Returns:
+        可 JSON 序列化的字典
+    """
+    users = {}
+    rooms = {}
+    columns = {name: [] for name in BOOKING_COLUMNS}
+    for booking in bookings:
+        row = BookingResponse.model_validate(booking).model_dump(mode="json")
+        for name in BOOKING_COLUMNS:
+            columns[name].append(row[name])
+        if booking.user_id not in users:
+            users[booking.user_id] = UserResponse.model_validate(booking.user).model_dump(mode="json")
+        if booking.room_id not in rooms:
+            rooms[booking.room_id] = RoomResponse.model_validate(booking.room).model_dump(mode="json")
+    return {
+        "users": list(users.values()),
+        "rooms": list(rooms.values()),
+        "bookings": columns,
+    }
+
+
+def columnar_response(bookings: Iterable) -> JSONResponse:
+    """以列式格式返回预约列表"""
+    return JSONResponse(
+        encode_bookings_columnar(bookings),
+        media_type=COLUMNAR_MEDIA_TYPE,
+        headers={"Vary": "Accept"}
+    )
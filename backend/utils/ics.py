@@ -0,0 +1,110 @@
+"""
+iCalendar 编码工具模块
+将预约渲染为 RFC 5545 日历（CRLF 换行，超过 75 字节的行折叠），并按 ETag 处理条件请求
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import Response
+
+
+# Starlette 为 text/* 类型自动追加 charset=utf-8
+ICS_MEDIA_TYPE = "text/calendar"
+PRODID = "-//Meeting Room Booking//CN"
+MAX_LINE_OCTETS = 75
+
+
+def escape_text(value: str) -> str:
+    """转义 TEXT 类型属性值中的特殊字符"""
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str) -> str:
+    """按 UTF-8 字节数折叠长行（续行以空格开头，不拆分多字节字符）"""
+    if len(line.encode("utf-8")) <= MAX_LINE_OCTETS:
+        return line
+    parts, current, size = [], [], 0
+    for char in line:
+        octets = len(char.encode("utf-8"))
+        # 续行开头的空格占 1 字节
+        limit = MAX_LINE_OCTETS if not parts else MAX_LINE_OCTETS - 1
+        if size + octets > limit:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += octets
+    parts.append("".join(current))
+    return "\r\n ".join(parts)
+
+
+def format_utc(value: datetime) -> str:
+    """naive UTC 时间格式化为 DATE-TIME（UTC）"""
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_calendar(name: str, events: Iterable[dict]) -> str:
+    """
+    渲染日历
+
+    Args:
+        name: 日历名称（X-WR-CALNAME）
+        events: 事件 {"uid", "dtstamp", "start", "end", "summary", "location", "description", "status"}，
+            时间为 naive UTC
+
+    Returns:
+        iCalendar 文本
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ]
+    for event in events:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{event['uid']}",
+            f"DTSTAMP:{format_utc(event['dtstamp'])}",
+            f"DTSTART:{format_utc(event['start'])}",
+            f"DTEND:{format_utc(event['end'])}",
+            f"SUMMARY:{escape_text(event['summary'])}",
+            f"LOCATION:{escape_text(event['location'])}",
+        ]
+        if event.get("description"):
+            lines.append(f"DESCRIPTION:{escape_text(event['description'])}")
+        lines += [f"STATUS:{event['status']}", "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "".join(fold_line(line) + "\r\n" for line in lines)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否包含当前 ETag（忽略弱校验前缀）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def conditional_response(etag: str, body: Optional[str], max_age: int) -> Response:
+    """
+    日历响应：body 为 None 时返回 304
+
+    Args:
+        etag: 当前 ETag
+        body: 日历文本
+        max_age: 客户端可直接复用的秒数
+
+    Returns:
+        响应对象
+    """
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=ICS_MEDIA_TYPE, headers=headers)
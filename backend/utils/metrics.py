@@ -0,0 +1,300 @@
+"""
+监控指标模块
+轻量级的 Prometheus 指标实现（Counter / Histogram），以及 SQLAlchemy 引擎钩子
+
+所有指标保存在当前进程内存中，每次记录只需一次加锁的字典更新，
+开销足够低，可在生产环境常开
+"""
+
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+# 默认直方图桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    """格式化指标数值"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """格式化标签，如 {method="GET",route="/api/rooms/"}"""
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """指标基类"""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(self.collect())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """计数器（只增不减）"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """增加计数"""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """直方图（按桶统计分布）"""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签对应 [各桶计数..., +Inf 计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """记录一次观测值"""
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            slots = self._values.get(key)
+            if slots is None:
+                slots = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            slots[index] += 1
+            slots[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """计时上下文管理器"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(slots)) for key, slots in self._values.items())
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for key, slots in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), slots[:-1]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} "
+                    f"{_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(slots[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出所有指标"""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP 请求
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP 请求耗时",
+    ("method", "route", "status")
+))
+HTTP_REQUEST_DB_STATEMENTS = REGISTRY.register(Histogram(
+    "http_request_db_statements",
+    "每个请求执行的 SQL 语句数",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+))
+HTTP_REQUEST_DB_SECONDS = REGISTRY.register(Histogram(
+    "http_request_db_duration_seconds",
+    "每个请求的 SQL 总耗时",
+    ("route",)
+))
+
+# 数据库
+DB_STATEMENT_SECONDS = REGISTRY.register(Histogram(
+    "db_statement_duration_seconds",
+    "单条 SQL 语句耗时",
+    ("operation",)
+))
+DB_POOL_CHECKOUT_SECONDS = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds",
+    "从连接池获取连接的等待时间"
+))
+
+# 业务
+PASSWORD_HASH_SECONDS = REGISTRY.register(Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt 密码哈希耗时",
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0, 2.0)
+))
+BOOKING_CONFLICT_CHECKS = REGISTRY.register(Counter(
+    "booking_conflict_checks_total",
+    "预约时间冲突检查次数（result=conflict 表示被拒绝）",
+    ("result",)
+))
+
+# 后台任务
+JOBS_PROCESSED = REGISTRY.register(Counter(
+    "jobs_processed_total",
+    "后台任务执行次数（result=done / retry / failed）",
+    ("kind", "result")
+))
+JOB_START_DELAY_SECONDS = REGISTRY.register(Histogram(
+    "job_start_delay_seconds",
+    "后台任务从到期到开始执行的延迟",
+    ("kind",)
+))
+JOB_DURATION_SECONDS = REGISTRY.register(Histogram(
+    "job_duration_seconds",
+    "后台任务执行耗时",
+    ("kind",)
+))
+
+# 限流与准入控制
+HTTP_REQUESTS_REJECTED = REGISTRY.register(Counter(
+    "http_requests_rejected_total",
+    "被限流或过载保护拒绝的请求数",
+    ("reason",)
+))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "http_admission_wait_seconds",
+    "请求在准入队列中的等待时间"
+))
+
+
+class RequestStats:
+    """单个请求内的数据库统计"""
+
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# 当前请求的统计对象；同步路由在线程池中执行时会复制上下文，共享同一个对象
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def begin_request_stats():
+    """开始记录当前请求的统计，返回 (统计对象, 上下文令牌)"""
+    stats = RequestStats()
+    return stats, _request_stats.set(stats)
+
+
+def end_request_stats(token) -> None:
+    """结束当前请求的统计"""
+    _request_stats.reset(token)
+
+
+def _statement_operation(statement: str) -> str:
+    """提取 SQL 语句类型（SELECT / INSERT / ...）"""
+    head = statement.lstrip()[:10].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def instrument_engine(engine) -> None:
+    """
+    为引擎注册 SQL 计时钩子
+
+    Args:
+        engine: SQLAlchemy 引擎
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_metrics_start", None)
+        if start is None:
+            return
+        elapsed = perf_counter() - start
+        DB_STATEMENT_SECONDS.observe(elapsed, operation=_statement_operation(statement))
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+
+
+class TimedQueuePool(QueuePool):
+    """记录连接获取等待时间的连接池"""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(perf_counter() - start)
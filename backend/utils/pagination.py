@@ -0,0 +1,97 @@
+"""
+分页与结果集大小限制工具模块
+列表接口的每页条数有硬上限；不分页的查询受行数预算约束，超出时提前中止
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+from config import settings
+
+
+def skip_query():
+    """分页偏移量参数"""
+    return Query(0, ge=0, description="跳过数量")
+
+
+def limit_query():
+    """每页条数参数（超过 BOOKING_MAX_PAGE_SIZE 时返回 422）"""
+    return Query(
+        settings.default_page_size,
+        ge=1,
+        le=settings.max_page_size,
+        description=f"每页条数（1-{settings.max_page_size}）"
+    )
+
+
+def clamp_limit(limit: int) -> int:
+    """
+    将每页条数限制在允许范围内（服务层的兜底限制）
+
+    Args:
+        limit: 请求的条数
+
+    Returns:
+        实际使用的条数
+    """
+    return max(1, min(limit, settings.max_page_size))
+
+
+def check_merge_offset(skip: int) -> None:
+    """
+    校验多个分片合并分页时的偏移量
+
+    各分片需取出前 skip + limit 行后在内存中合并，偏移量不能超过 BOOKING_MAX_RESULT_ROWS
+
+    Args:
+        skip: 跳过数量
+
+    Raises:
+        HTTPException: 偏移量过大时抛出 413
+    """
+    if skip > settings.max_result_rows:
+        raise HTTPException(
+            status_code=413,
+            detail=f"跳过数量不能超过 {settings.max_result_rows}，请缩小查询范围"
+        )
+
+
+def fetch_within_budget(query, budget: Optional[int] = None) -> list:
+    """
+    在行数预算内执行查询，超出预算时中止
+
+    只多取一行用于判断是否超出，不会把整个结果集加载到内存
+
+    Args:
+        query: SQLAlchemy 查询对象
+        budget: 最多允许的行数（默认取 BOOKING_MAX_RESULT_ROWS）
+
+    Returns:
+        查询结果列表
+
+    Raises:
+        HTTPException: 结果超出预算时抛出 413
+    """
+    if budget is None:
+        budget = settings.max_result_rows
+    rows = query.limit(budget + 1).all()
+    if len(rows) > budget:
+        raise_result_too_large()
+    return rows
+
+
+def raise_result_too_large() -> None:
+    """
+    抛出结果集过大错误
+
+    Raises:
+        HTTPException: 413
+    """
+    raise HTTPException(
+        status_code=413,
+        detail=(
+            f"查询结果超过 {settings.max_result_rows} 条，请缩小时间范围，"
+            f"或使用 /api/bookings/export 流式导出"
+        )
+    )
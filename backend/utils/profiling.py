@@ -0,0 +1,291 @@
+"""
+性能剖析工具模块
+按请求记录分段耗时（SQL 语句、服务调用、响应序列化），并提供全线程栈采样器
+
+仅在 BOOKING_PROFILING_ENABLED=true 时由中间件开启；未开启时每个钩子
+只多一次 ContextVar 读取
+"""
+
+import functools
+import inspect
+import logging
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter, sleep
+from typing import List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+
+logger = logging.getLogger("booking.profiling")
+
+
+class Span:
+    """一段耗时记录"""
+
+    __slots__ = ("kind", "name", "start", "duration", "phase", "parameters")
+
+    def __init__(self, kind: str, name: str, start: float, duration: float,
+                 phase: str, parameters=None):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.phase = phase
+        self.parameters = parameters
+
+
+class RequestProfile:
+    """单个请求的剖析数据"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = perf_counter()
+        self.spans: List[Span] = []
+        # endpoint：路由函数执行中；serialize：路由函数已返回，正在序列化响应
+        self.phase = "endpoint"
+        self.endpoint_seconds = 0.0
+        self.handler_seconds = 0.0
+
+    def add(self, kind: str, name: str, start: float, duration: float, parameters=None) -> None:
+        self.spans.append(Span(kind, name, start - self.started, duration, self.phase, parameters))
+
+    def total(self, kind: str) -> float:
+        return sum(span.duration for span in self.spans if span.kind == kind)
+
+    @property
+    def serialize_seconds(self) -> float:
+        """路由函数返回后到响应生成完成的耗时（响应模型校验与 JSON 编码）"""
+        return max(self.handler_seconds - self.endpoint_seconds, 0.0)
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """获取当前请求的剖析对象（未开启剖析时为 None）"""
+    return _current_profile.get()
+
+
+def begin_profile(method: str, path: str):
+    """开始剖析当前请求，返回 (剖析对象, 上下文令牌)"""
+    profile = RequestProfile(method, path)
+    return profile, _current_profile.set(profile)
+
+
+def end_profile(token) -> None:
+    """结束剖析当前请求"""
+    _current_profile.reset(token)
+
+
+@contextmanager
+def span(kind: str, name: str):
+    """
+    记录一段耗时
+
+    Args:
+        kind: 类别（service / db / ...）
+        name: 名称
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(kind, name, start, perf_counter() - start)
+
+
+def profiled(name: str):
+    """为函数记录 service 类耗时的装饰器"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_profile.get() is None:
+                return func(*args, **kwargs)
+            with span("service", name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def profile_service(cls):
+    """类装饰器：为服务类的所有静态方法记录耗时"""
+    for attr_name, attr in list(vars(cls).items()):
+        if isinstance(attr, staticmethod) and not attr_name.startswith("_"):
+            wrapped = profiled(f"{cls.__name__}.{attr_name}")(attr.__func__)
+            setattr(cls, attr_name, staticmethod(wrapped))
+    return cls
+
+
+def instrument_engine_profiling(engine) -> None:
+    """
+    为引擎注册 SQL 剖析钩子，记录语句文本与参数
+
+    Args:
+        engine: SQLAlchemy 引擎
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _current_profile.get() is not None:
+            context._profile_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_profile_start", None)
+        profile = _current_profile.get()
+        if start is None or profile is None:
+            return
+        profile.add("db", statement, start, perf_counter() - start,
+                    None if executemany else parameters)
+
+
+def _wrap_endpoint(endpoint):
+    """包装路由函数，记录其执行耗时（之后的时间即为响应序列化）"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.endpoint_seconds = perf_counter() - start
+                profile.phase = "serialize"
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        start = perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.endpoint_seconds = perf_counter() - start
+            profile.phase = "serialize"
+    return wrapper
+
+
+class ProfilingRoute(APIRoute):
+    """
+    支持剖析的路由类
+
+    用法: APIRouter(route_class=ProfilingRoute)
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _wrap_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            profile = _current_profile.get()
+            if profile is None:
+                return await handler(request)
+            start = perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                profile.handler_seconds = perf_counter() - start
+
+        return profiled_handler
+
+
+def explain_query_plan(engine, statement: str, parameters) -> List[str]:
+    """
+    获取 SQL 语句的 EXPLAIN QUERY PLAN（仅 SELECT）
+
+    Args:
+        engine: SQLAlchemy 引擎
+        statement: SQL 语句
+        parameters: 语句参数
+
+    Returns:
+        查询计划的每一行
+    """
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return []
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+        return [row[-1] for row in rows]
+    except Exception as exc:  # 查询计划仅用于诊断，失败不影响请求
+        return [f"<EXPLAIN 失败: {exc}>"]
+
+
+def log_slow_request(engine, profile: RequestProfile, total_seconds: float, slow_query_seconds: float) -> None:
+    """
+    输出慢请求日志，包含各段耗时，以及慢 SQL 的查询计划
+
+    Args:
+        engine: SQLAlchemy 引擎
+        profile: 请求剖析数据
+        total_seconds: 请求总耗时
+        slow_query_seconds: 慢 SQL 阈值
+    """
+    db_spans = [s for s in profile.spans if s.kind == "db"]
+    lines = [
+        f"慢请求 {profile.method} {profile.path}: 总计 {total_seconds * 1000:.1f}ms, "
+        f"路由函数 {profile.endpoint_seconds * 1000:.1f}ms, "
+        f"序列化 {profile.serialize_seconds * 1000:.1f}ms, "
+        f"SQL {len(db_spans)} 条 / {profile.total('db') * 1000:.1f}ms"
+    ]
+    for item in sorted(profile.spans, key=lambda s: s.start):
+        if item.kind == "db":
+            continue
+        lines.append(f"  [{item.kind}] +{item.start * 1000:.1f}ms {item.name} {item.duration * 1000:.1f}ms")
+    lazy_loads = [s for s in db_spans if s.phase == "serialize"]
+    if lazy_loads:
+        lines.append(f"  序列化阶段触发 {len(lazy_loads)} 条 SQL（可能是延迟加载）")
+    for item in db_spans:
+        if item.duration < slow_query_seconds:
+            continue
+        lines.append(f"  [db:{item.phase}] {item.duration * 1000:.1f}ms {' '.join(item.name.split())}")
+        for plan_line in explain_query_plan(engine, item.name, item.parameters):
+            lines.append(f"      {plan_line}")
+    logger.warning("\n".join(lines))
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """
+    对当前进程所有线程进行栈采样
+
+    Args:
+        seconds: 采样时长
+        interval: 采样间隔
+
+    Returns:
+        折叠栈格式（可直接用于 flamegraph.pl / speedscope），每行 "帧;帧;帧 次数"
+    """
+    own_thread = threading.get_ident()
+    thread_names = {t.ident: t.name for t in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = perf_counter() + seconds
+    while perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            frames.append(thread_names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(frames))] += 1
+        sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
@@ -0,0 +1,202 @@
+"""
+限流与准入控制模块
+
+- 令牌桶：按 IP、按用户分别限流，桶状态保存在共享内存文件（mmap + 文件锁）中，
+  多个 gunicorn worker 共用同一份额度；不支持 fcntl 的平台（Windows）退化为进程内限流
+- 准入控制：限制每个 worker 同时处理的请求数，超出部分进入有界队列排队，
+  队列已满或等待超时则直接拒绝，避免请求堆积到超时
+"""
+
+import asyncio
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# 槽位结构：键哈希（0 表示空槽）、剩余令牌数、上次更新时间
+_SLOT = struct.Struct("<Qdd")
+
+
+def _key_hash(key: str) -> int:
+    """计算 64 位键哈希（保证非 0）"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | 1
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    """按流逝时间补充令牌"""
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def _consume(tokens: float, rate: float, cost: float) -> Tuple[float, float]:
+    """
+    尝试消耗令牌
+
+    Returns:
+        (剩余令牌数, 需要等待的秒数；0 表示放行)
+    """
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class SharedTokenBuckets:
+    """
+    基于共享内存文件的令牌桶表（跨进程共享）
+
+    固定数量的槽位按键哈希开放寻址；桶已回满的槽位与空槽等价，可直接复用，
+    探测范围内没有可用槽位时淘汰最久未更新的槽位
+    """
+
+    def __init__(self, path: str, slots: int = 4096, probe: int = 8):
+        self.path = path
+        self.slots = slots
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map: Optional[mmap.mmap] = None
+        self._pid = None
+
+    def _open(self) -> mmap.mmap:
+        # fork 之后每个 worker 需要自己的文件描述符，flock 才能在进程间互斥
+        if self._map is None or self._pid != os.getpid():
+            size = self.slots * _SLOT.size
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd = fd
+            self._map = mmap.mmap(fd, size)
+            self._pid = os.getpid()
+        return self._map
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """
+        从指定桶中取令牌
+
+        Args:
+            key: 桶标识
+            rate: 每秒补充的令牌数
+            burst: 桶容量
+            cost: 本次消耗的令牌数
+
+        Returns:
+            需要等待的秒数；0 表示放行
+        """
+        key_hash = _key_hash(key)
+        with self._lock:
+            table = self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                base = key_hash % self.slots
+                match = free = oldest = None
+                oldest_updated = float("inf")
+                for i in range(self.probe):
+                    offset = ((base + i) % self.slots) * _SLOT.size
+                    slot_hash, tokens, updated = _SLOT.unpack_from(table, offset)
+                    if slot_hash == key_hash:
+                        match = (offset, tokens, updated)
+                        break
+                    if free is None and (slot_hash == 0 or (now - updated) * rate >= burst):
+                        free = offset
+                    if updated < oldest_updated:
+                        oldest, oldest_updated = offset, updated
+
+                if match is not None:
+                    offset, tokens, updated = match
+                    tokens = _refill(tokens, updated, now, rate, burst)
+                else:
+                    offset = free if free is not None else oldest
+                    tokens = burst
+
+                tokens, wait = _consume(tokens, rate, cost)
+                _SLOT.pack_into(table, offset, key_hash, tokens, now)
+                return wait
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class LocalTokenBuckets:
+    """进程内令牌桶表（不支持共享内存文件时使用）"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """从指定桶中取令牌，返回需要等待的秒数（0 表示放行）"""
+        with self._lock:
+            now = time.time()
+            bucket = self._buckets.get(key)
+            tokens = burst if bucket is None else _refill(bucket[0], bucket[1], now, rate, burst)
+            tokens, wait = _consume(tokens, rate, cost)
+            if bucket is None and len(self._buckets) >= self.max_entries:
+                self._buckets.clear()
+            self._buckets[key] = (tokens, now)
+            return wait
+
+
+def create_token_buckets(path: str):
+    """
+    创建令牌桶表：支持 fcntl 时跨进程共享，否则退化为进程内
+
+    Args:
+        path: 共享内存文件路径
+    """
+    if fcntl is None:
+        return LocalTokenBuckets()
+    return SharedTokenBuckets(path)
+
+
+class AdmissionController:
+    """
+    准入控制（每个 worker 一个实例）
+
+    同时处理的请求数达到上限后，新请求在有界队列中等待；
+    队列已满或等待超时的请求直接拒绝
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self) -> Optional[str]:
+        """
+        申请处理名额
+
+        Returns:
+            拒绝原因（queue_full / queue_timeout）；None 表示已获得名额
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return None
+        if self.waiting >= self.max_queue:
+            return "queue_full"
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+        finally:
+            self.waiting -= 1
+        return None
+
+    def release(self) -> None:
+        """释放处理名额"""
+        self._semaphore.release()
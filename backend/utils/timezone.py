@@ -87,6 +87,6 @@ def add_timezone_to_list(objects: List[T], *fields: str) -> List[T]:
 
 
 # 预定义的常用字段组合
-BOOKING_DATETIME_FIELDS = ('start_time', 'end_time', 'created_at')
+BOOKING_DATETIME_FIELDS = ('start_time', 'end_time', 'created_at', 'hold_expires_at')
 STANDARD_DATETIME_FIELDS = ('created_at', 'updated_at')
 
@@ -0,0 +1,252 @@
+"""
+请求轨迹工具模块
+读写可重放的请求轨迹（NDJSON，每行一个请求），并将访问日志解析为同样的轨迹
+
+轨迹行格式:
+    {"ts": 请求开始的 Unix 时间, "method", "path", "query", "route": 路由模板, "user": 用户ID,
+     "headers": {...}, "body": 请求体文本, "status": 记录时的状态码, "duration_ms"}
+
+JSON 请求体中名称包含 password 的字段替换为 MASKED_PASSWORD（轨迹中创建的用户以该密码登录，已有用户登录失败但同样消耗 bcrypt）；
+请求体不是 UTF-8 文本时写入 "body_b64"；超过记录上限时 "body" 为 null 且 "body_truncated" 为 true，这类请求加载时跳过并计数
+"""
+
+import base64
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# 记录并在重放时原样发送的请求头（Authorization 不记录，重放时以 X-User-Id 标识用户）
+TRACE_HEADERS = ("content-type", "accept", "x-user-id", "idempotency-key", "if-none-match")
+
+# 不记录的路径（管理接口、指标、文档）
+EXCLUDED_PREFIXES = ("/api/admin", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+# 替换 JSON 请求体中的密码字段
+MASKED_PASSWORD = "replay-password"
+
+# 没有记录路由模板时，路径中的数字段归并为 {id}
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+# 访问日志中的请求行与状态码，兼容 gunicorn 默认格式
+#   127.0.0.1 - - [19/Oct/2026:09:00:00 +0800] "GET /api/rooms/ HTTP/1.1" 200 512 "-" "curl/8.0"
+# 与 uvicorn 格式（没有时间）
+#   127.0.0.1:50000 - "GET /api/rooms/ HTTP/1.1" 200
+_ACCESS_LINE = re.compile(
+    r'(?:\[(?P<time>[^\]]+)\]\s+)?"(?P<method>[A-Z]+) (?P<target>\S+) HTTP/[\d.]+" (?P<status>\d{3})'
+)
+_ACCESS_TIME_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+
+
+@dataclass
+class TraceRequest:
+    """轨迹中的一个请求（offset 为相对轨迹开始的秒数）"""
+
+    offset: float
+    method: str
+    path: str
+    query: str = ""
+    user: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Optional[bytes] = None
+    status: Optional[int] = None
+    route: Optional[str] = None
+
+    @property
+    def endpoint(self) -> str:
+        """统计分组：方法 + 路由模板"""
+        return f"{self.method} {self.route or normalize_path(self.path)}"
+
+
+def normalize_path(path: str) -> str:
+    """路径中的数字段替换为 {id}（如 /api/bookings/42 -> /api/bookings/{id}）"""
+    return _NUMERIC_SEGMENT.sub("/{id}", path)
+
+
+def is_recorded_path(path: str) -> bool:
+    """该路径的请求是否写入轨迹"""
+    return not path.startswith(EXCLUDED_PREFIXES)
+
+
+def mask_passwords(body: str) -> str:
+    """JSON 对象中名称包含 password 的字段替换为 MASKED_PASSWORD（非 JSON 对象原样返回）"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict) or not any("password" in key for key in data):
+        return body
+    return json.dumps(
+        {key: MASKED_PASSWORD if "password" in key and value is not None else value for key, value in data.items()},
+        ensure_ascii=False
+    )
+
+
+class TraceWriter:
+    """
+    追加写入轨迹文件
+
+    文件以 O_APPEND 打开，每行用一次 write 写入，多个 worker 进程可以共用同一个文件而不会交错
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            os.write(self._fd, line)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+def encode_body(body: bytes, max_bytes: int) -> dict:
+    """请求体转换为轨迹字段"""
+    if not body:
+        return {"body": None}
+    if len(body) > max_bytes:
+        return {"body": None, "body_truncated": True}
+    try:
+        return {"body": mask_passwords(body.decode("utf-8"))}
+    except UnicodeDecodeError:
+        return {"body": None, "body_b64": base64.b64encode(body).decode("ascii")}
+
+
+def load_trace(path: str, limit: Optional[int] = None) -> Tuple[List[TraceRequest], Dict[str, int]]:
+    """
+    读取录制的轨迹
+
+    Args:
+        path: 轨迹文件（NDJSON）
+        limit: 最多读取的请求数
+
+    Returns:
+        (按开始时间排序的请求, {跳过原因: 数量})
+    """
+    records, skipped = [], {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程被杀死时最后一行可能不完整
+                skipped["invalid"] = skipped.get("invalid", 0) + 1
+                continue
+            if record.get("body_truncated"):
+                skipped["body_truncated"] = skipped.get("body_truncated", 0) + 1
+                continue
+            records.append(record)
+
+    # 各 worker 按请求结束的顺序写入，重放前按开始时间排序
+    records.sort(key=lambda record: record["ts"])
+    if limit is not None:
+        records = records[:limit]
+    if not records:
+        return [], skipped
+
+    start = records[0]["ts"]
+    requests = []
+    for record in records:
+        if record.get("body_b64") is not None:
+            body = base64.b64decode(record["body_b64"])
+        elif record.get("body") is not None:
+            body = record["body"].encode("utf-8")
+        else:
+            body = None
+        requests.append(TraceRequest(
+            offset=record["ts"] - start,
+            method=record["method"],
+            path=record["path"],
+            query=record.get("query") or "",
+            user=record.get("user"),
+            headers=record.get("headers") or {},
+            body=body,
+            status=record.get("status"),
+            route=record.get("route"),
+        ))
+    return requests, skipped
+
+
+def parse_access_log(
+    lines: Iterable[str],
+    rate: float = 50,
+    include_writes: bool = False,
+    limit: Optional[int] = None
+) -> Tuple[List[TraceRequest], Dict[str, int]]:
+    """
+    将访问日志解析为轨迹
+
+    访问日志没有请求体和用户：写请求默认跳过，读请求之间不保证顺序。
+    gunicorn 日志的时间只精确到秒，同一秒内的请求在这一秒内均匀分布；
+    没有时间的日志（uvicorn 格式）按每秒 rate 个请求依次排开
+
+    Args:
+        lines: 日志行
+        rate: 日志没有时间时假定的每秒请求数
+        include_writes: 是否保留写请求（以空请求体重放，通常只能得到 4xx）
+        limit: 最多读取的请求数
+
+    Returns:
+        (请求, {跳过原因: 数量})
+    """
+    parsed, skipped = [], {}
+    for line in lines:
+        match = _ACCESS_LINE.search(line)
+        if match is None:
+            if line.strip():
+                skipped["unparsed"] = skipped.get("unparsed", 0) + 1
+            continue
+        method = match.group("method")
+        if method not in ("GET", "HEAD", "OPTIONS") and not include_writes:
+            skipped["no_body"] = skipped.get("no_body", 0) + 1
+            continue
+        path, _, query = match.group("target").partition("?")
+        if not is_recorded_path(path):
+            skipped["excluded"] = skipped.get("excluded", 0) + 1
+            continue
+        timestamp = None
+        if match.group("time"):
+            try:
+                timestamp = datetime.strptime(match.group("time"), _ACCESS_TIME_FORMAT).timestamp()
+            except ValueError:
+                pass
+        parsed.append((timestamp, method, path, query, int(match.group("status"))))
+        if limit is not None and len(parsed) >= limit:
+            break
+
+    requests = []
+    if parsed and all(timestamp is not None for timestamp, *_ in parsed):
+        start = parsed[0][0]
+        # 同一秒内的请求均匀分布在这一秒内
+        i = 0
+        while i < len(parsed):
+            j = i
+            while j < len(parsed) and parsed[j][0] == parsed[i][0]:
+                j += 1
+            for k in range(i, j):
+                timestamp, method, path, query, status = parsed[k]
+                requests.append(TraceRequest(
+                    offset=max(timestamp - start, 0) + (k - i) / (j - i),
+                    method=method, path=path, query=query, status=status
+                ))
+            i = j
+        requests.sort(key=lambda request: request.offset)
+    else:
+        for k, (_, method, path, query, status) in enumerate(parsed):
+            requests.append(TraceRequest(
+                offset=k / rate, method=method, path=path, query=query, status=status
+            ))
+    return requests, skipped
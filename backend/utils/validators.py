@@ -3,7 +3,7 @@
 集中管理所有数据验证逻辑
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from fastapi import HTTPException
 
 from utils.timezone import get_current_time
@@ -27,6 +27,25 @@ def validate_time_range(start_time: datetime, end_time: datetime) -> None:
         )
 
 
+def validate_duration(start_time: datetime, end_time: datetime, max_hours: float) -> None:
+    """
+    验证预约时长不超过上限
+    
+    Args:
+        start_time: 开始时间
+        end_time: 结束时间
+        max_hours: 最长小时数
+        
+    Raises:
+        HTTPException: 时长超过上限时抛出
+    """
+    if end_time - start_time > timedelta(hours=max_hours):
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次预约不能超过 {max_hours:g} 小时"
+        )
+
+
 def validate_future_time(time: datetime) -> None:
     """
     验证时间是否在未来
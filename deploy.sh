@@ -58,6 +58,10 @@ fi
 # 停止旧进程
 pkill -f "gunicorn" 2>/dev/null
 
+# 执行数据库迁移（只执行一次，worker 启动时仅校验结构版本）
+echo "⚙️  执行数据库迁移..."
+python manage.py migrate || exit 1
+
 # 启动 gunicorn（4个worker，绑定到所有网络接口）
 gunicorn main:app \
     --workers 4 \
@@ -20,9 +20,17 @@ const api = axios.create({
   timeout: 10000 // 增加超时时间到10秒
 })
 
+// 登录后保存的令牌
+const TOKEN_KEY = 'booking_tokens'
+const loadTokens = () => JSON.parse(localStorage.getItem(TOKEN_KEY) || 'null')
+
 // 请求拦截器
 api.interceptors.request.use(
   config => {
+    const tokens = loadTokens()
+    if (tokens && !config.headers.Authorization) {
+      config.headers.Authorization = `Bearer ${tokens.access_token}`
+    }
     console.log(`[API请求] ${config.method?.toUpperCase()} ${config.url}`)
     console.log(`[API地址] ${config.baseURL}`)
     return config
@@ -59,33 +67,130 @@ api.interceptors.response.use(
   }
 )
 
+// 生成幂等键（非安全上下文中 crypto.randomUUID 不可用，使用随机串兜底）
+const createIdempotencyKey = () => {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID()
+  }
+  return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}-${Math.random().toString(16).slice(2)}`
+}
+
+// 带幂等键的 POST：网络错误或超时（未收到响应）时使用同一个键重试，服务端直接返回首次结果
+const postIdempotent = async (url, data, retries = 2) => {
+  const config = { headers: { 'Idempotency-Key': createIdempotencyKey() } }
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await api.post(url, data, config)
+    } catch (error) {
+      if (error.response || attempt >= retries) {
+        throw error
+      }
+      console.warn(`[API重试] POST ${url} 第 ${attempt + 1} 次重试`)
+    }
+  }
+}
+
+// 预约列表使用列式格式传输：用户、会议室只发送一次，预约按字段拆成并行数组
+const COLUMNAR_TYPE = 'application/vnd.booking.columnar+json'
+
+// 将列式数据还原为与原接口一致的嵌套结构
+const expandColumnar = (payload) => {
+  if (!payload || !payload.bookings || Array.isArray(payload)) {
+    return payload
+  }
+  const users = new Map(payload.users.map(user => [user.id, user]))
+  const rooms = new Map(payload.rooms.map(room => [room.id, room]))
+  const columns = payload.bookings
+  const names = Object.keys(columns)
+  const count = columns.id.length
+  const bookings = new Array(count)
+  for (let i = 0; i < count; i++) {
+    const booking = {}
+    for (const name of names) {
+      booking[name] = columns[name][i]
+    }
+    booking.user = users.get(booking.user_id)
+    booking.room = rooms.get(booking.room_id)
+    bookings[i] = booking
+  }
+  return bookings
+}
+
+const getBookingList = async (url) => {
+  const data = await api.get(url, { headers: { Accept: `${COLUMNAR_TYPE}, application/json` } })
+  return expandColumnar(data)
+}
+
 // 用户API
 export const userAPI = {
   getUsers: () => api.get('/users/'),
   getUser: (id) => api.get(`/users/${id}`),
   createUser: (data) => api.post('/users/', data),
-  deleteUser: (id) => api.delete(`/users/${id}`)
+  deleteUser: (id) => api.delete(`/users/${id}`),
+  // 用户日程（params 可选 from / to）
+  getAgenda: (id, params = {}) => api.get(`/users/${id}/agenda`, { params }),
+  // 日历订阅地址（供邮件客户端订阅）
+  calendarUrl: (id) => new URL(`${getBaseURL()}/users/${id}/calendar.ics`, window.location.origin).href
 }
 
 // 会议室API
 export const roomAPI = {
-  getRooms: () => api.get('/rooms/'),
+  // params 可选：building、floor、equipment（数组）、min_capacity、max_capacity、available
+  getRooms: (params = {}) => api.get('/rooms/', { params, paramsSerializer: { indexes: null } }),
+  getFacets: (params = {}) => api.get('/rooms/facets', { params, paramsSerializer: { indexes: null } }),
+  // params 必填 start、end，其余同 getRooms
+  getFreeRooms: (params) => api.get('/rooms/free', { params, paramsSerializer: { indexes: null } }),
+  // params 必填 from、to（日期），可选 room_id 或 getRooms 的筛选条件
+  getHeatmap: (params) => api.get('/rooms/heatmap', { params, paramsSerializer: { indexes: null } }),
   getRoom: (id) => api.get(`/rooms/${id}`),
+  // 日历订阅地址（供邮件客户端订阅）
+  calendarUrl: (id) => new URL(`${getBaseURL()}/rooms/${id}/calendar.ics`, window.location.origin).href,
   createRoom: (data) => api.post('/rooms/', data),
   updateRoom: (id, data) => api.put(`/rooms/${id}`, data),
   deleteRoom: (id) => api.delete(`/rooms/${id}`)
 }
 
+// 认证API（登录后请求自动携带访问令牌）
+export const authAPI = {
+  login: async (username, password) => {
+    const tokens = await api.post('/auth/login', { username, password })
+    localStorage.setItem(TOKEN_KEY, JSON.stringify(tokens))
+    return tokens
+  },
+  refresh: async () => {
+    const tokens = await api.post('/auth/refresh', { refresh_token: loadTokens()?.refresh_token })
+    localStorage.setItem(TOKEN_KEY, JSON.stringify(tokens))
+    return tokens
+  },
+  logout: async () => {
+    const tokens = loadTokens()
+    localStorage.removeItem(TOKEN_KEY)
+    if (tokens) {
+      await api.post('/auth/logout', { refresh_token: tokens.refresh_token }, {
+        headers: { Authorization: `Bearer ${tokens.access_token}` }
+      })
+    }
+  },
+  me: () => api.get('/auth/me')
+}
+
 // 预约API
 export const bookingAPI = {
-  getBookings: () => api.get('/bookings/'),
+  getBookings: () => getBookingList('/bookings/'),
   getBooking: (id) => api.get(`/bookings/${id}`),
-  getUserBookings: (userId) => api.get(`/bookings/user/${userId}`),
-  getRoomBookings: (roomId) => api.get(`/bookings/room/${roomId}`),
-  createBooking: (data) => api.post('/bookings/', data),
+  getUserBookings: (userId) => getBookingList(`/bookings/user/${userId}`),
+  getRoomBookings: (roomId) => getBookingList(`/bookings/room/${roomId}`),
+  createBooking: (data) => postIdempotent('/bookings/', data),
+  holdBooking: (data) => api.post('/bookings/holds', data),
+  confirmHold: (id) => api.put(`/bookings/${id}/confirm`),
   cancelBooking: (id) => api.put(`/bookings/${id}/cancel`),
   deleteBooking: (id) => api.delete(`/bookings/${id}`)
 }
 
+// 搜索API（type 可选：user / room / booking）
+export const searchAPI = {
+  search: (q, params = {}) => api.get('/search/', { params: { q, ...params } })
+}
+
 export default api
 
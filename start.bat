@@ -13,6 +13,7 @@ if not exist venv (
 
 call venv\Scripts\activate
 pip install -q -r requirements.txt
+python manage.py migrate
 start "Backend-FastAPI" cmd /k "uvicorn main:app --reload --host 0.0.0.0 --port 8000"
 echo ✅ 后端服务启动成功 - http://localhost:8000
 cd ..
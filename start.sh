@@ -53,6 +53,10 @@ source .venv/bin/activate
 echo "📥 安装/更新依赖 (使用 uv)..."
 uv pip install -r requirements.txt
 
+# 执行数据库迁移
+echo "⚙️  执行数据库迁移..."
+python manage.py migrate
+
 # 启动后端服务
 echo "🚀 启动后端服务..."
 uvicorn main:app --reload --host 0.0.0.0 --port 8000 > ../backend.log 2>&1 &